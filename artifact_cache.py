@@ -0,0 +1,40 @@
+"""Persistent, content-addressed cache for converted documents and rendered reports.
+
+Artifacts built from uploaded documents or analysis results, such as the
+combined PDF of an unpublished application's Word specification and PDF
+drawings or the Word report of an analysis, are stored under the SHA-256 hashes
+of their sources plus the kind of artifact, so asking again for the same
+conversion (under any file names) returns the stored bytes instead of
+rendering them again.
+"""
+import hashlib
+import re
+
+from disk_store import DiskStore
+
+DEFAULT_CACHE_DIR = ".artifact_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def artifact_key(kind, sources):
+    """Return the cache key of an artifact: its kind plus the SHA-256 of each source document, in order."""
+    digest = hashlib.sha256()
+    for source in sources:
+        digest.update(hashlib.sha256(source).digest())
+    return f"{digest.hexdigest()}-{re.sub(r'[^A-Za-z0-9_.+-]', '_', kind)}"
+
+
+class ArtifactCache(DiskStore):
+    """Disk-backed artifact cache with size-bounded LRU eviction."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(cache_dir, ".bin", max_bytes)
+        self.cache_dir = cache_dir
+
+    def get(self, key):
+        """Return the stored bytes of an artifact, or None on a miss."""
+        return self._read(key, bytes)
+
+    def put(self, key, data):
+        """Store an artifact and evict old entries if over budget."""
+        self._write(key, data)
@@ -0,0 +1,208 @@
+"""Run the Step 1-4 analysis for many matters without the Streamlit app.
+
+Matters come from a directory with one subdirectory per matter, or from a JSON
+manifest. In a matter directory the files are found by name:
+
+    office_action*.pdf|docx (or examiner*)  the office action
+    references/*.pdf (or reference*.pdf)    the cited references
+    filed*.pdf|docx (or application*)       the application as filed
+    pending*.pdf|docx (or claims*)          the pending claims, optional
+
+A manifest lists the same documents explicitly; relative paths are resolved
+against the manifest's directory:
+
+    {"matters": [{"name": "...", "office_action": "...", "references": ["..."],
+                  "filed_application": "...", "pending_claims": "..."}]}
+
+Each matter's <filed application>_ANALYSIS.docx report and results.json are
+written to OUTPUT/<matter>/, and OUTPUT/summary.json summarizes the run.
+Matters run in parallel threads, which share the process-wide clients, caches
+and rate limits.
+
+    python batch.py matters/ --output reports/ --workers 4
+"""
+import argparse
+import contextvars
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pipeline
+
+MATTER_FILE_PATTERNS = {
+    "office_action": ["office_action*.pdf", "office_action*.docx", "examiner*.pdf", "examiner*.docx"],
+    "references": ["reference*.pdf", "ref_*.pdf"],
+    "filed_application": ["filed*.pdf", "filed*.docx", "application*.pdf", "application*.docx"],
+    "pending_claims": ["pending*.pdf", "pending*.docx", "claims*.pdf", "claims*.docx"],
+}
+
+
+def _matching_files(directory, patterns):
+    names = sorted(os.listdir(directory))
+    return [
+        os.path.join(directory, name) for name in names
+        if os.path.isfile(os.path.join(directory, name))
+        and any(fnmatch.fnmatch(name.lower(), pattern) for pattern in patterns)
+    ]
+
+
+def discover_matter(directory):
+    """Find the documents of one matter directory by file name; see MATTER_FILE_PATTERNS."""
+    matter = {"name": os.path.basename(os.path.normpath(directory))}
+    for role in ("office_action", "filed_application", "pending_claims"):
+        matches = _matching_files(directory, MATTER_FILE_PATTERNS[role])
+        matter[role] = matches[0] if matches else None
+
+    references_dir = os.path.join(directory, "references")
+    if os.path.isdir(references_dir):
+        matter["references"] = _matching_files(references_dir, ["*.pdf"])
+    else:
+        matter["references"] = _matching_files(directory, MATTER_FILE_PATTERNS["references"])
+    return matter
+
+
+def load_matters(source):
+    """Return the matters in a matters directory or a JSON manifest."""
+    if os.path.isdir(source):
+        return [
+            discover_matter(os.path.join(source, name))
+            for name in sorted(os.listdir(source))
+            if os.path.isdir(os.path.join(source, name))
+        ]
+
+    with open(source, encoding="utf-8") as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(source))
+
+    def resolve(path):
+        return os.path.join(base_dir, path) if path else None
+
+    matters = []
+    for index, entry in enumerate(manifest["matters"] if isinstance(manifest, dict) else manifest, start=1):
+        matters.append({
+            "name": entry.get("name") or f"matter_{index}",
+            "office_action": resolve(entry.get("office_action")),
+            "references": [resolve(path) for path in entry.get("references", [])],
+            "filed_application": resolve(entry.get("filed_application")),
+            "pending_claims": resolve(entry.get("pending_claims")),
+        })
+    return matters
+
+
+def missing_documents(matter):
+    """Return the required documents a matter is missing."""
+    missing = [role for role in ("office_action", "filed_application") if not matter.get(role)]
+    if not matter.get("references"):
+        missing.append("references")
+    return missing
+
+
+def run_matter(matter, output_dir, concurrent_step1=False, skip_existing=False):
+    """Analyze one matter and write its report; returns the matter's summary entry."""
+    matter_dir = os.path.join(output_dir, matter["name"])
+    report_path = os.path.join(
+        matter_dir, pipeline.analysis_file_name(os.path.basename(matter["filed_application"] or "")))
+    summary = {"name": matter["name"], "status": "failed", "report": None, "error": None}
+
+    missing = missing_documents(matter)
+    if missing:
+        summary["error"] = f"Missing documents: {', '.join(missing)}"
+        return summary
+    if skip_existing and os.path.exists(report_path):
+        summary.update(status="skipped", report=report_path)
+        return summary
+
+    start = time.perf_counter()
+    try:
+        results = pipeline.analyze_matter(
+            matter["office_action"], matter["references"], matter["filed_application"],
+            matter.get("pending_claims"), concurrent_step1=concurrent_step1,
+        )
+        # Written inside the try so a failure to write one matter's output is recorded in its summary
+        os.makedirs(matter_dir, exist_ok=True)
+        with open(os.path.join(matter_dir, "results.json"), "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        report = pipeline.build_analysis_docx(results["report"]).getvalue()
+        with open(report_path, "wb") as f:
+            f.write(report)
+    except pipeline.PipelineError as e:
+        summary["error"] = str(e)
+    except Exception as e:
+        summary["error"] = f"An unexpected error occurred: {e}"
+    else:
+        conflict_results = results["conflict_results"]
+        summary.update(
+            status="ok",
+            report=report_path,
+            foundational_claim=conflict_results.get("foundational_claim"),
+            documents_referenced=conflict_results.get("documents_referenced"),
+            failed_references=results["failed_references"],
+            pending_claims_analyzed="pending_claims_analysis" in results,
+            step_seconds={step: round(seconds, 1) for step, seconds in results["timings"].items()},
+        )
+    summary["seconds"] = round(time.perf_counter() - start, 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("matters", help="directory with one subdirectory per matter, or a JSON manifest")
+    parser.add_argument("--output", default="batch_output", help="directory for the reports and summary.json")
+    parser.add_argument("--workers", type=int, default=2, help="matters analyzed at the same time")
+    parser.add_argument("--concurrent-step1", action="store_true",
+                        help="start the conflict check before the persona is detected, as the app can")
+    parser.add_argument("--skip-existing", action="store_true", help="skip matters whose report already exists")
+    parser.add_argument("--bypass-llm-cache", action="store_true", help="call the model even for cached requests")
+    args = parser.parse_args()
+
+    matters = load_matters(args.matters)
+    if not matters:
+        sys.exit(f"No matters found in {args.matters}")
+    os.makedirs(args.output, exist_ok=True)
+    pipeline.llm_cache_bypass.set(args.bypass_llm_cache)
+    pipeline.configure_logging()
+    pipeline.get_metrics_server()
+
+    print(f"Analyzing {len(matters)} matter(s) with {args.workers} worker(s)")
+    start = time.perf_counter()
+    summaries = []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [
+            # Run in a copy of this context so the cache bypass setting reaches the worker threads
+            executor.submit(
+                contextvars.copy_context().run,
+                run_matter, matter, args.output, args.concurrent_step1, args.skip_existing,
+            )
+            for matter in matters
+        ]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            print(f"[{len(summaries)}/{len(matters)}] {summary['name']}: {summary['status']}"
+                  + (f" - {summary['error']}" if summary["error"] else ""))
+
+    summaries.sort(key=lambda summary: summary["name"])
+    run_summary = {
+        "matters": len(matters),
+        "succeeded": sum(summary["status"] == "ok" for summary in summaries),
+        "skipped": sum(summary["status"] == "skipped" for summary in summaries),
+        "failed": sum(summary["status"] == "failed" for summary in summaries),
+        "seconds": round(time.perf_counter() - start, 1),
+        "llm_cache": pipeline.llm_cache.stats(),
+        "ocr_cache": pipeline.ocr_cache.stats(),
+        "rate_limits": pipeline.rate_limiters.stats(),
+        "results": summaries,
+    }
+    summary_path = os.path.join(args.output, "summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(run_summary, f, indent=2, ensure_ascii=False)
+    print(f"{run_summary['succeeded']} succeeded, {run_summary['skipped']} skipped, "
+          f"{run_summary['failed']} failed; summary written to {summary_path}")
+    sys.exit(1 if run_summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Benchmark per-call client overhead: a new SDK client per call versus one pooled client.
+
+By default both clients talk to a local mock of the Azure OpenAI chat-completions
+and Form Recognizer analyze endpoints, which answer immediately, so the timings
+are the client-side cost of each call: building the client and opening a
+connection, versus reusing a kept-alive one. Pass --tls to serve the mock over
+HTTPS with a throwaway self-signed certificate (needs the openssl command), which
+adds the TLS handshake that every unpooled call pays against the real service
+and is the closer match to production (over plain HTTP on loopback, fresh
+connections can also hit TCP delayed-ACK stalls that inflate the unpooled time).
+Pass --live to use the endpoints from the environment (AZURE_OPENAI_ENDPOINT,
+FORM_RECOGNIZER_ENDPOINT, ...) instead; this sends real requests.
+
+    python benchmarks/bench_client_pool.py --calls 50
+"""
+import argparse
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from clients import create_document_analysis_client, create_openai_client  # noqa: E402
+
+MODEL = "GPT-4-Omni"
+API_VERSION = "2024-06-01"
+
+CHAT_COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}
+
+ANALYZE_RESULT = {
+    "status": "succeeded",
+    "createdDateTime": "2024-01-01T00:00:00Z",
+    "lastUpdatedDateTime": "2024-01-01T00:00:00Z",
+    "analyzeResult": {
+        "apiVersion": "2023-07-31",
+        "modelId": "prebuilt-document",
+        "content": "Scanned text",
+        "pages": [{
+            "pageNumber": 1, "angle": 0, "width": 8.5, "height": 11, "unit": "inch", "spans": [],
+            "lines": [{"content": "Scanned text", "polygon": [], "spans": [{"offset": 0, "length": 12}]}],
+        }],
+    },
+}
+
+
+class MockAzureHandler(BaseHTTPRequestHandler):
+    """Answers chat completions and Form Recognizer analyze requests immediately."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real services
+    disable_nagle_algorithm = True  # Otherwise delayed ACKs stall every reused connection
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if "/chat/completions" in self.path:
+            self._send_json(200, CHAT_COMPLETION)
+        else:
+            location = f"{self.headers['Host']}/formrecognizer/documentModels/prebuilt-document/analyzeResults/bench"
+            scheme = "https" if isinstance(self.connection, ssl.SSLSocket) else "http"
+            self._send_json(202, {}, {"Operation-Location": f"{scheme}://{location}?api-version=2023-07-31"})
+
+    def do_GET(self):
+        self._send_json(200, ANALYZE_RESULT)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(tls):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockAzureHandler)
+    scheme = "http"
+    if tls:
+        cert_dir = tempfile.mkdtemp()
+        cert_file = os.path.join(cert_dir, "cert.pem")
+        key_file = os.path.join(cert_dir, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+             "-keyout", key_file, "-out", cert_file],
+            check=True, capture_output=True,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_file, key_file)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        # Both SDKs verify certificates; trust the throwaway one for this process only
+        os.environ["SSL_CERT_FILE"] = cert_file
+        os.environ["REQUESTS_CA_BUNDLE"] = cert_file
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/"
+
+
+def openai_settings(endpoint):
+    return dict(
+        endpoint=endpoint or os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key="bench" if endpoint else os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=API_VERSION if endpoint else os.getenv("OPENAI_API_VERSION"),
+        max_retries=0,
+    )
+
+
+def form_recognizer_settings(endpoint):
+    return dict(
+        endpoint=endpoint or os.getenv("FORM_RECOGNIZER_ENDPOINT"),
+        api_key="bench" if endpoint else os.getenv("FORM_RECOGNIZER_API_KEY"),
+        retry_total=0,
+        polling_interval=0,
+    )
+
+
+def chat_call(client):
+    client.chat.completions.create(model=MODEL, messages=[{"role": "user", "content": "ping"}], max_tokens=1)
+
+
+def analyze_call(client):
+    client.begin_analyze_document("prebuilt-document", document=b"%PDF-1.4 bench").result()
+
+
+def time_calls(calls, make_client, call, pooled):
+    """Return the mean seconds per call, with one shared client or a new client per call."""
+    client = make_client() if pooled else None
+    call(client or make_client())  # Warm-up, so import and first-connection costs don't skew the pooled case
+    start = time.perf_counter()
+    for _ in range(calls):
+        call(client or make_client())
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50, help="calls per measurement")
+    parser.add_argument("--tls", action="store_true", help="serve the mock endpoints over HTTPS")
+    parser.add_argument("--live", action="store_true", help="use the real endpoints from the environment")
+    args = parser.parse_args()
+
+    endpoint = None
+    if not args.live:
+        server, endpoint = start_mock_server(args.tls)
+
+    benchmarks = [
+        ("Azure OpenAI chat completion", lambda: create_openai_client(**openai_settings(endpoint)), chat_call),
+        ("Form Recognizer analyze", lambda: create_document_analysis_client(**form_recognizer_settings(endpoint)), analyze_call),
+    ]
+    print(f"endpoints: {'live' if args.live else endpoint}, calls: {args.calls}")
+    print(f"{'call':>30}  {'per-call client (ms)':>20}  {'pooled client (ms)':>18}  {'saved (ms)':>10}")
+    for name, make_client, call in benchmarks:
+        unpooled = time_calls(args.calls, make_client, call, pooled=False)
+        pooled = time_calls(args.calls, make_client, call, pooled=True)
+        print(f"{name:>30}  {unpooled * 1000:>20.2f}  {pooled * 1000:>18.2f}  {(unpooled - pooled) * 1000:>10.2f}")
+
+    if not args.live:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
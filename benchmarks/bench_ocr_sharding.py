@@ -0,0 +1,93 @@
+"""Benchmark OCR latency against page count, with and without page-range sharding.
+
+By default a simulated Form Recognizer client is used whose latency grows with
+the number of pages submitted, so the effect of sharding can be measured
+offline. Pass --live to run against the endpoint in FORM_RECOGNIZER_ENDPOINT /
+FORM_RECOGNIZER_API_KEY instead.
+
+    python benchmarks/bench_ocr_sharding.py --pages 10 50 100 200 --shard-pages 25 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import fitz  # PyMuPDF for PDF generation
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pdf_ocr import count_pages, ocr_pdf_pages  # noqa: E402
+
+
+class SimulatedDocumentAnalysisClient:
+    """Stand-in for DocumentAnalysisClient with a fixed plus per-page latency."""
+
+    def __init__(self, base_latency, page_latency):
+        self.base_latency = base_latency
+        self.page_latency = page_latency
+
+    def begin_analyze_document(self, model_id, document):
+        page_count = count_pages(document)
+        pages = [
+            SimpleNamespace(page_number=number, lines=[SimpleNamespace(content=f"Scanned text of page {number}")])
+            for number in range(1, page_count + 1)
+        ]
+
+        def result():
+            time.sleep(self.base_latency + self.page_latency * page_count)
+            return SimpleNamespace(pages=pages)
+
+        return SimpleNamespace(result=result)
+
+
+def make_scanned_pdf(page_count):
+    """Build a PDF of image-only pages, i.e. pages without a text layer."""
+    with fitz.open() as pdf_document:
+        for _ in range(page_count):
+            page = pdf_document.new_page()
+            page.draw_rect(fitz.Rect(72, 72, 540, 720), color=(0, 0, 0), fill=(0.9, 0.9, 0.9))
+        return pdf_document.tobytes()
+
+
+def time_ocr(client, file_content, page_count, shard_pages, workers):
+    page_numbers = list(range(1, page_count + 1))
+    start = time.perf_counter()
+    page_texts = ocr_pdf_pages(client, file_content, page_numbers, shard_pages=shard_pages, max_workers=workers)
+    elapsed = time.perf_counter() - start
+    assert sorted(page_texts) == page_numbers, "pages missing from OCR result"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    parser.add_argument("--shard-pages", type=int, default=25)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--base-latency", type=float, default=2.0, help="simulated seconds per request")
+    parser.add_argument("--page-latency", type=float, default=0.3, help="simulated seconds per page")
+    parser.add_argument("--live", action="store_true", help="use the real Form Recognizer endpoint")
+    args = parser.parse_args()
+
+    if args.live:
+        from azure.ai.formrecognizer import DocumentAnalysisClient
+        from azure.core.credentials import AzureKeyCredential
+
+        client = DocumentAnalysisClient(
+            endpoint=os.environ["FORM_RECOGNIZER_ENDPOINT"],
+            credential=AzureKeyCredential(os.environ["FORM_RECOGNIZER_API_KEY"]),
+        )
+    else:
+        client = SimulatedDocumentAnalysisClient(args.base_latency, args.page_latency)
+
+    print(f"shard size: {args.shard_pages} pages, workers: {args.workers}, client: {'live' if args.live else 'simulated'}")
+    print(f"{'pages':>6} {'single (s)':>11} {'sharded (s)':>12} {'speedup':>8}")
+    for page_count in args.pages:
+        file_content = make_scanned_pdf(page_count)
+        single = time_ocr(client, file_content, page_count, 0, 1)
+        sharded = time_ocr(client, file_content, page_count, args.shard_pages, args.workers)
+        print(f"{page_count:>6} {single:>11.2f} {sharded:>12.2f} {single / sharded:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
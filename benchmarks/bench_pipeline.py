@@ -0,0 +1,332 @@
+"""Benchmark Steps 1-4 end to end on sample matters, offline against the mock Azure endpoints.
+
+The sample matters in fixtures/sample_matters.json are rendered as PDFs (padded
+to --doc-pages pages with filler paragraphs; --scanned renders the office
+action, references and filed application as image-only pages, so they go
+through OCR) and analyzed with pipeline.analyze_matter, as the batch CLI does.
+The chat-completions and document-analysis requests go to mock_azure.py, which
+answers with recorded fixtures after the configured latency, throttling and
+failures.
+
+Each run starts with empty OCR and LLM caches and checkpoints; a final warm run
+repeats the last one with its caches in place. Reported per run: the wall time
+of each step, and per stage (LLM stage or document extraction) the calls, the
+summed call time, the bytes sent and received and the prompt and completion
+tokens. Results are saved as JSON under --output with the git commit, and
+compared with the previous result there (or --baseline), so a slower step
+or stage shows up between commits.
+
+    python benchmarks/bench_pipeline.py --runs 3 --latency 0.2 --token-latency 0.001 --ocr-latency 1 --scanned
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+
+import fitz  # PyMuPDF for building the sample documents
+
+from mock_azure import FIXTURES_DIR, add_mock_arguments, mock_from_arguments, start_mock_server
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+LINES_PER_PAGE = 48
+LINE_WIDTH = 95
+
+
+def page_texts_for(lines, filler, pages):
+    """Lay out a document's lines, padded with numbered filler paragraphs to at least the given number of pages."""
+    wrapped = [part for line in lines for part in textwrap.wrap(line, LINE_WIDTH) or [""]]
+    number = 100
+    while filler and len(wrapped) < pages * LINES_PER_PAGE:
+        wrapped.extend(textwrap.wrap(f"[{number:04d}] {filler[number % len(filler)]}", LINE_WIDTH))
+        number += 1
+    return ["\n".join(wrapped[start:start + LINES_PER_PAGE]) for start in range(0, len(wrapped), LINES_PER_PAGE)]
+
+
+def build_pdf(page_texts, scanned=False):
+    """
+    Return a PDF of the given pages.
+
+    Scanned pages are images without a text layer; their text is kept in a text annotation
+    as the recorded OCR result, which the mock Form Recognizer returns.
+    """
+    with fitz.open() as pdf_document:
+        for page_text in page_texts:
+            page = pdf_document.new_page()
+            if not scanned:
+                page.insert_text((50, 60), page_text, fontsize=9)
+                continue
+            with fitz.open() as text_document:
+                text_page = text_document.new_page()
+                text_page.insert_text((50, 60), page_text, fontsize=9)
+                image = text_page.get_pixmap(dpi=100, colorspace=fitz.csGRAY).tobytes("jpeg")
+            page.insert_image(page.rect, stream=image)
+            page.add_text_annot((5, 5), page_text)
+        return pdf_document.tobytes()
+
+
+def write_sample_matters(directory, doc_pages, scanned):
+    """Render the fixture matters as PDFs in directory; returns the matters as analyze_matter inputs."""
+    with open(os.path.join(FIXTURES_DIR, "sample_matters.json"), encoding="utf-8") as f:
+        fixtures = json.load(f)
+    filler = fixtures["filler"]
+
+    def write(matter_dir, name, lines, pages=1, padded=False, scan=scanned):
+        path = os.path.join(matter_dir, name)
+        with open(path, "wb") as f:
+            f.write(build_pdf(page_texts_for(lines, filler if padded else None, pages), scan))
+        return path
+
+    matters = []
+    for fixture in fixtures["matters"]:
+        matter_dir = os.path.join(directory, fixture["name"])
+        os.makedirs(matter_dir, exist_ok=True)
+        matters.append({
+            "name": fixture["name"],
+            "office_action": write(matter_dir, "office_action.pdf", fixture["office_action"]),
+            "references": [
+                write(matter_dir, reference["name"], reference["text"], doc_pages, padded=True)
+                for reference in fixture["references"]
+            ],
+            "filed_application": write(matter_dir, "filed_application.pdf", fixture["filed_application"],
+                                       doc_pages, padded=True),
+            # Pending claims are typed, so their claims are parsed from the text layer
+            "pending_claims": write(matter_dir, "pending_claims.pdf", fixture["pending_claims"], scan=False),
+        })
+    return matters
+
+
+class StageTimer:
+    """Summed call time, calls and document bytes per stage, from wrappers around the pipeline's stage entry points."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, document_bytes=0):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "document_bytes": 0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["document_bytes"] += document_bytes
+
+    def wrap_chat_completion(self, create_chat_completion):
+        def timed(stage, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return create_chat_completion(stage, *args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_document_reader(self, read_pdf_document):
+        def timed(source, name=None):
+            start = time.perf_counter()
+            try:
+                return read_pdf_document(source, name)
+            finally:
+                size = os.path.getsize(source) if isinstance(source, (str, os.PathLike)) else len(source)
+                self.add("document_extraction", time.perf_counter() - start, size)
+        return timed
+
+
+def reset_caches(pipeline, root):
+    """Point the pipeline's OCR and LLM caches, checkpoints and rate limiters at a fresh, empty state."""
+    pipeline.llm_cache_dir = os.path.join(root, "llm_cache")
+    pipeline.llm_cache = pipeline.get_llm_cache()
+    pipeline.ocr_cache_dir = os.path.join(root, "ocr_cache")
+    pipeline.ocr_cache = pipeline.get_ocr_cache()
+    pipeline.checkpoint_dir = os.path.join(root, "checkpoints")
+    pipeline.checkpoint_store = pipeline.get_checkpoint_store()
+    pipeline.rate_limiters = pipeline.get_rate_limiters()
+
+
+def run_matters(pipeline, matters, mock, timer):
+    """Analyze every matter once; returns the run's step times, stage metrics and failures."""
+    mock.reset_stats()
+    timer.stages = {}
+    steps = {}
+    failures = []
+    start = time.perf_counter()
+    for matter in matters:
+        try:
+            results = pipeline.analyze_matter(
+                matter["office_action"], matter["references"], matter["filed_application"], matter["pending_claims"]
+            )
+        except pipeline.PipelineError as e:
+            failures.append({"name": matter["name"], "error": str(e)})
+            continue
+        for step, seconds in results["timings"].items():
+            steps[step] = steps.get(step, 0.0) + seconds
+
+    stages = {stage: dict(entry) for stage, entry in timer.stages.items()}
+    for stage, counts in mock.stats().items():
+        stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "document_bytes": 0}).update(counts)
+    return {"seconds": time.perf_counter() - start, "steps": steps, "stages": stages, "failures": failures}
+
+
+def summarize(runs):
+    """Return the mean, min and max of each step and the mean of each stage metric over the runs."""
+    def spread(values):
+        return {"mean": statistics.mean(values), "min": min(values), "max": max(values)}
+
+    step_names = sorted({step for run in runs for step in run["steps"]})
+    stage_names = sorted({stage for run in runs for stage in run["stages"]})
+    return {
+        "runs": len(runs),
+        "seconds": spread([run["seconds"] for run in runs]),
+        "steps": {step: spread([run["steps"].get(step, 0.0) for run in runs]) for step in step_names},
+        "stages": {
+            stage: {
+                metric: statistics.mean(run["stages"].get(stage, {}).get(metric, 0) for run in runs)
+                for metric in sorted({metric for run in runs for metric in run["stages"].get(stage, {})})
+            }
+            for stage in stage_names
+        },
+        "failures": [failure for run in runs for failure in run["failures"]],
+    }
+
+
+def git_revision():
+    """Return the current commit and whether the working tree has changes, or (None, None) outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def print_summary(label, summary):
+    print(f"\n{label}: {summary['runs']} run(s), {summary['seconds']['mean']:.2f} s per run")
+    print(f"{'step':>12}  {'mean (s)':>9}  {'min (s)':>8}  {'max (s)':>8}")
+    for step, seconds in summary["steps"].items():
+        print(f"{step:>12}  {seconds['mean']:>9.3f}  {seconds['min']:>8.3f}  {seconds['max']:>8.3f}")
+    print(f"{'stage':>42}  {'calls':>6}  {'429/500':>7}  {'call s':>7}  {'sent kB':>8}  {'recv kB':>8}"
+          f"  {'prompt tok':>10}  {'compl tok':>9}")
+    for stage, metrics in summary["stages"].items():
+        sent = metrics.get("request_bytes", 0) + metrics.get("document_bytes", 0)
+        errors = metrics.get("throttled", 0) + metrics.get("failed", 0)
+        print(f"{stage:>42}  {metrics.get('calls') or metrics.get('requests', 0):>6.1f}  {errors:>7.1f}"
+              f"  {metrics.get('seconds', 0):>7.3f}"
+              f"  {sent / 1024:>8.1f}  {metrics.get('response_bytes', 0) / 1024:>8.1f}"
+              f"  {metrics.get('prompt_tokens', 0):>10.0f}  {metrics.get('completion_tokens', 0):>9.0f}")
+    for failure in summary["failures"]:
+        print(f"  failed: {failure['name']}: {failure['error']}")
+
+
+def compare(result, baseline, threshold, min_delta):
+    """Print the change of each step and stage against a baseline result; returns the regressions."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'unknown commit'} ({baseline.get('created')}):")
+    for phase in ("cold", "warm"):
+        current, previous = result.get(phase), baseline.get(phase)
+        if not current or not previous:
+            continue
+        pairs = [(f"{phase} step {step}", seconds["mean"], previous["steps"].get(step, {}).get("mean"))
+                 for step, seconds in current["steps"].items()]
+        pairs += [(f"{phase} stage {stage}", metrics.get("seconds", 0.0),
+                   previous["stages"].get(stage, {}).get("seconds"))
+                  for stage, metrics in current["stages"].items()]
+        for name, value, before in pairs:
+            if before is None:
+                continue
+            change = (value - before) / before if before else 0.0
+            regressed = value - before > min_delta and change > threshold
+            if regressed:
+                regressions.append(name)
+            print(f"{name:>56}  {before:>8.3f} -> {value:>8.3f} s  {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def latest_result(output_dir, exclude=None):
+    paths = sorted(path for path in glob.glob(os.path.join(output_dir, "*.json")) if path != exclude)
+    return paths[-1] if paths else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="cold runs, each with empty caches")
+    parser.add_argument("--no-warm", action="store_true", help="skip the warm run with the caches of the last run")
+    parser.add_argument("--doc-pages", type=int, default=10, help="pages of each reference and filed application")
+    parser.add_argument("--scanned", action="store_true", help="render the documents as scanned pages that need OCR")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR, help="directory for the result files")
+    parser.add_argument("--baseline", help="result file to compare with (default: the latest one in --output)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns of fewer seconds than this")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock = mock_from_arguments(args)
+    server, endpoint = start_mock_server(mock)
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+
+    # The pipeline reads its settings and creates its clients at import, so point it at the mock first
+    os.environ.update(
+        AZURE_OPENAI_ENDPOINT=endpoint, AZURE_OPENAI_API_KEY="bench", OPENAI_API_VERSION="2024-08-01-preview",
+        FORM_RECOGNIZER_ENDPOINT=endpoint, FORM_RECOGNIZER_API_KEY="bench",
+    )
+    for name, value in (("API_BACKOFF_BASE_SECONDS", "0.1"), ("JOB_DB_PATH", os.path.join(work_dir, "jobs.sqlite3")),
+                        ("TRACE_FILE", os.path.join(work_dir, "spans.jsonl")), ("METRICS_PORT", "0")):
+        os.environ.setdefault(name, value)
+    sys.path.insert(0, REPO_DIR)
+    import pipeline
+
+    timer = StageTimer()
+    pipeline.create_chat_completion = timer.wrap_chat_completion(pipeline.create_chat_completion)
+    pipeline.read_pdf_document = timer.wrap_document_reader(pipeline.read_pdf_document)
+
+    matters = write_sample_matters(os.path.join(work_dir, "matters"), args.doc_pages, args.scanned)
+    print(f"{len(matters)} sample matter(s), {args.doc_pages} page(s) per document"
+          f"{', scanned' if args.scanned else ''}; mock endpoints at {endpoint}")
+
+    cold_runs = []
+    for run in range(args.runs):
+        reset_caches(pipeline, os.path.join(work_dir, f"run_{run}"))
+        cold_runs.append(run_matters(pipeline, matters, mock, timer))
+        print(f"cold run {run + 1}/{args.runs}: {cold_runs[-1]['seconds']:.2f} s")
+    commit, dirty = git_revision()
+    result = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {name: value for name, value in vars(args).items()
+                     if name not in ("output", "baseline", "fail_on_regression")},
+        "cold": summarize(cold_runs),
+    }
+    print_summary("Cold (empty caches)", result["cold"])
+    if not args.no_warm:
+        result["warm"] = summarize([run_matters(pipeline, matters, mock, timer)])
+        print_summary("Warm (caches and checkpoints of the last cold run)", result["warm"])
+    server.shutdown()
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    os.makedirs(args.output, exist_ok=True)
+    result_path = os.path.join(args.output, f"{time.strftime('%Y%m%d-%H%M%S')}_{(commit or 'nogit')[:10]}.json")
+    baseline_path = args.baseline or latest_result(args.output)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {result_path}")
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold, args.min_delta)
+        print(f"{len(regressions)} regression(s)" if regressions else "No regressions")
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
+
+
+if __name__ == "__main__":
+    main()
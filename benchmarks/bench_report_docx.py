@@ -0,0 +1,133 @@
+"""Benchmark rendering an analysis report as a Word document: line regexes versus the single-pass renderer.
+
+A synthetic report in the shape of the Step 3 and Step 4 analyses (headings,
+paragraphs with bold and italic spans, nested bullets, numbered lists and
+claim tables) is repeated --sections times and rendered by:
+
+- line_regex: the previous renderer, kept here for comparison, which tested
+  every line against a chain of prefixes and regexes, looked its paragraph
+  style up by name and split out bold spans with another regex;
+- single_pass: report_docx.render_markdown_docx;
+- cached: a lookup of the rendered report in the artifact cache under the hash
+  of the report text, which is what every download after the first costs.
+
+    python benchmarks/bench_report_docx.py --sections 10 50 200 --repeats 5
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import docx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from artifact_cache import ArtifactCache, artifact_key  # noqa: E402
+from report_docx import RENDERER_VERSION, render_markdown_docx  # noqa: E402
+
+TITLE = "Filed Application Analysis Results"
+
+
+def render_line_regex(analysis_output):
+    """The previous report renderer, as it was in pipeline.build_analysis_docx."""
+    doc = docx.Document()
+    doc.add_heading(TITLE, level=1)
+    for line in analysis_output.split('\n'):
+        line = line.strip()
+        if line.startswith("## "):
+            doc.add_heading(line[3:], level=2)
+        elif line.startswith("### "):
+            doc.add_heading(line[4:], level=3)
+        elif line.startswith("#### "):
+            doc.add_heading(line[5:], level=4)
+        elif line.startswith("- "):
+            doc.add_paragraph(line[2:], style='List Bullet')
+        elif re.match(r'^\d+\.', line):
+            doc.add_paragraph(line, style='List Number')
+        else:
+            paragraph = doc.add_paragraph()
+            for part in re.split(r'(\*\*.*?\*\*)', line):
+                if part.startswith("**") and part.endswith("**"):
+                    paragraph.add_run(part[2:-2]).bold = True
+                else:
+                    paragraph.add_run(part)
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def sample_report(sections):
+    """Return a Markdown analysis with the given number of claim sections."""
+    parts = []
+    for number in range(1, sections + 1):
+        parts.append(f"""## Claim {number} Analysis
+
+The **foundational claim** element {number} is *partially* disclosed by the cited reference, which describes a
+controller that **adjusts the flow rate** in response to a sensed pressure; see paragraph [00{number % 90 + 10}].
+
+### Elements
+1. A housing defining a **chamber** with an inlet and an outlet.
+2. A valve disposed in the chamber, the valve comprising:
+   - a seat and a *movable* member;
+   - a spring biasing the member toward the seat.
+3. A controller configured to **open the valve** when the pressure exceeds a threshold.
+
+### Differences
+- The reference does not disclose the **spring bias**.
+  - Figure {number} shows a solenoid instead.
+- The threshold is fixed rather than *configurable*.
+
+| Element | Reference | Disclosed |
+|---|---|---|
+| Housing | US 1,234,{number:03d} | **Yes** |
+| Valve | US 1,234,{number:03d} | Partially |
+| Controller | US 9,876,{number:03d} | *No* |
+
+#### Recommendation
+Amend claim {number} to recite the **spring bias** and the configurable threshold.
+""")
+    return "\n".join(parts)
+
+
+def time_calls(function, repeats):
+    """Return the mean and min seconds of repeats calls of function()."""
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return statistics.mean(seconds), min(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, nargs="+", default=[10, 50, 200], help="claim sections per report")
+    parser.add_argument("--repeats", type=int, default=5, help="renders per renderer and report size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_report_docx_") as cache_dir:
+        cache = ArtifactCache(cache_dir)
+        print(f"{'sections':>8}  {'lines':>6}  {'renderer':>12}  {'mean (s)':>9}  {'min (s)':>8}  {'kB':>6}  {'speedup':>7}")
+        for sections in args.sections:
+            report = sample_report(sections)
+            key = artifact_key(f"analysis-docx-v{RENDERER_VERSION}", [report.encode("utf-8")])
+            cache.put(key, render_markdown_docx(report, TITLE))
+            renderers = [
+                ("line_regex", lambda: render_line_regex(report)),
+                ("single_pass", lambda: render_markdown_docx(report, TITLE)),
+                ("cached", lambda: cache.get(key)),
+            ]
+            baseline = None
+            for name, render in renderers:
+                mean, fastest = time_calls(render, args.repeats)
+                baseline = baseline or mean
+                print(f"{sections:>8}  {report.count(chr(10)) + 1:>6}  {name:>12}  {mean:>9.4f}  {fastest:>8.4f}"
+                      f"  {len(render()) / 1024:>6.1f}  {baseline / mean:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Profile the app's cold start and the overhead of each rerun, against a time and memory budget.
+
+Streamlit imports app19.py's dependencies once per process and then executes the
+script again on every widget interaction, so the app pays for its imports at
+every container cold start and for the script's own run time on every rerun.
+Each measurement runs in a fresh interpreter:
+
+- imports: importing streamlit and the pipeline as app19.py does, the peak RSS
+  after it, and which of LAZY_MODULES got loaded; these are only needed once a
+  step runs, so any of them showing up here is reported as a failure;
+- app: the first run of app19.py through Streamlit's AppTest harness (the first
+  page load of a new container), then --reruns reruns of the same page, with
+  the peak RSS after them.
+
+The slowest top-level imports of one extra run under python -X importtime are
+listed too. The first page sends no requests, so dummy credentials are used
+unless they are set; caches, the job database and the trace file go to a
+temporary directory. Exits with status 1 if a median is over its budget or a
+lazy module is loaded at startup, so it can run as a CI check.
+
+    python benchmarks/bench_startup.py --runs 3 --reruns 20 --output startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP_PATH = os.path.join(REPO_DIR, "app19.py")
+
+# Heavy dependencies that must be imported on first use, not at startup
+LAZY_MODULES = ("openai", "azure.ai.formrecognizer", "azure.core", "fitz", "pymupdf", "docx", "lxml", "jsonschema",
+                "pandas")
+
+PRELUDE = textwrap.dedent("""
+    import json, resource, sys, time
+
+    def peak_rss_mb():
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # Bytes on macOS, KiB elsewhere
+
+    def loaded_modules():
+        return [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+""")
+
+IMPORTS_PROBE = PRELUDE + textwrap.dedent("""
+    start = time.perf_counter()
+    import streamlit
+    streamlit_seconds = time.perf_counter() - start
+    import pipeline
+    print(json.dumps({
+        "streamlit_seconds": streamlit_seconds,
+        "seconds": time.perf_counter() - start,
+        "rss_mb": peak_rss_mb(),
+        "lazy_loaded": loaded_modules(),
+    }))
+""")
+
+APP_PROBE = PRELUDE + textwrap.dedent("""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(sys.argv[2], default_timeout=float(sys.argv[4]))
+    start = time.perf_counter()
+    app.run()
+    first_run_seconds = time.perf_counter() - start
+    errors = [exception.message for exception in app.exception]
+    rerun_seconds = []
+    for _ in range(int(sys.argv[3])):
+        start = time.perf_counter()
+        app.run()
+        rerun_seconds.append(time.perf_counter() - start)
+    print(json.dumps({
+        "first_run_seconds": first_run_seconds,
+        "rerun_seconds": rerun_seconds,
+        "rss_mb": peak_rss_mb(),
+        "lazy_loaded": loaded_modules(),
+        "errors": errors,
+    }))
+""")
+
+
+def probe_environment(work_dir):
+    """Return the environment of the probes: the caller's, with offline defaults and state kept under work_dir."""
+    env = dict(os.environ)
+    defaults = {
+        "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:9", "AZURE_OPENAI_API_KEY": "startup",
+        "OPENAI_API_VERSION": "2024-08-01-preview", "METRICS_PORT": "0", "TRACE_FILE": "",
+        "JOB_DB_PATH": os.path.join(work_dir, "jobs.sqlite3"),
+    }
+    for name, directory in (("LLM_CACHE_DIR", "llm_cache"), ("OCR_CACHE_DIR", "ocr_cache"),
+                            ("ARTIFACT_CACHE_DIR", "artifact_cache"), ("CHECKPOINT_DIR", "checkpoints")):
+        defaults[name] = os.path.join(work_dir, directory)
+    for name, value in defaults.items():
+        env.setdefault(name, value)
+    return env
+
+
+def run_probe(code, args, env, timeout, importtime=False):
+    """Run a probe in a fresh interpreter from the repository root; returns (its JSON result, its stderr)."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code, json.dumps(LAZY_MODULES)]
+    completed = subprocess.run(command + [str(arg) for arg in args], cwd=REPO_DIR, env=env, capture_output=True,
+                               text=True, timeout=timeout)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Probe failed with status {completed.returncode}:\n{completed.stderr[-4000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_imports(importtime_log, top):
+    """Return the top-level imports of a python -X importtime log as (module, seconds), slowest first."""
+    imports = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit() or name[:2] == "  ":  # Header line, or imported by another module
+            continue
+        imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement; medians are reported")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns of the page per app run")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--import-budget", type=float, default=1.0, help="seconds to import streamlit and the pipeline")
+    parser.add_argument("--first-run-budget", type=float, default=2.0, help="seconds for the first page load")
+    parser.add_argument("--rerun-budget", type=float, default=0.1, help="seconds per rerun of the page")
+    parser.add_argument("--rss-budget", type=float, default=300, help="peak RSS in MB after the reruns")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a probe is abandoned")
+    parser.add_argument("--output", help="file to write the results to as JSON")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        env = probe_environment(work_dir)
+        imports = [run_probe(IMPORTS_PROBE, [], env, args.timeout)[0] for _ in range(args.runs)]
+        apps = [run_probe(APP_PROBE, [APP_PATH, args.reruns, args.timeout], env, args.timeout)[0]
+                for _ in range(args.runs)]
+        _, importtime_log = run_probe(IMPORTS_PROBE, [], env, args.timeout, importtime=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result = {
+        "import_streamlit_seconds": statistics.median(run["streamlit_seconds"] for run in imports),
+        "import_seconds": statistics.median(run["seconds"] for run in imports),
+        "import_rss_mb": statistics.median(run["rss_mb"] for run in imports),
+        "first_run_seconds": statistics.median(run["first_run_seconds"] for run in apps),
+        "rerun_seconds": statistics.median([seconds for run in apps for seconds in run["rerun_seconds"]] or [0.0]),
+        "max_rerun_seconds": max((seconds for run in apps for seconds in run["rerun_seconds"]), default=0.0),
+        "rss_mb": statistics.median(run["rss_mb"] for run in apps),
+        "lazy_loaded": sorted({name for run in imports + apps for name in run["lazy_loaded"]}),
+        "errors": sorted({error for run in apps for error in run["errors"]}),
+        "slowest_imports": slowest_imports(importtime_log, args.top),
+    }
+
+    print(f"{'measurement':>24}  {'median':>9}  {'budget':>9}")
+    checks = [
+        ("import", result["import_seconds"], args.import_budget, "s"),
+        ("first page load", result["first_run_seconds"], args.first_run_budget, "s"),
+        ("rerun", result["rerun_seconds"], args.rerun_budget, "s"),
+        ("peak RSS", result["rss_mb"], args.rss_budget, "MB"),
+    ]
+    failures = []
+    for name, value, budget, unit in checks:
+        over = value > budget
+        print(f"{name:>24}  {value:>7.3f}{unit:<2}  {budget:>7.3f}{unit:<2}{'  OVER BUDGET' if over else ''}")
+        if over:
+            failures.append(f"{name} over budget")
+    print(f"{'(streamlit import)':>24}  {result['import_streamlit_seconds']:>7.3f}s")
+    print(f"{'(import peak RSS)':>24}  {result['import_rss_mb']:>7.1f}MB")
+    print(f"{'(slowest rerun)':>24}  {result['max_rerun_seconds']:>7.3f}s")
+
+    print("\nSlowest top-level imports (python -X importtime):")
+    for module, seconds in result["slowest_imports"]:
+        print(f"{module:>40}  {seconds:>7.3f} s")
+
+    if result["lazy_loaded"]:
+        print(f"\nImported at startup but expected on first use: {', '.join(result['lazy_loaded'])}")
+        failures.append("lazy modules loaded at startup")
+    for error in result["errors"]:
+        print(f"\nThe app raised: {error}")
+        failures.append("app error")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    print(f"\n{len(failures)} failure(s)" if failures else "\nWithin budget")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Local stand-in for the Azure OpenAI chat-completions and Form Recognizer analyze APIs.
+
+The mock answers the requests the pipeline sends with recorded fixtures, so the
+app, the batch CLI and the benchmarks run offline:
+
+- Chat completions are matched to their stage by the system prompt (see
+  prompts.py) and answered with the stage's reply in fixtures/chat_replies.json,
+  streamed as server-sent events when the request asks for a stream. Usage is
+  reported with tokens counted locally.
+- Document analysis returns one page per page of the submitted PDF. A page's
+  text is the recorded OCR text stored in the page's text annotation (see
+  bench_pipeline.py, which builds scanned sample documents that way), or a
+  placeholder line.
+
+Replies for repair requests (a stage's reply asked for again) can be recorded
+under "<stage>_repair"; the shipped fixtures are valid, so they are never needed.
+
+Latency, throttling and failures are configurable: a fixed latency per request
+plus a latency per completion token or per page, a fraction of requests answered
+429 with a Retry-After header, and a fraction answered 500. The mock counts
+requests, bytes and tokens per stage, so benchmarks can report them.
+
+Run it on its own to point the app at it:
+
+    python benchmarks/mock_azure.py --port 8000 --latency 0.5 --throttle-rate 0.05
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8000/ FORM_RECOGNIZER_ENDPOINT=http://127.0.0.1:8000/ streamlit run app19.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fitz  # PyMuPDF for reading the submitted PDFs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import prompts  # noqa: E402
+from chunking import count_tokens  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ANALYZE_API_VERSION = "2023-07-31"
+PLACEHOLDER_PAGE_TEXT = "Scanned text of page {number}"
+
+# System prompt of each stage, to tell the stages apart
+STAGE_PROMPTS = {
+    prompts.DOMAIN_EXPERTISE.system: "determine_domain_expertise",
+    prompts.CHECK_FOR_CONFLICTS.system: "check_for_conflicts",
+    prompts.FIGURE_ANALYSIS.system: "extract_figures_and_text",
+    prompts.FILED_APPLICATION_DETAILS.system: "extract_details_from_filed_application",
+    prompts.MODIFY_FILED_APPLICATION.system: "extract_and_modify_filed_application",
+    prompts.ANALYZE_FILED_APPLICATION.system: "analyze_filed_application",
+    prompts.ANALYZE_MODIFIED_APPLICATION.system: "analyze_modified_application",
+    prompts.REPAIR_JSON_SYNTAX.system: "repair_json_syntax",
+}
+
+
+def load_chat_replies(path=None):
+    """Return the recorded reply text of each stage; JSON replies are stored as objects."""
+    with open(path or os.path.join(FIXTURES_DIR, "chat_replies.json"), encoding="utf-8") as f:
+        replies = json.load(f)
+    return {stage: reply if isinstance(reply, str) else json.dumps(reply, indent=2) for stage, reply in replies.items()}
+
+
+def request_stage(messages):
+    """Return the stage of a chat request; follow-up turns asking for part of a reply again are "<stage>_repair"."""
+    stage = STAGE_PROMPTS.get(messages[0]["content"] if messages else None, "unknown")
+    if any(message["role"] == "assistant" for message in messages):
+        return f"{stage}_repair"
+    return stage
+
+
+def recorded_page_texts(document):
+    """Return the text of each page of a PDF: its recorded OCR text, or a placeholder."""
+    page_texts = []
+    with fitz.open(stream=document, filetype="pdf") as pdf_document:
+        for number, page in enumerate(pdf_document, start=1):
+            recorded = [annot.info.get("content", "") for annot in page.annots()]
+            page_texts.append("\n".join(recorded) if any(recorded) else PLACEHOLDER_PAGE_TEXT.format(number=number))
+    return page_texts
+
+
+class MockAzure:
+    """Fixtures, simulated service behavior and per-stage counters shared by the mock's request handlers."""
+
+    def __init__(self, chat_replies=None, latency=0.0, token_latency=0.0, ocr_latency=0.0, ocr_page_latency=0.0,
+                 throttle_rate=0.0, failure_rate=0.0, retry_after=0.2, seed=0):
+        self.chat_replies = chat_replies if chat_replies is not None else load_chat_replies()
+        self.latency = latency
+        self.token_latency = token_latency
+        self.ocr_latency = ocr_latency
+        self.ocr_page_latency = ocr_page_latency
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.stages = {}
+        self.operations = {}  # Analyze operation id -> (ready time, result)
+        self._lock = threading.Lock()
+
+    def record(self, stage, **counts):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {
+                "requests": 0, "throttled": 0, "failed": 0, "request_bytes": 0, "response_bytes": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "pages": 0,
+            })
+            for name, value in counts.items():
+                entry[name] += value
+
+    def outcome(self):
+        """Return "throttled", "failed" or None (answer normally) for the next request."""
+        with self._lock:
+            draw = self.random.random()
+        if draw < self.throttle_rate:
+            return "throttled"
+        if draw < self.throttle_rate + self.failure_rate:
+            return "failed"
+        return None
+
+    def stats(self):
+        """Return a copy of the per-stage counters."""
+        with self._lock:
+            return {stage: dict(entry) for stage, entry in self.stages.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self.stages = {}
+
+
+class MockAzureHandler(BaseHTTPRequestHandler):
+    """Answers chat-completions and analyze requests from the fixtures of server.mock."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real services
+    disable_nagle_algorithm = True
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def _send(self, status, data, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        return len(data)
+
+    def _send_json(self, status, body, headers=None):
+        return self._send(status, json.dumps(body).encode("utf-8"), headers=headers)
+
+    def _send_error_outcome(self, stage, outcome, request_bytes):
+        if outcome == "throttled":
+            self._send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded (mock)."}},
+                            {"Retry-After": str(self.mock.retry_after)})
+            self.mock.record(stage, requests=1, throttled=1, request_bytes=request_bytes)
+        else:
+            self._send_json(500, {"error": {"code": "InternalServerError", "message": "Simulated failure (mock)."}})
+            self.mock.record(stage, requests=1, failed=1, request_bytes=request_bytes)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if "/chat/completions" in self.path:
+            self._chat_completion(body)
+        else:
+            self._begin_analyze(body)
+
+    def do_GET(self):
+        operation_id = self.path.split("/analyzeResults/")[-1].split("?")[0]
+        with self.mock._lock:
+            ready, result = self.mock.operations.pop(operation_id, (None, None))
+        if result is None:
+            self._send_json(404, {"error": {"code": "NotFound", "message": "Unknown analyze operation (mock)."}})
+            return
+        # The first status request waits for the simulated analysis, so the client never sleeps between polls
+        time.sleep(max(0.0, ready - time.monotonic()))
+        response_bytes = self._send_json(200, result)
+        self.mock.record("form_recognizer", response_bytes=response_bytes)
+
+    def _chat_completion(self, body):
+        request = json.loads(body)
+        stage = request_stage(request.get("messages", []))
+        outcome = self.mock.outcome()
+        if outcome:
+            self._send_error_outcome(stage, outcome, len(body))
+            return
+
+        # Repairs only happen with custom fixtures, which can record them under "<stage>_repair"
+        content = self.mock.chat_replies.get(stage, "{}")
+        prompt_tokens = sum(count_tokens(str(message.get("content", ""))) for message in request.get("messages", []))
+        completion_tokens = count_tokens(content)
+        time.sleep(self.mock.latency + self.mock.token_latency * completion_tokens)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+
+        created = int(time.time())
+        if request.get("stream"):
+            events = []
+            for start in range(0, len(content), 40):
+                events.append({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                               "model": "gpt-4o", "choices": [{"index": 0, "delta": {"content": content[start:start + 40]},
+                                                               "finish_reason": None}]})
+            events.append({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                           "model": "gpt-4o", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (request.get("stream_options") or {}).get("include_usage"):
+                events.append({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                               "model": "gpt-4o", "choices": [], "usage": usage})
+            data = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+            response_bytes = self._send(200, data.encode("utf-8"), content_type="text/event-stream")
+        else:
+            response_bytes = self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": "gpt-4o",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+        self.mock.record(stage, requests=1, request_bytes=len(body), response_bytes=response_bytes,
+                         prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def _begin_analyze(self, body):
+        outcome = self.mock.outcome()
+        if outcome:
+            self._send_error_outcome("form_recognizer", outcome, len(body))
+            return
+
+        page_texts = recorded_page_texts(body)
+        pages = []
+        offset = 0
+        for number, page_text in enumerate(page_texts, start=1):
+            lines = []
+            for line in page_text.split("\n"):
+                lines.append({"content": line, "polygon": [], "spans": [{"offset": offset, "length": len(line)}]})
+                offset += len(line) + 1
+            pages.append({"pageNumber": number, "angle": 0, "width": 8.5, "height": 11, "unit": "inch",
+                          "spans": [], "lines": lines})
+        result = {
+            "status": "succeeded",
+            "createdDateTime": "2024-01-01T00:00:00Z",
+            "lastUpdatedDateTime": "2024-01-01T00:00:00Z",
+            "analyzeResult": {"apiVersion": ANALYZE_API_VERSION, "modelId": "prebuilt-document",
+                              "content": "\n".join(page_texts), "pages": pages},
+        }
+        operation_id = uuid.uuid4().hex
+        ready = time.monotonic() + self.mock.ocr_latency + self.mock.ocr_page_latency * len(pages)
+        with self.mock._lock:
+            self.mock.operations[operation_id] = (ready, result)
+
+        model_path = self.path.split("?")[0].removesuffix(":analyze")
+        location = f"http://{self.headers['Host']}{model_path}/analyzeResults/{operation_id}?api-version={ANALYZE_API_VERSION}"
+        self._send_json(202, {}, {"Operation-Location": location})
+        self.mock.record("form_recognizer", requests=1, pages=len(pages), request_bytes=len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(mock, port=0):
+    """Serve the mock on 127.0.0.1 in a background thread; returns the server and its endpoint URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockAzureHandler)
+    server.daemon_threads = True
+    server.mock = mock
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def add_mock_arguments(parser):
+    """Add the options that configure the mock's latency, throttling and failures."""
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per chat completion request")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="extra seconds per completion token")
+    parser.add_argument("--ocr-latency", type=float, default=0.0, help="seconds per document analysis request")
+    parser.add_argument("--ocr-page-latency", type=float, default=0.0, help="extra seconds per analyzed page")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered 500")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="Retry-After seconds of 429 answers")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the throttling and failure draws")
+    parser.add_argument("--replies", help="chat replies fixture to use instead of fixtures/chat_replies.json")
+
+
+def mock_from_arguments(args):
+    return MockAzure(
+        chat_replies=load_chat_replies(args.replies), latency=args.latency, token_latency=args.token_latency,
+        ocr_latency=args.ocr_latency, ocr_page_latency=args.ocr_page_latency, throttle_rate=args.throttle_rate,
+        failure_rate=args.failure_rate, retry_after=args.retry_after, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server, endpoint = start_mock_server(mock_from_arguments(args), args.port)
+    print(f"Mock Azure endpoints at {endpoint} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Persistent checkpoints of the analysis steps' results.
+
+A step's result is stored under a key made from the step name and everything
+that determines the result: the SHA-256 hashes of its input documents and the
+upstream outputs it builds on (persona, conflict results, figure analysis,
+...). Opening the same documents again, after a page refresh, a crash or a
+redeploy, finds each step's checkpoint and resumes from the last completed
+step without repeating the OCR and LLM work. A changed document or upstream
+result changes the key of that step and of every step after it.
+"""
+import hashlib
+import json
+import time
+import zlib
+
+from disk_store import DiskStore
+
+DEFAULT_CHECKPOINT_DIR = ".checkpoints"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def document_hash(file_content):
+    """Return the SHA-256 hex digest of a document's bytes (any bytes-like object)."""
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def checkpoint_key(step, inputs):
+    """Return the checkpoint key of a step for its JSON-serializable inputs (document hashes, upstream outputs)."""
+    encoded = json.dumps({"step": step, "inputs": inputs}, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class CheckpointStore(DiskStore):
+    """Disk-backed step results with size-bounded LRU eviction."""
+
+    def __init__(self, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(checkpoint_dir, ".json.z", max_bytes)
+        self.checkpoint_dir = checkpoint_dir
+
+    def get(self, key):
+        """Return the checkpointed result for a key, or None if there is none."""
+        entry = self._read(key, _decode)
+        return entry["result"] if entry is not None else None
+
+    def put(self, key, step, result):
+        """Store a step's result and evict old checkpoints if over budget."""
+        self._write(key, _encode({"created": time.time(), "step": step, "result": result}))
+
+
+def _encode(entry):
+    return zlib.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _decode(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
@@ -0,0 +1,119 @@
+"""Token-budgeted chunking and map-reduce helpers for documents that exceed a stage's context budget."""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character estimate if tiktoken isn't installed
+    tiktoken = None
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")  # GPT-4o tokenizer
+        except Exception:
+            _encoding = False  # Encoding files unavailable (e.g. offline); use the estimate
+    return _encoding or None
+
+
+def count_tokens(text):
+    """Count tokens locally with the GPT-4o tokenizer, or estimate ~4 characters per token."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_into_chunks(text, max_tokens, overlap_tokens=0):
+    """
+    Split text on line boundaries into chunks of at most max_tokens tokens.
+    Consecutive chunks share about overlap_tokens tokens of trailing context, so details
+    that straddle a boundary are seen whole by at least one chunk.
+    """
+    lines = text.split("\n")
+    line_tokens = [count_tokens(line) + 1 for line in lines]
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = start
+        total = 0
+        # Always take at least one line so an oversized line can't stall the loop
+        while end < len(lines) and (end == start or total + line_tokens[end] <= max_tokens):
+            total += line_tokens[end]
+            end += 1
+        chunks.append("\n".join(lines[start:end]))
+        if end >= len(lines):
+            break
+
+        # Step back over trailing lines to build the overlap, without going backwards
+        next_start = end
+        overlap = 0
+        while next_start - 1 > start and overlap + line_tokens[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += line_tokens[next_start]
+        start = next_start
+    return chunks
+
+
+def plan_chunks(text, max_tokens, overlap_tokens=0):
+    """Return [text] if it fits within max_tokens, otherwise its overlapping chunks."""
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    return split_into_chunks(text, max_tokens, overlap_tokens)
+
+
+def map_chunks(map_fn, chunks, max_workers=4):
+    """Call map_fn on every chunk in parallel and return the results in chunk order.
+
+    Each call runs in a copy of the caller's context, so context variables (e.g. a cache
+    bypass flag) apply in the worker threads too.
+    """
+    if len(chunks) == 1:
+        return [map_fn(chunks[0])]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, map_fn, chunk) for chunk in chunks]
+        return [future.result() for future in futures]
+
+
+def _normalize(value):
+    return " ".join(str(value).lower().split())
+
+
+def merge_unique(items, key_field=None, text_field=None):
+    """
+    Merge items from several chunks, dropping duplicates from chunk overlaps.
+
+    Items are duplicates if they are equal after normalizing whitespace and case, or if
+    they share key_field and one text_field contains the other (the longer is kept).
+    """
+    merged = []
+    seen = set()
+    for item in items:
+        signature = _normalize(item if not isinstance(item, dict) else sorted(item.items()))
+        if signature in seen:
+            continue
+        seen.add(signature)
+
+        if isinstance(item, dict) and key_field and text_field:
+            key = _normalize(item.get(key_field, ""))
+            text = _normalize(item.get(text_field, ""))
+            duplicate = False
+            for i, existing in enumerate(merged):
+                if not isinstance(existing, dict) or _normalize(existing.get(key_field, "")) != key:
+                    continue
+                existing_text = _normalize(existing.get(text_field, ""))
+                if text in existing_text:
+                    duplicate = True
+                    break
+                if existing_text in text:
+                    merged[i] = item
+                    duplicate = True
+                    break
+            if duplicate:
+                continue
+        merged.append(item)
+    return merged
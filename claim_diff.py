@@ -0,0 +1,186 @@
+"""Claim-level view of a pending claims document, for re-analyzing only what changed.
+
+The document text is split into its numbered claims, and the claims are grouped
+into units of one independent claim with the claims that depend on it ("The
+device of claim 1, wherein ..."), since amending a parent changes what its
+dependents claim. Each claim and each unit is hashed; comparing the claim
+hashes with the claim set analyzed last time gives the added, changed,
+unchanged and removed claims, and Step 4 reuses the work done for every unit
+whose hash it has seen before. The reports of the units are merged into one
+report with each heading of the report template once.
+"""
+import functools
+import hashlib
+import re
+
+from patent_document import CLAIM_START
+
+# Status identifiers of an amendment's claim listing for claims that are no longer pending
+CLAIM_NOT_PENDING = re.compile(r"^\s*\d{1,3}\s*\.\s*\((?:canceled|cancelled|withdrawn)\)", re.IGNORECASE)
+CLAIM_REFERENCE = re.compile(r"\bclaims?\s+(\d{1,3}(?:\s*(?:,|-|–|to|through|or|and)\s*\d{1,3})*)", re.IGNORECASE)
+CLAIM_RANGE = re.compile(r"(\d{1,3})\s*(?:-|–|to|through)\s*(\d{1,3})")
+LEADING_NUMBER = re.compile(r"^\s*\d{1,3}\s*\.\s*")
+# Status identifiers of an amendment's claim listing, e.g. "(Currently Amended)", which change between rounds
+STATUS_MARKER = re.compile(
+    r"\(\s*(?:original|currently\s+amended|previously\s+presented|new|not\s+entered|canceled|cancelled|withdrawn"
+    r"(?:\s*[-–]\s*currently\s+amended)?)\s*\)",
+    re.IGNORECASE,
+)
+# Typographic or straight apostrophe in the report headings, e.g. "Examiner’s Analysis"
+APOSTROPHE = "[’']"
+
+
+def split_claims(text):
+    """
+    Return the claims in a pending claims text as a list of (number, text), in order.
+
+    Claims are the lines starting "1.", "2.", ... in sequence, each running up to the next
+    one, so numbered lines out of sequence (e.g. inside a claim) are kept with their claim.
+    Lines before claim 1, such as a "Listing of Claims" header, are not part of any claim.
+    """
+    claims = []
+    expected = 1
+    for line in text.split("\n"):
+        claim_start = CLAIM_START.match(line)
+        if claim_start and int(claim_start.group(1)) == expected:
+            claims.append((expected, [line]))
+            expected += 1
+        elif claims:
+            claims[-1][1].append(line)
+    return [(number, "\n".join(lines).strip()) for number, lines in claims]
+
+
+def is_pending(claim_text):
+    """Return whether a claim is still pending, i.e. not marked (Canceled) or (Withdrawn)."""
+    return not CLAIM_NOT_PENDING.match(claim_text)
+
+
+def referenced_claims(number, claim_text):
+    """Return the lower-numbered claims a claim refers to, e.g. [1] for "The device of claim 1"."""
+    referenced = set()
+    for group in CLAIM_REFERENCE.findall(claim_text):
+        for start, end in CLAIM_RANGE.findall(group):
+            referenced.update(range(int(start), int(end) + 1))
+        referenced.update(int(value) for value in re.findall(r"\d{1,3}", group))
+    return sorted(value for value in referenced if value < number)
+
+
+def claim_units(claims):
+    """
+    Group claims into units of an independent claim and the claims depending on it, as {number: [numbers]}.
+
+    Units are keyed by their independent claim and list their claims in order. A claim that
+    depends on claims of several units (e.g. "any of claims 1 or 5") joins the unit of its
+    lowest-numbered parent; a claim whose parents aren't in claims starts a unit of its own.
+    """
+    numbers = [number for number, _ in claims]
+    root = {}
+    for number, text in claims:
+        parents = [parent for parent in referenced_claims(number, text) if parent in root]
+        root[number] = root[parents[0]] if parents else number
+    units = {}
+    for number in numbers:
+        units.setdefault(root[number], []).append(number)
+    return units
+
+
+def claim_hash(claim_text):
+    """
+    Return the hash of a claim's text.
+
+    Whitespace is normalized and the claim's own number and status identifiers such as
+    "(Currently Amended)" dropped, so a claim reflowed by OCR, renumbered or relabeled
+    between rounds without other changes keeps its hash.
+    """
+    normalized = " ".join(STATUS_MARKER.sub("", LEADING_NUMBER.sub("", claim_text, count=1)).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def unit_hash(claim_hashes):
+    """Return the hash of a unit from the hashes of its claims, in order."""
+    return hashlib.sha256("\n".join(claim_hashes).encode("utf-8")).hexdigest()
+
+
+def diff_claims(previous, current):
+    """
+    Compare two claim sets given as {number: hash}.
+
+    Returns the claim numbers that were added, changed, left unchanged and removed; a
+    claim is matched to the previous claim of the same number.
+    """
+    previous = {int(number): value for number, value in (previous or {}).items()}
+    return {
+        "added": [number for number in current if number not in previous],
+        "changed": [number for number in current if number in previous and previous[number] != current[number]],
+        "unchanged": [number for number in current if previous.get(number) == current[number]],
+        "removed": [number for number in previous if number not in current],
+    }
+
+
+def unit_label(numbers):
+    """Return the label of a claim unit in the merged report, e.g. "Claims 1, 2 and 5"."""
+    if len(numbers) == 1:
+        return f"Claim {numbers[0]}"
+    return f"Claims {', '.join(str(number) for number in numbers[:-1])} and {numbers[-1]}"
+
+
+@functools.lru_cache(maxsize=None)
+def _heading_pattern(headings):
+    # A line of just a heading, as bold, Markdown or "Heading:" text, possibly with a parenthetical
+    # such as "(U.S.C 102 - Lack of Novelty)"; text after its colon starts the section
+    names = "|".join(
+        f"(?P<heading{index}>{re.escape(heading).replace('’', APOSTROPHE)})" for index, heading in enumerate(headings)
+    )
+    return re.compile(
+        rf"^(?P<line>[\s#*:]*(?:{names})s?(?:\s*\([^)\n]*\))?[\s*]*(?::|$)[\s*]*)(?P<text>.*?)\s*$", re.IGNORECASE
+    )
+
+
+def split_report(text, headings):
+    """
+    Split a report at the given headings, as (text before the first heading, {heading: (line, text)}).
+
+    Each section is keyed by the heading it starts with and holds the heading line as written and
+    its text; a heading found again continues its section.
+    """
+    pattern = _heading_pattern(tuple(headings))
+    preamble = []
+    sections = {}
+    lines = preamble
+    for line in text.split("\n"):
+        match = pattern.match(line)
+        if match is None:
+            lines.append(line)
+            continue
+        heading = next(heading for index, heading in enumerate(headings) if match.group(f"heading{index}"))
+        lines = sections.setdefault(heading, (match.group("line").strip(), []))[1]
+        if match.group("text"):
+            lines.append(match.group("text"))
+    return (
+        "\n".join(preamble).strip(),
+        {heading: (line, "\n".join(lines).strip()) for heading, (line, lines) in sections.items()},
+    )
+
+
+def merge_unit_reports(reports, headings):
+    """
+    Merge the reports of several claim units, given as [(label, text)], into one report.
+
+    Each heading appears once, in the order of headings, followed by every unit's section under
+    the unit's label; text of a unit before its first heading comes first. A single report is
+    returned as it is.
+    """
+    if len(reports) == 1:
+        return reports[0][1]
+    parts = []
+    split = [(label, split_report(text, headings)) for label, text in reports]
+    for label, (preamble, _) in split:
+        if preamble:
+            parts.append(f"**{label}:**\n{preamble}")
+    for heading in headings:
+        unit_sections = [(label, sections[heading]) for label, (_, sections) in split if heading in sections]
+        if not unit_sections:
+            continue
+        parts.append(unit_sections[0][1][0])
+        parts.extend(f"**{label}:**\n{text}" if text else f"**{label}:**" for label, (_, text) in unit_sections)
+    return "\n\n".join(parts)
@@ -0,0 +1,89 @@
+"""Factories for the Azure SDK clients, configured for sharing across threads.
+
+The app creates one client per service for the whole process, so connections
+(and their TLS sessions) are kept alive and reused between calls instead of
+being set up again for every step. Both SDK clients are safe to share between
+threads; the connection pools are sized for the app's worker pools.
+
+The SDKs are the slowest imports of the app, so they are only imported by the
+factories, and the process-wide clients are wrapped in a LazyClient that calls
+its factory on first use: a session that never reaches an OCR or LLM call
+doesn't load them at all.
+"""
+import sys
+import threading
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_SECONDS = 120.0
+
+
+def create_openai_client(endpoint, api_key, api_version, max_connections=DEFAULT_MAX_CONNECTIONS,
+                         keepalive_seconds=DEFAULT_KEEPALIVE_SECONDS, max_retries=2):
+    """Return an AzureOpenAI client with a keep-alive connection pool of max_connections."""
+    import openai
+    from openai import AzureOpenAI
+
+    # Limits of the HTTP library the SDK is built on, so the pool matches the SDK's own client type
+    limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=keepalive_seconds,
+    )
+    return AzureOpenAI(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=api_version,
+        max_retries=max_retries,
+        http_client=openai.DefaultHttpxClient(limits=limits),
+    )
+
+
+def create_document_analysis_client(endpoint, api_key, max_connections=DEFAULT_MAX_CONNECTIONS, **kwargs):
+    """Return a DocumentAnalysisClient whose transport keeps up to max_connections connections alive.
+
+    Extra keyword arguments (e.g. retry_total) are passed to the client's pipeline.
+    """
+    import requests
+    from azure.ai.formrecognizer import DocumentAnalysisClient
+    from azure.core.credentials import AzureKeyCredential
+    from azure.core.pipeline.transport import RequestsTransport
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return DocumentAnalysisClient(
+        endpoint=endpoint,
+        credential=AzureKeyCredential(api_key),
+        transport=RequestsTransport(session=session, session_owner=False),
+        **kwargs,
+    )
+
+
+class LazyClient:
+    """Stand-in for a process-wide client that is created by factory() on first attribute access."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the client, creating it if this is the first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def is_http_response_error(error):
+    """Return True for an error response of an Azure service.
+
+    Doesn't import the Azure SDK: if it hasn't been loaded, no call could have raised one.
+    """
+    exceptions = sys.modules.get("azure.core.exceptions")
+    return exceptions is not None and isinstance(error, exceptions.HttpResponseError)
@@ -0,0 +1,123 @@
+"""Size-bounded directory of entries, shared by the OCR, LLM, checkpoint and artifact caches.
+
+Each entry is one file named after its key. Entries are written to a temp file
+and renamed into place, so readers never see a partial entry, and the least
+recently used entries are removed once the directory grows past its budget.
+Recency is tracked through file modification times, so the LRU order survives
+restarts and is shared by every process using the same directory.
+"""
+import os
+import tempfile
+import threading
+import zlib
+
+# Errors of decoding a damaged entry, which is dropped and treated as a miss
+CORRUPT_ENTRY_ERRORS = (zlib.error, UnicodeDecodeError, ValueError)
+
+
+class DiskStore:
+    """Disk-backed entries with one file suffix, with hit/miss counters and size-bounded LRU eviction.
+
+    Subclasses derive the keys and (de)serialize the entries, through _read and _write.
+    """
+
+    def __init__(self, directory, suffix, max_bytes):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _read(self, key, decode, expired=None):
+        """
+        Return the entry stored under key as decoded by decode(data), or None on a miss.
+
+        Entries decode fails on are corrupt and removed, as are entries for which expired(value)
+        is true.
+        """
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+
+            try:
+                value = decode(data)
+            except CORRUPT_ENTRY_ERRORS:
+                # Corrupt entry: drop it and treat the lookup as a miss
+                _remove(path)
+                self.misses += 1
+                return None
+
+            if expired is not None and expired(value):
+                _remove(path)
+                self.misses += 1
+                return None
+
+            os.utime(path)  # Mark as most recently used
+            self.hits += 1
+            return value
+
+    def _write(self, key, data):
+        """Store the encoded entry under key and evict old entries if over budget."""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self._lock:
+            # Write to a temp file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _entries(self):
+        """Return the entries on disk as (modification time, size, file name)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(os.path.join(self.directory, name))
+            total -= size
+
+    def stats(self):
+        """Return hit/miss counters for this process and the current disk usage."""
+        with self._lock:
+            entries = self._entries()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(entries),
+                "disk_bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
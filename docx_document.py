@@ -0,0 +1,314 @@
+"""Native text extraction from Word documents, without converting them to PDF or OCR.
+
+The document's XML is read with python-docx and turned into the same page texts
+the PDF path produces, so a DOCX office action, filed application or claim set
+is parsed into a PatentDocument like an OCR'd PDF. What plain paragraph text
+would lose is kept:
+
+- automatic paragraph and list numbering ("[0012]", "1.", "(a)") is rendered from
+  the numbering definitions, so numbered paragraphs and claims are found;
+- tables are read row by row, one line per row with the cells separated by " | ";
+- header and footer text is kept once, at the top of the first page, where the
+  OCR of a PDF would read it;
+- footnotes and endnotes are marked in the text as [^1] and listed after the
+  body under a FOOTNOTES heading.
+
+A Word file has no fixed layout, so its pages are the explicit page and section
+breaks. Tracked deletions and the fallback copies of text boxes are skipped.
+"""
+import os
+import re
+from io import BytesIO
+
+import docx
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml.ns import qn
+from lxml import etree
+
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+# Elements whose text isn't part of the document as it reads
+SKIPPED_ELEMENTS = {qn("w:del"), qn("w:instrText"), qn("w:delText"), qn("w:rPr"), qn("w:pPr"), MC_FALLBACK}
+ROMAN_NUMERALS = ((1000, "m"), (900, "cm"), (500, "d"), (400, "cd"), (100, "c"), (90, "xc"),
+                  (50, "l"), (40, "xl"), (10, "x"), (9, "ix"), (5, "v"), (4, "iv"), (1, "i"))
+LEVEL_PLACEHOLDER = re.compile(r"%([1-9])")
+
+
+def _roman(value):
+    numeral = ""
+    for amount, letters in ROMAN_NUMERALS:
+        count, value = divmod(value, amount)
+        numeral += letters * count
+    return numeral
+
+
+def _letters(value):
+    # Word repeats the letter past z: a ... z, aa ... zz, aaa ...
+    return chr(ord("a") + (value - 1) % 26) * ((value - 1) // 26 + 1) if value > 0 else ""
+
+
+def format_number(value, number_format):
+    """Return a list counter in a Word numbering format (decimal, decimalZero, lowerLetter, upperRoman, ...)."""
+    if number_format == "decimalZero":
+        return f"{value:02d}"
+    if number_format in ("lowerLetter", "upperLetter"):
+        letters = _letters(value)
+        return letters.upper() if number_format == "upperLetter" else letters
+    if number_format in ("lowerRoman", "upperRoman"):
+        numeral = _roman(value)
+        return numeral.upper() if number_format == "upperRoman" else numeral
+    if number_format == "none":
+        return ""
+    return str(value)
+
+
+def _value(element, path):
+    """Return the w:val attribute of the first element at path under element, or None."""
+    found = element.find(path) if element is not None else None
+    return found.get(qn("w:val")) if found is not None else None
+
+
+def _related_xml(part, relationship_type):
+    """Return the parsed XML of the part related to part by relationship_type, or None if there is none."""
+    try:
+        return etree.fromstring(part.part_related_by(relationship_type).blob)
+    except KeyError:
+        return None
+
+
+class Numbering:
+    """
+    Renders the automatic numbering of paragraphs as Word displays it.
+
+    Counters are kept per abstract numbering definition, so lists sharing a definition
+    continue each other, and a list instance with a start override restarts them.
+    """
+
+    def __init__(self, numbering_xml, styles_xml):
+        self.levels = {}  # abstractNumId -> {ilvl: (start, format, text)}
+        self.instances = {}  # numId -> (abstractNumId, {ilvl: start override})
+        self.style_numbering = {}  # styleId -> (numId, ilvl)
+        self.counters = {}  # abstractNumId -> {ilvl: value}
+        self.restarted = set()
+
+        if numbering_xml is not None:
+            for abstract in numbering_xml.iterfind(qn("w:abstractNum")):
+                self.levels[abstract.get(qn("w:abstractNumId"))] = {
+                    int(level.get(qn("w:ilvl"))): (
+                        int(_value(level, qn("w:start")) or 1),
+                        _value(level, qn("w:numFmt")) or "decimal",
+                        _value(level, qn("w:lvlText")) or "",
+                    )
+                    for level in abstract.iterfind(qn("w:lvl"))
+                }
+            for instance in numbering_xml.iterfind(qn("w:num")):
+                overrides = {
+                    int(override.get(qn("w:ilvl"))): int(_value(override, qn("w:startOverride")))
+                    for override in instance.iterfind(qn("w:lvlOverride"))
+                    if _value(override, qn("w:startOverride")) is not None
+                }
+                self.instances[instance.get(qn("w:numId"))] = (_value(instance, qn("w:abstractNumId")), overrides)
+
+        if styles_xml is not None:
+            styles = {style.get(qn("w:styleId")): style for style in styles_xml.iterfind(qn("w:style"))}
+            for style_id in styles:
+                numbering = self._style_numbering(styles, style_id, set())
+                if numbering:
+                    self.style_numbering[style_id] = numbering
+
+    def _style_numbering(self, styles, style_id, seen):
+        # Numbering set on a style applies to the styles based on it
+        style = styles.get(style_id)
+        if style is None or style_id in seen:
+            return None
+        seen.add(style_id)
+        num_pr = style.find(f"{qn('w:pPr')}/{qn('w:numPr')}")
+        if num_pr is not None and _value(num_pr, qn("w:numId")) is not None:
+            return _value(num_pr, qn("w:numId")), int(_value(num_pr, qn("w:ilvl")) or 0)
+        return self._style_numbering(styles, _value(style, qn("w:basedOn")), seen)
+
+    def label(self, paragraph):
+        """Return the number label of a w:p element (e.g. "[0012]" or "2."), advancing the list; "" if it has none."""
+        properties = paragraph.find(qn("w:pPr"))
+        num_pr = properties.find(qn("w:numPr")) if properties is not None else None
+        style_numbering = self.style_numbering.get(_value(properties, qn("w:pStyle")))
+        num_id = _value(num_pr, qn("w:numId"))
+        if num_id is None and style_numbering:
+            num_id = style_numbering[0]
+        if num_id is None or num_id == "0" or num_id not in self.instances:
+            return ""
+        level_value = _value(num_pr, qn("w:ilvl"))
+        level = int(level_value) if level_value is not None else (style_numbering[1] if style_numbering else 0)
+
+        abstract_id, overrides = self.instances[num_id]
+        levels = self.levels.get(abstract_id, {})
+        if level not in levels:
+            return ""
+        counters = self.counters.setdefault(abstract_id, {})
+        if overrides and num_id not in self.restarted:
+            self.restarted.add(num_id)
+            counters.clear()
+        start, number_format, text = levels[level]
+        counters[level] = counters[level] + 1 if level in counters else overrides.get(level, start)
+        for deeper_level in [counted for counted in counters if counted > level]:
+            del counters[deeper_level]
+        if number_format == "bullet":
+            return "-"
+
+        def placeholder(match):
+            shown = int(match.group(1)) - 1
+            shown_start, shown_format, _ = levels.get(shown, (1, "decimal", ""))
+            return format_number(counters.get(shown, overrides.get(shown, shown_start)), shown_format)
+
+        return LEVEL_PLACEHOLDER.sub(placeholder, text)
+
+
+class _Reader:
+    """Walks the body XML, collecting lines and starting a new page at each explicit break."""
+
+    def __init__(self, numbering):
+        self.numbering = numbering
+        self.pages = [[]]
+
+    def new_page(self):
+        if self.pages[-1]:
+            self.pages.append([])
+
+    def add_lines(self, text):
+        self.pages[-1].extend(line.strip() for line in text.split("\n") if line.strip())
+
+    def block(self, element):
+        """Read a body-level element: a paragraph, a table or a content control holding them."""
+        if element.tag == qn("w:p"):
+            properties = element.find(qn("w:pPr"))
+            if properties is not None and properties.find(qn("w:pageBreakBefore")) is not None:
+                self.new_page()
+            self.paragraph(element)
+            if properties is not None and properties.find(qn("w:sectPr")) is not None:
+                self.new_page()  # A section break inside the body ends the paragraph's section
+        elif element.tag == qn("w:tbl"):
+            for row in element.iterfind(qn("w:tr")):
+                cells = [" ".join(cell_text(cell, self.numbering).split()) for cell in row.iterfind(qn("w:tc"))]
+                if any(cells):
+                    self.add_lines(" | ".join(cells))
+        elif element.tag == qn("w:sdt"):
+            content = element.find(qn("w:sdtContent"))
+            for child in content if content is not None else ():
+                self.block(child)
+
+    def paragraph(self, element):
+        parts = []
+        label = self.numbering.label(element)
+        if label:
+            parts.append(label + " ")
+        for item in run_content(element):
+            if item is PAGE_BREAK:
+                self.add_lines("".join(parts))
+                parts = []
+                self.new_page()
+            else:
+                parts.append(item)
+        self.add_lines("".join(parts))
+
+
+PAGE_BREAK = object()
+
+
+def run_content(element):
+    """Yield the text of an element in reading order, with PAGE_BREAK at explicit page breaks."""
+    for child in element:
+        tag = child.tag
+        if not isinstance(tag, str) or tag in SKIPPED_ELEMENTS:
+            continue
+        if tag == qn("w:t"):
+            yield child.text or ""
+        elif tag == qn("w:tab"):
+            yield "\t"
+        elif tag in (qn("w:br"), qn("w:cr")):
+            yield PAGE_BREAK if child.get(qn("w:type")) == "page" else "\n"
+        elif tag == qn("w:noBreakHyphen"):
+            yield "-"
+        elif tag == qn("w:footnoteReference"):
+            yield f"[^{child.get(qn('w:id'))}]"
+        elif tag == qn("w:endnoteReference"):
+            yield f"[^e{child.get(qn('w:id'))}]"
+        elif tag == qn("w:p"):
+            # A paragraph nested in a run, i.e. in a text box
+            yield "\n"
+            yield from run_content(child)
+            yield "\n"
+        else:
+            yield from run_content(child)
+
+
+def paragraph_text(element, numbering):
+    """Return the text of a w:p element with its number label; page breaks become line breaks."""
+    label = numbering.label(element)
+    text = "".join("\n" if item is PAGE_BREAK else item for item in run_content(element))
+    return f"{label} {text}" if label else text
+
+
+def cell_text(cell, numbering):
+    """Return the text of a table cell, including the tables nested in it."""
+    parts = []
+    for child in cell:
+        if child.tag == qn("w:p"):
+            parts.append(paragraph_text(child, numbering))
+        elif child.tag == qn("w:tbl"):
+            parts.extend(cell_text(nested, numbering) for row in child.iterfind(qn("w:tr")) for nested in row.iterfind(qn("w:tc")))
+    return " ".join(parts)
+
+
+def _header_footer_lines(document, numbering):
+    lines = []
+    for section in document.sections:
+        parts = [section.header, section.footer]
+        if section.different_first_page_header_footer:
+            parts += [section.first_page_header, section.first_page_footer]
+        for part in parts:
+            if part.is_linked_to_previous:
+                continue
+            for element in part._element:
+                text = cell_text(element, numbering) if element.tag == qn("w:tbl") else (
+                    paragraph_text(element, numbering) if element.tag == qn("w:p") else "")
+                for line in text.split("\n"):
+                    line = line.strip()
+                    if line and line not in lines:
+                        lines.append(line)
+    return lines
+
+
+def _note_lines(part, relationship_type, tag, prefix, numbering):
+    notes_xml = _related_xml(part, relationship_type)
+    if notes_xml is None:
+        return []
+    lines = []
+    for note in notes_xml.iterfind(qn(tag)):
+        if note.get(qn("w:type")) in ("separator", "continuationSeparator", "continuationNotice"):
+            continue
+        text = " ".join(" ".join(paragraph_text(p, numbering).split()) for p in note.iter(qn("w:p")))
+        if text.strip():
+            lines.append(f"[^{prefix}{note.get(qn('w:id'))}]: {text.strip()}")
+    return lines
+
+
+def docx_page_texts(source):
+    """
+    Return the text of a Word document as a list of page texts, one line per text line.
+
+    source is a file path or the document's content (any bytes-like object).
+    """
+    document = docx.Document(source if isinstance(source, (str, os.PathLike)) else BytesIO(source))
+    part = document.part
+    numbering = Numbering(_related_xml(part, RELATIONSHIP_TYPE.NUMBERING), _related_xml(part, RELATIONSHIP_TYPE.STYLES))
+
+    reader = _Reader(numbering)
+    reader.pages[0].extend(_header_footer_lines(document, numbering))
+    for element in document.element.body:
+        reader.block(element)
+
+    notes = (_note_lines(part, RELATIONSHIP_TYPE.FOOTNOTES, "w:footnote", "", numbering)
+             + _note_lines(part, RELATIONSHIP_TYPE.ENDNOTES, "w:endnote", "e", numbering))
+    if notes:
+        reader.pages[-1].extend(["FOOTNOTES"] + notes)
+    pages = [page for page in reader.pages if page] or [[]]
+    return ["".join(line + "\n" for line in page) for page in pages]
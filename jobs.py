@@ -0,0 +1,227 @@
+"""SQLite-backed queue of background jobs for the long-running analysis steps.
+
+A job's status, progress and result are rows in a local SQLite database, so
+they outlive the Streamlit script run that submitted the job: widget
+interactions, reruns and page reloads no longer abandon an analysis in flight,
+and the page polls the job instead of blocking on it. A process-wide pool of
+worker threads runs the jobs, so jobs submitted from different sessions run in
+parallel (sharing the process-wide clients, caches and rate limits).
+
+A job's input documents are held in memory, as the bytes (or buffer views) the
+caller submitted, and handed to the handler without touching the disk. They
+don't survive a restart, so one app process should own a database: jobs found
+queued or running when the queue starts were interrupted and are marked failed.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+DEFAULT_DB_PATH = os.path.join(".jobs", "jobs.sqlite3")
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RETENTION_SECONDS = 24 * 60 * 60
+# Child of the "pipeline" logger, so pipeline.configure_logging and LOG_LEVEL apply to it
+logger = logging.getLogger("pipeline.jobs")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress REAL,
+    message TEXT,
+    partial TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class Job:
+    """A job as its handler sees it: the parameters, the input documents and progress reporting."""
+
+    def __init__(self, queue, job_id, kind, params, inputs, queue_seconds=0.0):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.inputs = inputs
+        self.queue_seconds = queue_seconds  # Time the job waited for a worker
+
+    def input(self, name):
+        """Return the content of an input document submitted with the job."""
+        return self.inputs[name]
+
+    def progress(self, message, fraction=None):
+        """Record what the job is doing and, if known, the fraction done (0-1)."""
+        self.queue._update(self.id, message=message, progress=fraction)
+
+    def stream(self, text):
+        """Record the text generated so far by a streaming stage, for display while the job runs."""
+        self.queue._update(self.id, partial=text)
+
+
+class JobQueue:
+    """
+    Background jobs run by a pool of worker threads, with their state kept in SQLite.
+
+    Handlers are registered per job kind and called as handler(job) on a worker thread.
+    They return a JSON-serializable result. An exception fails the job: the messages of
+    expected_errors are shown as they are, anything else as an unexpected error.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_workers=DEFAULT_MAX_WORKERS,
+                 retention_seconds=DEFAULT_RETENTION_SECONDS, expected_errors=()):
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        self.expected_errors = expected_errors
+        self.handlers = {}
+        self._inputs = {}  # Input documents of the jobs not yet finished, by job id
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+        self._started = False
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connection() as conn:
+            # WAL lets the page read job state while workers write progress
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self.prune()
+
+    @contextlib.contextmanager
+    def _connection(self):
+        # A connection per operation, since the workers and script threads all use the database
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def register(self, kind, handler):
+        """Run jobs of the given kind with handler(job)."""
+        self.handlers[kind] = handler
+
+    def start(self):
+        """Fail the jobs a previous process left queued or running, whose input documents are gone."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        with self._connection() as conn:
+            interrupted = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE status IN (?, ?)",
+                (FAILED, "The job was interrupted by a restart; please run the step again.", time.time(), QUEUED, RUNNING),
+            ).rowcount
+        if interrupted:
+            logger.warning("Marked %s interrupted job(s) as failed", interrupted)
+
+    def submit(self, kind, params, inputs=None):
+        """
+        Queue a job and return its id.
+
+        params must be JSON-serializable. inputs maps names to input documents, as bytes or
+        any bytes-like object (e.g. an upload's getbuffer() view, which keeps the upload alive
+        without copying it); the handler gets them with job.input(name). The job runs in a copy
+        of the caller's context, so context variables (e.g. the LLM cache bypass) carry over.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for {kind} jobs")
+        job_id = uuid.uuid4().hex
+        self._inputs[job_id] = dict(inputs or {})
+
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), time.time()),
+            )
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id)
+        return job_id
+
+    def add_finished(self, kind, params, result, message=None):
+        """
+        Record a job whose result is already known (e.g. restored from a checkpoint) and return its id.
+
+        Callers follow it like any other job, but it never waits for a worker.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, progress, message, result, created, started, finished)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, SUCCEEDED, json.dumps(params), 1.0, message, json.dumps(result), now, now, now),
+            )
+        return job_id
+
+    def get(self, job_id):
+        """Return the job's state as a dict, or None if there is no such job."""
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("params", "result"):
+            job[field] = json.loads(job[field]) if job[field] is not None else None
+        return job
+
+    def stats(self):
+        """Return the number of jobs per status."""
+        with self._connection() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+
+    def prune(self):
+        """Delete finished jobs older than the retention time."""
+        cutoff = time.time() - self.retention_seconds
+        with self._connection() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) AND finished < ?",
+                (*FINISHED_STATUSES, cutoff),
+            )
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connection() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _run(self, job_id):
+        # The job owns its input documents from here on; they are released with it
+        inputs = self._inputs.pop(job_id, {})
+        started = time.time()
+        with self._connection() as conn:
+            # Claim the job, unless it was marked failed since it was queued
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, started = ? WHERE id = ? AND status = ?",
+                (RUNNING, started, job_id, QUEUED),
+            ).rowcount
+            row = conn.execute("SELECT kind, params, created FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not claimed:
+            return
+
+        job = Job(self, job_id, row["kind"], json.loads(row["params"]), inputs, started - row["created"])
+        try:
+            result = self.handlers[job.kind](job)
+            self._update(job_id, status=SUCCEEDED, progress=1.0, result=json.dumps(result), finished=time.time())
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, job.kind)
+            error = str(e) if isinstance(e, self.expected_errors) else f"An unexpected error occurred: {e}"
+            self._update(job_id, status=FAILED, error=error, finished=time.time())
@@ -0,0 +1,73 @@
+"""Persistent cache for chat-completion responses.
+
+Entries are keyed by the model, temperature and whitespace-normalized messages,
+so re-running a step with identical inputs returns the earlier completion
+without calling the API.
+"""
+import hashlib
+import json
+import time
+import zlib
+
+from disk_store import DiskStore
+
+DEFAULT_CACHE_DIR = ".llm_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def normalize_messages(messages):
+    """Collapse whitespace in message content so cosmetic prompt differences share an entry."""
+    return [
+        {"role": message["role"], "content": " ".join(str(message["content"]).split())}
+        for message in messages
+    ]
+
+
+def completion_key(model, messages, temperature):
+    """Return the cache key for a chat-completion request."""
+    request = {
+        "model": model,
+        "temperature": temperature,
+        "messages": normalize_messages(messages),
+    }
+    encoded = json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class LlmCache(DiskStore):
+    """Disk-backed completion cache with a time-to-live and size-bounded LRU eviction."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        super().__init__(cache_dir, ".json.z", max_bytes)
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.expired = 0
+
+    def get(self, model, messages, temperature):
+        """Return the cached completion text for a request, or None on a miss."""
+        entry = self._read(completion_key(model, messages, temperature), _decode, expired=self._is_expired)
+        return entry["content"] if entry is not None else None
+
+    def put(self, model, messages, temperature, content):
+        """Store a completion and evict old entries if over budget."""
+        entry = {"created": time.time(), "model": model, "content": content}
+        self._write(completion_key(model, messages, temperature), _encode(entry))
+
+    def _is_expired(self, entry):
+        if time.time() - entry["created"] <= self.ttl_seconds:
+            return False
+        self.expired += 1
+        return True
+
+    def stats(self):
+        """Return hit/miss counters for this process and the current disk usage."""
+        return dict(super().stats(), expired=self.expired)
+
+
+def _encode(entry):
+    return zlib.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _decode(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
@@ -0,0 +1,67 @@
+"""Persistent, content-addressed cache for OCR output.
+
+Entries are keyed by the SHA-256 of the document bytes plus the OCR model id, so
+re-uploading the same reference or filed application (under any file name)
+skips the Form Recognizer round trip entirely.
+"""
+import hashlib
+import re
+import zlib
+
+from disk_store import DiskStore
+
+DEFAULT_CACHE_DIR = ".ocr_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# One-byte header on every entry so compressed and plain entries can coexist
+_PLAIN = b"T"
+_COMPRESSED = b"Z"
+
+
+def document_key(file_content, model_id):
+    """Return the cache key for a document: SHA-256 of its bytes plus the model id."""
+    digest = hashlib.sha256(file_content).hexdigest()
+    model = re.sub(r"[^A-Za-z0-9_.+-]", "_", model_id)
+    return f"{digest}-{model}"
+
+
+class OcrCache(DiskStore):
+    """Disk-backed OCR text cache with size-bounded LRU eviction."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, compress=True):
+        super().__init__(cache_dir, ".ocr", max_bytes)
+        self.cache_dir = cache_dir
+        self.compress = compress
+        self.bytes_saved = 0  # Document bytes that did not have to be sent for OCR
+
+    def get(self, file_content, model_id):
+        """Return the cached text for a document, or None on a miss."""
+        text = self._read(document_key(file_content, model_id), _decode)
+        if text is not None:
+            with self._lock:
+                self.bytes_saved += len(file_content)
+        return text
+
+    def put(self, file_content, model_id, text):
+        """Store the OCR text for a document and evict old entries if over budget."""
+        self._write(document_key(file_content, model_id), _encode(text, self.compress))
+
+    def stats(self):
+        """Return hit/miss counters for this process and the current disk usage."""
+        return dict(super().stats(), bytes_saved=self.bytes_saved)
+
+
+def _encode(text, compress):
+    raw = text.encode("utf-8")
+    if compress:
+        return _COMPRESSED + zlib.compress(raw, 6)
+    return _PLAIN + raw
+
+
+def _decode(data):
+    header, body = data[:1], data[1:]
+    if header == _COMPRESSED:
+        return zlib.decompress(body).decode("utf-8")
+    if header == _PLAIN:
+        return body.decode("utf-8")
+    raise ValueError("Unknown OCR cache entry format")
@@ -0,0 +1,261 @@
+"""Structured model of an OCR'd patent document.
+
+The OCR text is kept as pages of lines, and the parse records numbered
+paragraphs, claims, section headings and figure mentions as line spans with
+lookup indexes, so prompts can be built from exact slices of the document
+instead of the whole text. The model serializes to compact JSON so it can be
+cached together with the OCR result.
+"""
+import bisect
+import json
+import re
+from collections import Counter
+
+FORMAT_VERSION = 2
+
+PARAGRAPH_MARKER = re.compile(r"^\s*\[(\d{3,5})\]")
+CLAIMS_HEADING = re.compile(r"^\s*(?:what is claimed is|we claim|i claim|claims?|the invention claimed is)\s*:?\s*$", re.IGNORECASE)
+CLAIM_START = re.compile(r"^\s*(\d{1,3})\s*\.\s+\S")
+KNOWN_HEADING = re.compile(
+    r"^\s*(?:technical\s+)?(?:field|background|summary|brief description of the drawings|"
+    r"detailed description|description of (?:the )?(?:preferred )?embodiments?|abstract|"
+    r"cross[- ]reference to related applications?|related applications?)\b.{0,60}$",
+    re.IGNORECASE,
+)
+FIGURE_REFERENCE = re.compile(r"\bFIG(?:URE)?S?\.?\s*(\d+[A-Z]?)\b", re.IGNORECASE)
+# Figure label on a drawing sheet: a line of just "FIG. 2A", not a mention of the figure in running text
+FIGURE_LABEL = re.compile(r"^\s*FIG(?:URE)?S?\.?\s*\d+[A-Z]?\s*$", re.IGNORECASE)
+DIGITS = re.compile(r"\d+")
+# Line starting each source document of a combined document, e.g. "===== Part 2: drawings.pdf ====="
+SECTION_MARKER = re.compile(r"^===== .+ =====$")
+
+
+def section_marker(title):
+    """Return the line that starts a source document titled title in a combined document."""
+    return f"===== {title} ====="
+
+
+def _is_heading(line):
+    stripped = line.strip()
+    if SECTION_MARKER.match(stripped):
+        return True
+    if not stripped or len(stripped) > 80 or stripped.endswith((".", ",", ";")):
+        return False
+    if KNOWN_HEADING.match(stripped) or CLAIMS_HEADING.match(stripped):
+        return True
+    # Generic all-caps headings of a few words, e.g. "EXAMPLES", but not figure labels on drawing sheets
+    words = stripped.split()
+    return (1 <= len(words) <= 8 and stripped.isupper() and any(c.isalpha() for c in stripped)
+            and not FIGURE_REFERENCE.match(stripped))
+
+
+class PatentDocument:
+    """Pages, lines, numbered paragraphs, claims, headings and figure mentions of a document."""
+
+    def __init__(self, pages, paragraphs=None, claims=None, headings=None, boilerplate=None, drawing_pages=None):
+        self.pages = pages  # list of pages, each a list of line strings
+        self.lines = [line for page in pages for line in page]
+        self.page_starts = []
+        start = 0
+        for page in pages:
+            self.page_starts.append(start)
+            start += len(page)
+
+        if paragraphs is None:
+            self.boilerplate = _find_boilerplate(pages, self.page_starts)
+            self.drawing_pages = _find_drawing_pages(pages)
+            self.headings = [i for i, line in enumerate(self.lines) if i not in self.boilerplate and _is_heading(line)]
+            self.paragraphs, self.claims = self._parse()
+        else:
+            self.paragraphs = paragraphs
+            self.claims = claims
+            self.headings = headings
+            self.boilerplate = set(boilerplate)
+            self.drawing_pages = drawing_pages
+        self._build_indexes()
+
+    @classmethod
+    def from_pages(cls, page_texts):
+        """Build a document from per-page OCR text (one line per text line)."""
+        return cls([page_text.split("\n")[:-1] if page_text.endswith("\n") else page_text.split("\n")
+                    for page_text in page_texts])
+
+    @classmethod
+    def from_text(cls, text):
+        """Build a single-page document from flat OCR text."""
+        return cls.from_pages([text])
+
+    def _parse(self):
+        """Return (paragraphs, claims) as lists of [number, start_line, end_line] spans."""
+        heading_set = set(self.headings)
+        claims_start = None
+        for i in self.headings:
+            if CLAIMS_HEADING.match(self.lines[i]):
+                claims_start = i
+        body_end = claims_start if claims_start is not None else len(self.lines)
+
+        paragraphs = []
+        for i in range(body_end):
+            if i in self.boilerplate:
+                continue
+            marker = PARAGRAPH_MARKER.match(self.lines[i])
+            if marker:
+                paragraphs.append([int(marker.group(1)), i, i + 1])
+            elif i in heading_set:
+                continue
+            elif paragraphs and paragraphs[-1][2] >= i - _skipped_before(self.boilerplate, i):
+                paragraphs[-1][2] = i + 1
+
+        claims = []
+        if claims_start is not None:
+            expected = 1
+            for i in range(claims_start + 1, len(self.lines)):
+                if i in self.boilerplate:
+                    continue
+                if i in heading_set and not CLAIM_START.match(self.lines[i]):
+                    break  # e.g. the ABSTRACT after the claims
+                claim_start = CLAIM_START.match(self.lines[i])
+                if claim_start and int(claim_start.group(1)) == expected:
+                    claims.append([expected, i, i + 1])
+                    expected += 1
+                elif claims:
+                    claims[-1][2] = i + 1
+        return paragraphs, claims
+
+    def _build_indexes(self):
+        self.paragraph_index = {number: (start, end) for number, start, end in self.paragraphs}
+        self.claim_index = {number: (start, end) for number, start, end in self.claims}
+        self.figure_index = {}  # figure label -> line numbers mentioning it
+        for i, line in enumerate(self.lines):
+            for label in FIGURE_REFERENCE.findall(line):
+                self.figure_index.setdefault(label.upper(), []).append(i)
+
+    @property
+    def text(self):
+        """The OCR text exactly as extracted, one line per text line."""
+        return "".join(line + "\n" for line in self.lines)
+
+    def slice_lines(self, start, end):
+        """Return the text of lines [start, end), without running headers and footers."""
+        return "\n".join(self.lines[i] for i in range(start, end) if i not in self.boilerplate)
+
+    def page_of_line(self, line_number):
+        """Return the 1-based page number containing a line."""
+        return bisect.bisect_right(self.page_starts, line_number)
+
+    def paragraph(self, number):
+        """Return the text of a numbered paragraph such as [0023], or None."""
+        span = self.paragraph_index.get(number)
+        return self.slice_lines(*span) if span else None
+
+    def claim(self, number):
+        """Return the text of a claim, or None."""
+        span = self.claim_index.get(number)
+        return self.slice_lines(*span) if span else None
+
+    def paragraphs_mentioning_figure(self, label):
+        """Return the numbers of the paragraphs that mention a figure, e.g. "3A"."""
+        numbers = []
+        for line_number in self.figure_index.get(label.upper(), []):
+            for number, start, end in self.paragraphs:
+                if start <= line_number < end and number not in numbers:
+                    numbers.append(number)
+        return numbers
+
+    def section(self, name):
+        """Return the text under the first heading that starts with name, up to the next heading."""
+        for position, line_number in enumerate(self.headings):
+            if self.lines[line_number].strip().lower().startswith(name.lower()):
+                end = self.headings[position + 1] if position + 1 < len(self.headings) else len(self.lines)
+                return self.slice_lines(line_number + 1, end)
+        return None
+
+    def prompt_text(self):
+        """Compact text for prompts: the document without running headers, footers and drawing sheets."""
+        return "\n".join(
+            self.slice_lines(start, start + len(page))
+            for page_number, (page, start) in enumerate(zip(self.pages, self.page_starts), start=1)
+            if page_number not in self.drawing_pages
+        )
+
+    def to_json(self):
+        """Serialize the pages and parse to compact JSON."""
+        return json.dumps(
+            {
+                "version": FORMAT_VERSION,
+                "pages": self.pages,
+                "paragraphs": self.paragraphs,
+                "claims": self.claims,
+                "headings": self.headings,
+                "boilerplate": sorted(self.boilerplate),
+                "drawing_pages": self.drawing_pages,
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        """Load a document serialized with to_json, without re-parsing it."""
+        stored = json.loads(data)
+        if stored.get("version") != FORMAT_VERSION:
+            return cls(stored["pages"])
+        return cls(
+            stored["pages"],
+            paragraphs=stored["paragraphs"],
+            claims=stored["claims"],
+            headings=stored["headings"],
+            boilerplate=stored["boilerplate"],
+            drawing_pages=stored["drawing_pages"],
+        )
+
+
+def _find_boilerplate(pages, page_starts, edge_lines=3):
+    """Find running headers and footers: edge lines repeated (modulo numbers) on most pages."""
+    if len(pages) < 3:
+        return set()
+
+    def signature(line):
+        return DIGITS.sub("#", line.strip().lower())
+
+    counts = Counter()
+    for page in pages:
+        edges = {signature(line) for line in page[:edge_lines] + page[-edge_lines:] if line.strip()}
+        counts.update(edges)
+
+    repeated = {sig for sig, count in counts.items() if count >= max(3, len(pages) // 2)}
+    boilerplate = set()
+    for page, start in zip(pages, page_starts):
+        for offset, line in enumerate(page):
+            if (offset < edge_lines or offset >= len(page) - edge_lines) and signature(line) in repeated:
+                boilerplate.add(start + offset)
+    return boilerplate
+
+
+def _find_drawing_pages(pages, min_words=40, max_label_words=3, min_label_share=0.8):
+    """
+    Find drawing sheets: pages with hardly any words and no paragraphs or claims that are
+    labeled "FIG. n" or hold mostly reference numerals and short labels.
+
+    A short page of running text, like the end of the description, is kept as text.
+    """
+    if len(pages) < 2:
+        return []
+    drawing_pages = []
+    for page_number, page in enumerate(pages, start=1):
+        words = sum(1 for line in page for word in line.split() if sum(c.isalpha() for c in word) >= 3)
+        if words >= min_words or any(PARAGRAPH_MARKER.match(line) or CLAIM_START.match(line) for line in page):
+            continue
+        lines = [line for line in page if line.strip()]
+        labels = sum(1 for line in lines if len(line.split()) <= max_label_words)
+        if any(FIGURE_LABEL.match(line) for line in lines) or (lines and labels >= min_label_share * len(lines)):
+            drawing_pages.append(page_number)
+    return drawing_pages
+
+
+def _skipped_before(boilerplate, line_number):
+    """Count the boilerplate lines directly before a line, so paragraphs continue across page breaks."""
+    skipped = 0
+    while line_number - skipped - 1 in boilerplate:
+        skipped += 1
+    return skipped
@@ -0,0 +1,146 @@
+"""PDF helpers: local text layer, page subsets, sharded OCR and rendering text as PDF pages.
+
+PyMuPDF is imported by the functions that use it rather than at module import, so
+importing the pipeline (and starting the app) doesn't pay for loading it.
+"""
+import contextvars
+import html
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from rate_limit import call_with_retry
+
+DEFAULT_MODEL_ID = "prebuilt-document"
+
+
+def extract_text_layer(file_content, min_chars=50):
+    """Extract the embedded text of each PDF page locally with PyMuPDF.
+
+    Returns one entry per page: the page text, or None if the page has no usable
+    text layer (e.g. a scanned page) and needs OCR.
+    """
+    import fitz  # PyMuPDF, loaded on first use
+    page_texts = []
+    with fitz.open(stream=file_content, filetype="pdf") as pdf_document:
+        for page in pdf_document:
+            lines = [line.strip() for line in page.get_text().splitlines() if line.strip()]
+            page_text = "".join(line + "\n" for line in lines)
+
+            # Scanned pages have no text at all, or only a few stray characters;
+            # broken font encodings show up as replacement characters
+            usable_chars = sum(c.isalnum() for c in page_text)
+            if usable_chars >= min_chars and page_text.count("\ufffd") <= usable_chars // 20:
+                page_texts.append(page_text)
+            else:
+                page_texts.append(None)
+    return page_texts
+
+
+def count_pages(file_content):
+    """Return the number of pages in a PDF."""
+    import fitz  # PyMuPDF, loaded on first use
+    with fitz.open(stream=file_content, filetype="pdf") as pdf_document:
+        return pdf_document.page_count
+
+
+def build_page_subset(file_content, page_numbers):
+    """Return a PDF containing only the given 1-based pages, in the given order."""
+    import fitz  # PyMuPDF, loaded on first use
+    with fitz.open(stream=file_content, filetype="pdf") as pdf_document:
+        if list(page_numbers) == list(range(1, pdf_document.page_count + 1)):
+            return file_content
+        with fitz.open() as subset:
+            for page_number in page_numbers:
+                subset.insert_pdf(pdf_document, from_page=page_number - 1, to_page=page_number - 1)
+            return subset.tobytes()
+
+
+def analyze_pages(document_analysis_client, document, page_numbers, model_id=DEFAULT_MODEL_ID,
+                  limiter=None, retry_options=None):
+    """OCR a PDF whose pages are the given original page numbers; return {page_number: text}.
+
+    If a limiter is given the request waits for rate-limit capacity and throttled or
+    transient failures are retried (retry_options are passed to call_with_retry).
+    """
+    if limiter is None and retry_options is None:
+        result = document_analysis_client.begin_analyze_document(model_id, document=document).result()
+    else:
+        result = call_with_retry(
+            lambda: document_analysis_client.begin_analyze_document(model_id, document=document).result(),
+            limiter, **(retry_options or {})
+        )
+
+    # Map page numbers in the submitted document back to the original PDF
+    page_texts = {}
+    for page in result.pages:
+        page_texts[page_numbers[page.page_number - 1]] = "".join(line.content + "\n" for line in page.lines)
+    return page_texts
+
+
+def shard_page_numbers(page_numbers, shard_pages):
+    """Split a list of page numbers into consecutive shards of at most shard_pages pages."""
+    shard_pages = max(1, shard_pages)
+    return [page_numbers[i:i + shard_pages] for i in range(0, len(page_numbers), shard_pages)]
+
+
+def ocr_pdf_pages(document_analysis_client, file_content, page_numbers, model_id=DEFAULT_MODEL_ID,
+                  shard_pages=0, max_workers=1, limiter=None, retry_options=None):
+    """OCR the given 1-based pages of a PDF and return a {page_number: text} dict.
+
+    Only the requested pages are uploaded. If shard_pages is set and more pages
+    than that need OCR, they are split into page-range shards that are analyzed
+    in parallel; page numbers in the result always refer to the original PDF.
+    Every shard request goes through the limiter, if one is given, and runs in a copy of
+    the caller's context, so its queue time and retries count in the caller's telemetry span.
+    """
+    if not shard_pages or len(page_numbers) <= shard_pages:
+        document = build_page_subset(file_content, page_numbers)
+        return analyze_pages(document_analysis_client, document, page_numbers, model_id, limiter, retry_options)
+
+    shards = shard_page_numbers(page_numbers, shard_pages)
+    page_texts = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run, analyze_pages, document_analysis_client,
+                build_page_subset(file_content, shard), shard, model_id, limiter, retry_options
+            )
+            for shard in shards
+        ]
+        # Any failed shard fails the document rather than returning text with gaps
+        for future in futures:
+            page_texts.update(future.result())
+    return page_texts
+
+
+def render_text_pdf(page_texts, paper="letter", margin=72, font_size=11):
+    """Render text as a PDF, starting a new page for each entry of page_texts (longer texts flow onto more pages).
+
+    A plain typeset rendition for reading and download, made locally with PyMuPDF.
+    """
+    import fitz  # PyMuPDF, loaded on first use
+    mediabox = fitz.paper_rect(paper)
+    where = mediabox + (margin, margin, -margin, -margin)
+    buffer = BytesIO()
+    writer = fitz.DocumentWriter(buffer)
+    for page_text in page_texts or [""]:
+        paragraphs = "".join(f"<p>{html.escape(line)}</p>" for line in page_text.split("\n") if line.strip())
+        story = fitz.Story(html=paragraphs, user_css=f"body {{font-family: serif; font-size: {font_size}pt;}} p {{margin: 0 0 4pt 0;}}")
+        more = True
+        while more:
+            device = writer.begin_page(mediabox)
+            more, _ = story.place(where)
+            story.draw(device)
+            writer.end_page()
+    writer.close()
+    return buffer.getvalue()
+
+
+def concatenate_pdfs(documents):
+    """Return one PDF with the pages of each PDF in documents (bytes-like), in order."""
+    import fitz  # PyMuPDF, loaded on first use
+    with fitz.open() as combined:
+        for document in documents:
+            with fitz.open(stream=document, filetype="pdf") as part:
+                combined.insert_pdf(part)
+        return combined.tobytes(garbage=1, deflate=True)
@@ -0,0 +1,1494 @@
+"""Step 1-4 analysis pipeline, without any Streamlit dependency.
+
+The OCR and LLM stages behind the app live here so the Streamlit page, the batch
+CLI (batch.py) and other callers run the same code. The SDK clients, caches and
+rate limiters are module-level, so they are created once per process on first
+import and shared by every session and worker thread.
+
+The heavy dependencies (the OpenAI and Azure SDKs, PyMuPDF, python-docx,
+jsonschema) are imported on first use instead: the SDK clients are created by
+the first call that needs them, and the document and report helpers import
+their libraries when they run, so importing this module (and starting the app)
+stays fast.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import SequenceMatcher
+from io import BytesIO
+
+from dotenv import load_dotenv
+
+import prompts
+import schemas
+from artifact_cache import ArtifactCache, artifact_key
+from checkpoints import CheckpointStore, checkpoint_key, document_hash
+from claim_diff import claim_hash, claim_units, diff_claims, is_pending, merge_unit_reports, split_claims, unit_hash, unit_label
+from chunking import count_tokens, map_chunks, merge_unique, plan_chunks, split_into_chunks
+from clients import LazyClient, create_document_analysis_client, create_openai_client, is_http_response_error
+from jobs import JobQueue
+from llm_cache import LlmCache
+from ocr_cache import OcrCache
+from patent_document import PatentDocument, section_marker
+from pdf_ocr import concatenate_pdfs, count_pages, extract_text_layer, ocr_pdf_pages, render_text_pdf
+from rate_limit import RateLimiterRegistry, call_with_retry
+from reference_index import select_reference_passages
+from schemas import coerce, drop_invalid_items, failing_parts, parse_json, part_name, part_schema, set_part, validation_errors
+from telemetry import Telemetry, log_sampled, start_metrics_server
+
+# Load environment variables from .env file
+load_dotenv()
+# Initialize global variables
+domain_subject_matter = "default domain"
+experience_expertise_qualifications = "default qualifications"
+style_tone_voice = "default style"
+
+# Connections kept alive per service, shared by all sessions and worker threads
+http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+
+# Set up Azure OpenAI API credentials from .env
+def get_openai_client():
+    """Return an Azure OpenAI client; the module-level one below is shared by the whole process and created on first use."""
+    return create_openai_client(
+        endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),  # Pull from environment
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),  # Pull from environment
+        api_version=os.getenv("OPENAI_API_VERSION"),  # Pull from environment
+        max_connections=http_max_connections,
+        max_retries=0,  # Retries go through call_with_retry so they respect the shared rate limits
+    )
+
+client = LazyClient(get_openai_client)
+
+# LLM response cache setup: only the stages listed here are served from the cache
+llm_cache_dir = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+llm_cache_max_mb = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+llm_cache_ttl_hours = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+llm_cache_stages = [stage.strip() for stage in os.getenv(
+    "LLM_CACHE_STAGES",
+    "check_for_conflicts,extract_figures_and_text,extract_details_from_filed_application,extract_and_modify_filed_application"
+).split(",") if stage.strip()]
+# Set per request (e.g. from the app's sidebar); worker threads get it through contextvars.copy_context
+llm_cache_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+# Minimum seconds between page updates while a long-form analysis is streaming
+stream_render_interval = float(os.getenv("STREAM_RENDER_INTERVAL", "0.25"))
+# Ask for token usage on streamed responses too (needs an API version that supports stream_options)
+stream_include_usage = os.getenv("STREAM_INCLUDE_USAGE", "false").lower() == "true"
+
+# Structured outputs: JSON stages ask for schema-constrained replies (json_schema, json_object or off).
+# A mode the deployment rejects falls back to the next one for the rest of the process
+structured_output_mode = os.getenv("STRUCTURED_OUTPUT", "json_schema")
+structured_output_modes = ("json_schema", "json_object")
+unsupported_output_modes = set()
+# Rounds of re-asking the parts of a reply that don't match the stage's schema
+json_repair_attempts = int(os.getenv("JSON_REPAIR_ATTEMPTS", "1"))
+
+# Azure Form Recognizer setup
+form_recognizer_endpoint = os.getenv("FORM_RECOGNIZER_ENDPOINT", "https://patentocr.cognitiveservices.azure.com/")
+form_recognizer_api_key = os.getenv("FORM_RECOGNIZER_API_KEY", "cd6b8996d93447be88d995729c924bcb")
+form_recognizer_model = "prebuilt-document"
+
+# OCR cache setup
+ocr_cache_dir = os.getenv("OCR_CACHE_DIR", ".ocr_cache")
+ocr_cache_max_mb = int(os.getenv("OCR_CACHE_MAX_MB", "512"))
+ocr_cache_compress = os.getenv("OCR_CACHE_COMPRESS", "true").lower() in ("1", "true", "yes")
+
+# Converted documents and reports (e.g. the combined PDF of an unpublished application), keyed by their sources' content
+artifact_cache_dir = os.getenv("ARTIFACT_CACHE_DIR", ".artifact_cache")
+artifact_cache_max_mb = int(os.getenv("ARTIFACT_CACHE_MAX_MB", "512"))
+
+# PDF text layer setup: born-digital pages are read locally, only scanned pages go to OCR
+use_pdf_text_layer = os.getenv("PDF_TEXT_LAYER", "true").lower() in ("1", "true", "yes")
+text_layer_min_chars = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "50"))
+
+# Maximum number of referenced documents extracted at the same time in Step 2
+ref_ocr_max_workers = int(os.getenv("REF_OCR_MAX_WORKERS", "4"))
+
+# OCR sharding setup: documents with more pages than this needing OCR are split and analyzed in parallel
+ocr_shard_pages = int(os.getenv("OCR_SHARD_PAGES", "25"))
+ocr_shard_workers = int(os.getenv("OCR_SHARD_WORKERS", "4"))
+
+# Persona used by the concurrent Step 1 extraction, before the detected persona is available
+generic_domain = "the technical field of the inventions and prior art discussed in the office action"
+generic_expertise = "Extensive engineering and scientific experience in that technical field, combined with years of U.S. patent prosecution practice"
+generic_style = "precise, objective, and formal analytical style"
+
+# Step 2 prompt size: select cited paragraphs and figure descriptions from the references instead of sending their full text
+use_reference_retrieval = os.getenv("REF_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+reference_excerpt_max_chars = int(os.getenv("REF_EXCERPT_MAX_CHARS", "24000"))
+
+# Token budgets for the document text of the extraction stages; larger inputs are split into overlapping chunks
+filed_application_token_budget = int(os.getenv("FILED_APP_TOKEN_BUDGET", "60000"))
+figure_analysis_token_budget = int(os.getenv("FIGURE_ANALYSIS_TOKEN_BUDGET", "60000"))
+chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "500"))
+chunk_max_workers = int(os.getenv("CHUNK_MAX_WORKERS", "4"))
+
+# Client-side rate limits per deployment, shared by all sessions in the process (0 disables a limit)
+openai_requests_per_minute = int(os.getenv("OPENAI_RPM", "900"))
+openai_tokens_per_minute = int(os.getenv("OPENAI_TPM", "150000"))
+openai_expected_completion_tokens = int(os.getenv("OPENAI_EXPECTED_COMPLETION_TOKENS", "2000"))
+form_recognizer_requests_per_minute = int(os.getenv("FORM_RECOGNIZER_RPM", "600"))
+# Retries of throttled (429) and transient failures, with jittered exponential backoff
+api_max_retries = int(os.getenv("API_MAX_RETRIES", "5"))
+api_backoff_base_seconds = float(os.getenv("API_BACKOFF_BASE_SECONDS", "1.0"))
+api_backoff_max_seconds = float(os.getenv("API_BACKOFF_MAX_SECONDS", "60"))
+
+# Step result checkpoints, keyed by the input documents and upstream results
+checkpoint_dir = os.getenv("CHECKPOINT_DIR", ".checkpoints")
+checkpoint_max_mb = int(os.getenv("CHECKPOINT_MAX_MB", "256"))
+
+# Maximum number of pending claim groups (an independent claim and its dependents) analyzed at the same time in Step 4
+claim_max_workers = int(os.getenv("CLAIM_MAX_WORKERS", "4"))
+
+# Telemetry: stage spans go to a JSON-lines trace file ("" disables it), metrics to a local Prometheus endpoint (port 0 disables it)
+trace_file = os.getenv("TRACE_FILE", os.path.join(".telemetry", "spans.jsonl"))
+trace_max_mb = int(os.getenv("TRACE_MAX_MB", "64"))
+metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+metrics_port = int(os.getenv("METRICS_PORT", "9464"))
+# USD per 1,000 prompt, cached prompt and completion tokens, by deployment, for the cost of each LLM call
+llm_prices = json.loads(os.getenv("LLM_PRICES", json.dumps(
+    {"GPT-4-Omni": {"prompt": 0.0025, "cached_prompt": 0.00125, "completion": 0.01}}
+)))
+# Fraction of LLM calls whose prompt and reply are logged (at debug level, to the "pipeline" logger)
+log_sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+# Level of the "pipeline" logger's messages on the console of the app and the batch CLI
+log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+logger = logging.getLogger("pipeline")
+
+
+def configure_logging():
+    """Log the pipeline's messages at LOG_LEVEL and above to the console; called by the app and the batch CLI."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(log_level)
+
+
+def get_llm_cache():
+    """Return the LLM response cache configured by the LLM_CACHE_* settings."""
+    return LlmCache(
+        cache_dir=llm_cache_dir,
+        max_bytes=llm_cache_max_mb * 1024 * 1024,
+        ttl_seconds=llm_cache_ttl_hours * 60 * 60,
+    )
+
+llm_cache = get_llm_cache()
+
+def get_checkpoint_store():
+    """Return the step checkpoint store configured by the CHECKPOINT_* settings."""
+    return CheckpointStore(checkpoint_dir=checkpoint_dir, max_bytes=checkpoint_max_mb * 1024 * 1024)
+
+checkpoint_store = get_checkpoint_store()
+
+def get_prompt_cache_stats():
+    """Return a new per-stage prompt token usage tracker."""
+    return prompts.PromptCacheStats()
+
+prompt_cache_stats = get_prompt_cache_stats()
+
+def get_rate_limiters():
+    """Return a new registry of per-deployment rate limiters."""
+    return RateLimiterRegistry()
+
+rate_limiters = get_rate_limiters()
+
+def get_telemetry():
+    """Return the span and metrics recorder configured by the TRACE_* and LLM_PRICES settings."""
+    return Telemetry(trace_path=trace_file, trace_max_bytes=trace_max_mb * 1024 * 1024, prices=llm_prices)
+
+telemetry = get_telemetry()
+
+def openai_rate_limiter(model):
+    return rate_limiters.get(f"openai/{model}", openai_requests_per_minute, openai_tokens_per_minute)
+
+def form_recognizer_rate_limiter():
+    return rate_limiters.get(f"form-recognizer/{form_recognizer_model}", form_recognizer_requests_per_minute)
+
+def is_json_response(content):
+    """Check whether a response parses as JSON, with the local repairs of schemas.parse_json."""
+    try:
+        parse_json(content)
+        return True
+    except ValueError:
+        return False
+
+def response_format_for(stage, schema):
+    """Return the response_format asking for a reply matching schema, or None if the deployment supports no structured mode."""
+    if schema is None or structured_output_mode not in structured_output_modes:
+        return None
+    for mode in structured_output_modes[structured_output_modes.index(structured_output_mode):]:
+        if mode in unsupported_output_modes:
+            continue
+        if mode == "json_schema":
+            return {"type": "json_schema",
+                    "json_schema": {"name": stage, "schema": schemas.response_schema(schema), "strict": True}}
+        return {"type": "json_object"}
+    return None
+
+def stream_chat_completion(stage, model, messages, temperature, on_delta):
+    """Stream a chat completion, passing the text received so far to on_delta as it arrives."""
+    options = {"stream_options": {"include_usage": True}} if stream_include_usage else {}
+    stream = client.chat.completions.create(
+        model=model, messages=messages, temperature=temperature, stream=True, **options
+    )
+    parts = []
+    usage = None
+    last_render = 0.0
+    for chunk in stream:
+        # With include_usage the final chunk carries the token usage and no choices
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+            prompt_cache_stats.record(stage, usage)
+        # Azure sends prompt and content filter results in chunks without any text
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            continue
+        parts.append(chunk.choices[0].delta.content)
+
+        # Re-rendering on every token would flood the page, so updates are throttled
+        now = time.perf_counter()
+        if now - last_render >= stream_render_interval:
+            on_delta("".join(parts))
+            last_render = now
+
+    content = "".join(parts)
+    on_delta(content)
+    return content, usage
+
+def record_llm_usage(span, model, usage, estimated_prompt_tokens, content):
+    """Add an LLM call's tokens and cost to its span; estimated locally if the API reported no usage (e.g. streaming)."""
+    if usage is None:
+        span.set(usage="estimated")
+        prompt_tokens, cached_tokens, completion_tokens = estimated_prompt_tokens, 0, count_tokens(content)
+    else:
+        details = getattr(usage, "prompt_tokens_details", None)
+        prompt_tokens = usage.prompt_tokens or 0
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        completion_tokens = usage.completion_tokens or 0
+    span.add(
+        prompt_tokens=prompt_tokens, cached_tokens=cached_tokens, completion_tokens=completion_tokens,
+        cost_usd=telemetry.usage_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+    )
+
+def create_chat_completion(stage, messages, temperature, model="GPT-4-Omni", json_response=True, on_delta=None,
+                           schema=None):
+    """
+    Call the chat-completions API and return the response text.
+    Stages listed in LLM_CACHE_STAGES reuse an earlier response for the same messages, model and temperature.
+    If on_delta is given the response is streamed and on_delta receives the text received so far.
+    With a JSON schema the reply is requested in the structured output mode set by STRUCTURED_OUTPUT.
+    Each call is an "llm" telemetry span named after the stage, with its queue time, retries, tokens and cost.
+    """
+    with telemetry.span("llm", stage, model=model, streaming=on_delta is not None) as span:
+        use_cache = stage in llm_cache_stages and not llm_cache_bypass.get()
+        if use_cache:
+            cached_content = llm_cache.get(model, messages, temperature)
+            if cached_content is not None:
+                logger.debug("LLM cache hit for %s", stage)
+                span.set(cache="hit")
+                if on_delta:
+                    on_delta(cached_content)
+                return cached_content
+
+        from openai import APIConnectionError, APITimeoutError, BadRequestError
+
+        # Reserve the estimated tokens up front, then settle the difference once the usage is known
+        limiter = openai_rate_limiter(model)
+        prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+        estimated_tokens = prompt_tokens + openai_expected_completion_tokens
+        def call():
+            if on_delta:
+                return stream_chat_completion(stage, model, messages, temperature, on_delta)
+            while True:
+                response_format = response_format_for(stage, schema)
+                options = {"response_format": response_format} if response_format else {}
+                try:
+                    response = client.chat.completions.create(
+                        model=model, messages=messages, temperature=temperature, **options
+                    )
+                    break
+                except BadRequestError as e:
+                    # Older API versions and models reject structured outputs; use the next mode from now on
+                    if response_format is None or "response_format" not in str(e):
+                        raise
+                    logger.warning("Structured output mode %s is not supported: %s", response_format['type'], e)
+                    unsupported_output_modes.add(response_format["type"])
+            prompt_cache_stats.record(stage, response.usage)
+            return response.choices[0].message.content, response.usage
+        content, usage = call_with_retry(
+            call, limiter, tokens=estimated_tokens, max_retries=api_max_retries,
+            base_delay=api_backoff_base_seconds, max_delay=api_backoff_max_seconds,
+            retry_exceptions=(APIConnectionError, APITimeoutError),
+        )
+        if usage is not None:
+            limiter.adjust(usage.total_tokens - estimated_tokens)
+        record_llm_usage(span, model, usage, prompt_tokens, content)
+        # Prompts carry client documents, so they are only logged for a sample of calls
+        log_sampled(logger, log_sample_rate, "%s prompt:\n%s\n%s reply:\n%s", stage, messages[-1]["content"], stage, content)
+
+        # Don't cache a malformed reply, otherwise every rerun would get the same failure
+        if use_cache and (not json_response or is_json_response(content)):
+            llm_cache.put(model, messages, temperature, content)
+        return content
+
+def repair_json_syntax(stage, content, schema, model):
+    """Ask for a reply that isn't valid JSON to be repaired, sending only the reply; returns the parsed JSON or None."""
+    messages = prompts.REPAIR_JSON_SYNTAX.messages(schema=json.dumps(schemas.response_schema(schema)), reply=content)
+    try:
+        return parse_json(create_chat_completion(f"{stage}_repair", messages, temperature=0, model=model, schema=schema))
+    except Exception as e:
+        logger.warning("JSON repair failed for %s: %s", stage, e)
+        return None
+
+def reask_failing_parts(stage, messages, content, data, parts, schema, model):
+    """
+    Ask again for the parts of a reply that don't match the schema, and return data with the answers put in.
+
+    Each part (a list item or a field) is asked for in a follow-up turn to the stage's conversation,
+    whose prefix the provider's prompt cache already holds, and only that part is generated again.
+    """
+    def reask(item):
+        path, problems = item
+        followup = messages + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": prompts.REPAIR_JSON_PART.format(
+                part=part_name(path), problems="\n".join(problems),
+                schema=json.dumps(schemas.response_schema(part_schema(schema, path))),
+            )},
+        ]
+        try:
+            reply = create_chat_completion(f"{stage}_repair", followup, temperature=0, model=model)
+            return coerce(parse_json(reply), part_schema(schema, path))
+        except Exception as e:
+            logger.warning("Re-asking %s failed for %s: %s", part_name(path), stage, e)
+            return None
+
+    items = list(parts.items())
+    for (path, _), value in zip(items, map_chunks(reask, items, chunk_max_workers)):
+        if value is not None:
+            data = set_part(data, path, value)
+    return data
+
+def create_json_completion(stage, messages, temperature, schema, model="GPT-4-Omni"):
+    """
+    Call a JSON stage and return its reply parsed and validated against schema, or None if it can't be repaired.
+
+    Near-valid JSON is repaired locally; a reply that still doesn't parse is sent back on its own, without
+    the stage's documents, for a syntax repair. Parts that don't match the schema are re-asked on their own
+    (JSON_REPAIR_ATTEMPTS rounds), and list items that still don't match are dropped.
+    """
+    content = create_chat_completion(stage, messages, temperature, model=model, schema=schema)
+    try:
+        data = parse_json(content)
+    except ValueError as e:
+        logger.warning("JSON decoding error in %s: %s", stage, e)
+        data = repair_json_syntax(stage, content, schema, model)
+        if data is None:
+            return None
+
+    data = coerce(data, schema)
+    for _ in range(json_repair_attempts):
+        parts = failing_parts(validation_errors(data, schema))
+        if not parts:
+            return data
+        logger.info("Re-asking %s part(s) of the %s reply: %s",
+                    len(parts), stage, ', '.join(part_name(path) for path in parts))
+        data = reask_failing_parts(stage, messages, content, data, parts, schema, model)
+
+    data, dropped = drop_invalid_items(data, schema)
+    if dropped:
+        logger.warning("Dropped %s invalid item(s) from the %s reply", dropped, stage)
+    errors = validation_errors(data, schema)
+    if errors:
+        logger.warning("The %s reply doesn't match its schema: %s", stage, errors[0].message)
+        return None
+    return data
+
+@telemetry.traced("stage")
+def determine_domain_expertise(action_document_text):
+    """Analyze the action document to determine the required domain expertise, experience, and analysis style."""
+    global domain_subject_matter, experience_expertise_qualifications, style_tone_voice
+    messages = prompts.DOMAIN_EXPERTISE.messages(action_document_text=action_document_text)
+
+    # Call OpenAI API for domain expertise determination
+    try:
+        data = create_json_completion(
+            "determine_domain_expertise", messages, 0.6, schemas.DOMAIN_EXPERTISE_SCHEMA
+        )
+        if data is None:
+            return (None, None, None)
+
+        domain_subject_matter = data.get("domain_subject_matter")
+        experience_expertise_qualifications = data.get("experience_expertise_qualifications")
+        style_tone_voice = data.get("style_tone_voice")
+
+        # Return the results as a tuple
+        return (domain_subject_matter, experience_expertise_qualifications, style_tone_voice)
+    except Exception as e:
+        logger.error("Error during domain expertise determination: %s", e)
+        return (None, None, None)
+
+@telemetry.traced("stage")
+def check_for_conflicts(action_document_text, domain, expertise, style):
+    """
+    Analyzes the action document and extracts:
+    - Foundational claim
+    - Referenced documents
+    - Figures and technical text related to them
+    """
+    global domain_subject_matter, experience_expertise_qualifications, style_tone_voice
+
+    messages = prompts.CHECK_FOR_CONFLICTS.messages(
+        domain=domain, expertise=expertise, style=style, action_document_text=action_document_text
+    )
+
+    # Call the OpenAI API for conflict checking (assuming you have client setup)
+    try:
+        return create_json_completion("check_for_conflicts", messages, 0.2, schemas.CONFLICT_RESULTS_SCHEMA)
+    except Exception as e:
+        logger.error("Error during conflict checking: %s", e)
+        return None
+
+
+def run_step1_analysis(action_document_text, concurrent):
+    """
+    Determine the domain expertise and check for conflicts in the action document.
+
+    In concurrent mode the conflict check starts immediately with a generic persona instead of
+    waiting for the detected one, since the persona only fills in its system prompt.
+    Returns (domain, expertise, style, conflict_results).
+    """
+    if not concurrent:
+        domain, expertise, style = determine_domain_expertise(action_document_text)
+        if not (domain and expertise and style):
+            return (domain, expertise, style, None)
+        return (domain, expertise, style, check_for_conflicts(action_document_text, domain, expertise, style))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        conflicts_future = executor.submit(
+            contextvars.copy_context().run,
+            check_for_conflicts, action_document_text, generic_domain, generic_expertise, generic_style
+        )
+        domain, expertise, style = determine_domain_expertise(action_document_text)
+        conflict_results = conflicts_future.result()
+    return (domain, expertise, style, conflict_results)
+
+def compare_conflict_results(reference_results, candidate_results):
+    """
+    Score how closely a Step 1 result matches a reference result, field by field.
+    1.0 means identical after normalizing case and whitespace.
+    """
+    def normalize(value):
+        return " ".join(str(value).lower().split())
+
+    def text_agreement(field):
+        return SequenceMatcher(
+            None, normalize(reference_results.get(field, "")), normalize(candidate_results.get(field, ""))
+        ).ratio()
+
+    def list_agreement(field):
+        reference_items = {normalize(item) for item in reference_results.get(field) or []}
+        candidate_items = {normalize(item) for item in candidate_results.get(field) or []}
+        if not reference_items and not candidate_items:
+            return 1.0
+        return len(reference_items & candidate_items) / len(reference_items | candidate_items)
+
+    return {
+        "foundational_claim": text_agreement("foundational_claim"),
+        "documents_referenced": list_agreement("documents_referenced"),
+        "figures": list_agreement("figures"),
+        "text": text_agreement("text"),
+    }
+
+# Function to extract and analyze figure-related details
+@telemetry.traced("stage")
+def extract_figures_and_text(conflict_results, ref_documents_texts, domain, expertise, style):
+    """
+    Extract figures and related technical text from the 'check_for_conflicts' function's output.
+    If the referenced documents exceed the stage's token budget they are analyzed in chunks and the results merged.
+    """
+    # Only send the cited paragraphs and figure descriptions, not the full text of every reference
+    if use_reference_retrieval:
+        ref_excerpts = select_reference_passages(conflict_results, ref_documents_texts, max_chars=reference_excerpt_max_chars)
+        full_chars = sum(len(text or "") for text in ref_documents_texts)
+        excerpt_chars = sum(len(excerpt) for excerpt in ref_excerpts)
+        logger.info("Reference excerpts: %s of %s characters selected for the figure analysis prompt",
+                    excerpt_chars, full_chars)
+        if excerpt_chars:
+            ref_documents_texts = ref_excerpts
+
+    if count_tokens(json.dumps(ref_documents_texts, indent=2)) <= figure_analysis_token_budget:
+        return extract_figures_and_text_chunk(conflict_results, ref_documents_texts, domain, expertise, style)
+
+    # Split each reference into overlapping pieces, then pack the pieces into chunks within the budget
+    chunks = [[]]
+    chunk_tokens = 0
+    for ref_text in ref_documents_texts:
+        for piece in split_into_chunks(ref_text or "", figure_analysis_token_budget, chunk_overlap_tokens):
+            piece_tokens = count_tokens(piece)
+            if chunks[-1] and chunk_tokens + piece_tokens > figure_analysis_token_budget:
+                chunks.append([])
+                chunk_tokens = 0
+            chunks[-1].append(piece)
+            chunk_tokens += piece_tokens
+    logger.info("Referenced documents split into %s chunks for figure analysis", len(chunks))
+
+    results = map_chunks(
+        lambda chunk: extract_figures_and_text_chunk(conflict_results, chunk, domain, expertise, style),
+        chunks, chunk_max_workers
+    )
+    results = [result for result in results if result]
+    if not results:
+        return None
+    if len(results) < len(chunks):
+        logger.warning("Figure analysis failed for %s of %s chunks", len(chunks) - len(results), len(chunks))
+
+    return {
+        "figures_analysis": merge_unique(
+            [item for result in results for item in result.get("figures_analysis", [])],
+            key_field="figure_number", text_field="technical_details"
+        ),
+        "extracted_paragraphs": merge_unique(
+            [item for result in results for item in result.get("extracted_paragraphs", [])]
+        ),
+    }
+
+@telemetry.traced("stage")
+def extract_figures_and_text_chunk(conflict_results, ref_documents_texts, domain, expertise, style):
+    """
+    Extract figures and related technical text from the 'check_for_conflicts' function's output for one set of referenced document texts.
+    """
+    # Extract the 'figures' and 'text' sections from the JSON output
+    fig_details = conflict_results.get("figures", [])
+    text_details = conflict_results.get("text", "")
+    messages = prompts.FIGURE_ANALYSIS.messages(
+        domain=domain,
+        expertise=expertise,
+        style=style,
+        figures=json.dumps(fig_details, indent=2),
+        text=text_details,
+        referenced_document_texts=json.dumps(ref_documents_texts, indent=2),
+    )
+
+    # Call OpenAI API for figure analysis
+    try:
+        return create_json_completion("extract_figures_and_text", messages, 0.2, schemas.FIGURE_ANALYSIS_SCHEMA)
+    except Exception as e:
+        logger.error("Error during figure analysis: %s", e)
+        return None
+
+
+@telemetry.traced("stage")
+def extract_details_from_filed_application(filed_application_text, foundational_claim, domain, expertise, style):
+    """
+    Extract details from the filed application related to the foundational claim.
+    If the application exceeds the stage's token budget it is analyzed in overlapping chunks and the details merged.
+    """
+    chunks = plan_chunks(filed_application_text, filed_application_token_budget, chunk_overlap_tokens)
+    if len(chunks) == 1:
+        return extract_details_from_filed_application_chunk(filed_application_text, foundational_claim, domain, expertise, style)
+    logger.info("Filed application split into %s chunks", len(chunks))
+
+    results = map_chunks(
+        lambda chunk: extract_details_from_filed_application_chunk(chunk, foundational_claim, domain, expertise, style),
+        chunks, chunk_max_workers
+    )
+    results = [result for result in results if result]
+    if not results:
+        return None
+    if len(results) < len(chunks):
+        logger.warning("Filed application extraction failed for %s of %s chunks",
+                       len(chunks) - len(results), len(chunks))
+
+    return {
+        "foundational_claim_details": merge_unique(
+            [item for result in results for item in result.get("foundational_claim_details", [])],
+            key_field="paragraph_number", text_field="text"
+        )
+    }
+
+@telemetry.traced("stage")
+def extract_details_from_filed_application_chunk(filed_application_text, foundational_claim, domain, expertise, style):
+    """
+    Extract details from the filed application (or one chunk of it) related to the foundational claim.
+    """
+    messages = prompts.FILED_APPLICATION_DETAILS.messages(
+        domain=domain,
+        expertise=expertise,
+        style=style,
+        foundational_claim=json.dumps(foundational_claim, indent=2),
+        filed_application_text=filed_application_text,
+    )
+
+    # Call OpenAI API for extracting details from the filed application
+    try:
+        return create_json_completion(
+            "extract_details_from_filed_application", messages, 0.2, schemas.FILED_APPLICATION_DETAILS_SCHEMA
+        )
+    except Exception as e:
+        logger.error("Error extracting details from filed application: %s", e)
+        return None
+
+
+# Function to extract details from pending claims and modify the filed application details
+@telemetry.traced("stage")
+def extract_and_modify_filed_application(filed_application_details, pending_claims_text, domain, expertise, style):
+    """
+    Extract details from the pending claims and modify the filed application details.
+    """
+    messages = prompts.MODIFY_FILED_APPLICATION.messages(
+        domain=domain,
+        expertise=expertise,
+        style=style,
+        filed_application_details=json.dumps(filed_application_details, indent=2),
+        pending_claims_text=pending_claims_text,
+    )
+
+    # Call OpenAI API for extracting and modifying filed application details
+    try:
+        return create_json_completion(
+            "extract_and_modify_filed_application", messages, 0.2, schemas.MODIFIED_DETAILS_SCHEMA
+        )
+    except Exception as e:
+        logger.error("Error extracting and modifying filed application details: %s", e)
+        return None
+
+# Function to analyze the filed application based on the foundational claim, figure analysis, and application details
+@telemetry.traced("stage")
+def analyze_filed_application(extracted_details, foundational_claim, figure_analysis, domain, expertise, style, on_delta=None):
+    messages = prompts.ANALYZE_FILED_APPLICATION.messages(
+        domain=domain,
+        expertise=expertise,
+        style=style,
+        foundational_claim=json.dumps(foundational_claim, indent=2),
+        figure_analysis=json.dumps(figure_analysis, indent=2),
+        extracted_details=extracted_details,
+    )
+
+    try:
+        response_content = create_chat_completion(
+            "analyze_filed_application", messages, temperature=0.2, json_response=False, on_delta=on_delta
+        )
+        analysis_output = response_content.strip()
+
+        if analysis_output.startswith("```json"):
+            analysis_output = analysis_output[7:-3].strip()
+        elif analysis_output.startswith("```"):
+            analysis_output = analysis_output[3:-3].strip()
+
+        try:
+            return json.loads(analysis_output)
+        except json.JSONDecodeError:
+            return analysis_output
+    except Exception as e:
+        logger.error("Error during filed application analysis: %s", e)
+        return None
+
+
+@telemetry.traced("stage")
+def analyze_modified_application(cited_references_text, foundational_claim, figure_analysis, modified_application_details, domain, expertise, style, on_delta=None):
+    messages = prompts.ANALYZE_MODIFIED_APPLICATION.messages(
+        domain=domain,
+        expertise=expertise,
+        style=style,
+        foundational_claim=json.dumps(foundational_claim, indent=2),
+        figure_analysis=json.dumps(figure_analysis, indent=2),
+        modified_application_details=json.dumps(modified_application_details, indent=2),
+        cited_references_text=json.dumps(cited_references_text, indent=2),
+    )
+
+    try:
+        response_content = create_chat_completion(
+            "analyze_modified_application", messages, temperature=0.6, json_response=False, on_delta=on_delta
+        )
+        analysis_output = response_content.strip()
+
+        if analysis_output.startswith("```json"):
+            analysis_output = analysis_output[7:-3].strip()
+        elif analysis_output.startswith("```"):
+            analysis_output = analysis_output[3:-3].strip()
+
+        try:
+            return json.loads(analysis_output)
+        except json.JSONDecodeError:
+            return analysis_output
+    except Exception as e:
+        logger.error("Error during modified application analysis: %s", e)
+        return None
+
+def get_document_analysis_client():
+    """Return a Form Recognizer client; the module-level one below is shared by the whole process and created on first use."""
+    return create_document_analysis_client(
+        form_recognizer_endpoint,
+        form_recognizer_api_key,
+        max_connections=http_max_connections,
+        retry_total=0,  # Retries go through call_with_retry so they respect the shared rate limit
+    )
+
+document_analysis_client = LazyClient(get_document_analysis_client) if form_recognizer_endpoint and form_recognizer_api_key else None
+
+def get_ocr_cache():
+    """Return the OCR cache configured by the OCR_CACHE_* settings."""
+    return OcrCache(
+        cache_dir=ocr_cache_dir,
+        max_bytes=ocr_cache_max_mb * 1024 * 1024,
+        compress=ocr_cache_compress,
+    )
+
+ocr_cache = get_ocr_cache()
+
+def get_artifact_cache():
+    """Return the converted document and report cache configured by the ARTIFACT_CACHE_* settings."""
+    return ArtifactCache(cache_dir=artifact_cache_dir, max_bytes=artifact_cache_max_mb * 1024 * 1024)
+
+artifact_cache = get_artifact_cache()
+
+def read_document_source(source):
+    """Return the content of a document given as a file path, or as its bytes (returned as they are)."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    return source
+
+def source_name(source, name=None):
+    """Return a name for a document source in messages: the given name, the file path or "document"."""
+    return name or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else "document")
+
+def read_pdf_document(source, name=None):
+    """Extract a structured document from a PDF, using its text layer where possible and Azure Form Recognizer for the rest.
+
+    source is a file path or the PDF's bytes; any bytes-like object works, so an upload's
+    getbuffer() view is passed to the text layer, the cache and OCR without copying.
+    Raises on failure instead of reporting to the page, so it is safe to call from worker threads.
+    The read is a "pdf" telemetry span, with the text layer and OCR calls as child spans counting their pages.
+    """
+    file_content = read_document_source(source)
+    name = source_name(source, name)
+
+    # Hybrid results differ from full OCR, so they are cached separately; the parse is cached with the text
+    extraction_model = f"{form_recognizer_model}+text-layer" if use_pdf_text_layer else form_recognizer_model
+    extraction_model += "+document"
+
+    with telemetry.span("pdf", "read_pdf_document", document=name, bytes=len(file_content)) as span:
+        # Skip the OCR round trip if this exact document was analyzed before
+        cached_document = ocr_cache.get(file_content, extraction_model)
+        if cached_document is not None:
+            logger.info("OCR cache hit for %s (%s bytes)", name, len(file_content))
+            span.set(cache="hit")
+            return PatentDocument.from_json(cached_document)
+        logger.info("OCR cache miss for %s (%s bytes)", name, len(file_content))
+
+        # Pull the embedded text locally and find the pages that still need OCR
+        page_texts = None
+        try:
+            with telemetry.span("pdf", "text_layer") as text_layer_span:
+                if use_pdf_text_layer:
+                    page_texts = extract_text_layer(file_content, text_layer_min_chars)
+                else:
+                    page_texts = [None] * count_pages(file_content)
+                text_layer_span.add(pages=sum(page_text is not None for page_text in page_texts))
+        except Exception as e:
+            logger.warning("Text layer extraction failed for %s: %s", name, e)
+
+        if page_texts is None:
+            # PyMuPDF could not read the file, send the whole document to OCR
+            ocr_page_numbers = None
+        else:
+            ocr_page_numbers = [number for number, page_text in enumerate(page_texts, start=1) if page_text is None]
+            logger.info("%s: %s page(s) from text layer, %s page(s) sent to OCR",
+                        name, len(page_texts) - len(ocr_page_numbers), len(ocr_page_numbers))
+            span.set(pages=len(page_texts), ocr_pages=len(ocr_page_numbers))
+
+        if ocr_page_numbers is None or ocr_page_numbers:
+            if document_analysis_client is None:
+                raise ValueError("FORM_RECOGNIZER_ENDPOINT and FORM_RECOGNIZER_API_KEY must be set to OCR documents")
+            from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+            limiter = form_recognizer_rate_limiter()
+            retry_options = dict(
+                max_retries=api_max_retries, base_delay=api_backoff_base_seconds, max_delay=api_backoff_max_seconds,
+                retry_exceptions=(ServiceRequestError, ServiceResponseError),
+            )
+
+            with telemetry.span("ocr", form_recognizer_model) as ocr_span:
+                if ocr_page_numbers is None:
+                    # Use the prebuilt-document model to analyze the whole document
+                    result = call_with_retry(
+                        lambda: document_analysis_client.begin_analyze_document(
+                            form_recognizer_model, document=file_content
+                        ).result(),
+                        limiter, **retry_options
+                    )
+                    page_texts = ["".join(line.content + "\n" for line in page.lines) for page in result.pages]
+                    ocr_span.add(pages=len(page_texts))
+                else:
+                    # Large documents are split into page-range shards that are analyzed in parallel
+                    ocr_texts = ocr_pdf_pages(
+                        document_analysis_client, file_content, ocr_page_numbers, form_recognizer_model,
+                        shard_pages=ocr_shard_pages, max_workers=ocr_shard_workers,
+                        limiter=limiter, retry_options=retry_options
+                    )
+                    for page_number in ocr_page_numbers:
+                        page_texts[page_number - 1] = ocr_texts.get(page_number, "")
+                    ocr_span.add(pages=len(ocr_page_numbers))
+
+        # Parse the pages, in page order, into paragraphs, claims, headings and figure references
+        document = PatentDocument.from_pages(page_texts)
+
+        ocr_cache.put(file_content, extraction_model, document.to_json())
+        return document
+
+def read_pdf_text(source, name=None):
+    """Extract text from a PDF (a file path or its bytes); raises on failure, so it is safe to call from worker threads."""
+    return read_pdf_document(source, name).text
+
+def read_pdf_texts(sources, on_complete=None, names=None):
+    """Extract text from several PDFs (file paths or their bytes) concurrently.
+
+    Returns the texts in the same order as sources, with None for files that failed.
+    on_complete(index, text, error) is called on the calling thread as each file finishes,
+    so callers can report progress from there. names are used in messages.
+    """
+    names = names or [source_name(source) for source in sources]
+    texts = [None] * len(sources)
+    with ThreadPoolExecutor(max_workers=ref_ocr_max_workers) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, read_pdf_text, source, name): index
+            for index, (source, name) in enumerate(zip(sources, names))
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            error = future.exception()
+            if error is None:
+                texts[index] = future.result()
+            else:
+                logger.warning("Text extraction failed for %s: %s", names[index], error)
+            if on_complete:
+                on_complete(index, texts[index], error)
+    return texts
+
+def is_docx(source, name=None):
+    """Return whether a document is a Word file, by its name (or path)."""
+    return source_name(source, name).lower().endswith(".docx")
+
+def read_docx_document(source, name=None):
+    """Parse a Word document (a file path or its bytes) into a structured document locally, with no conversion or OCR.
+
+    The parse is kept in the OCR cache under the document's content hash, like a PDF's.
+    """
+    file_content = read_document_source(source)
+    with telemetry.span("docx", "read_docx_document", document=source_name(source, name), bytes=len(file_content)) as span:
+        cached_document = ocr_cache.get(file_content, "docx+document")
+        if cached_document is not None:
+            span.set(cache="hit")
+            return PatentDocument.from_json(cached_document)
+        from docx_document import docx_page_texts
+
+        document = PatentDocument.from_pages(docx_page_texts(file_content))
+        span.add(pages=len(document.pages))
+        ocr_cache.put(file_content, "docx+document", document.to_json())
+        return document
+
+def read_document(source, name=None):
+    """Extract a structured document from a PDF or Word document (a file path or its bytes, with the file name).
+
+    DOCX files, told apart by name when only the bytes are given, are read natively; PDFs through read_pdf_document.
+    """
+    if is_docx(source, name):
+        return read_docx_document(source, name)
+    return read_pdf_document(source, name)
+
+def read_document_text(source, name=None):
+    """Extract the text of a PDF or Word document (a file path or its bytes, with the file name)."""
+    return read_document(source, name).text
+
+def read_combined_document(sources, names):
+    """
+    Extract one structured document from several PDF or Word documents, e.g. an unpublished
+    application's Word specification and its PDF drawings, read in parallel.
+
+    Each document's pages start with a section marker naming it, which the parse treats as a
+    heading, so paragraphs and claims don't run on from one document into the next.
+    """
+    documents = map_chunks(lambda item: read_document(*item), list(zip(sources, names)), len(sources))
+    pages = []
+    for index, (document, name) in enumerate(zip(documents, names), start=1):
+        document_pages = [list(page) for page in document.pages] or [[]]
+        document_pages[0].insert(0, section_marker(f"Part {index}: {os.path.basename(name)}"))
+        pages += document_pages
+    return PatentDocument(pages)
+
+@telemetry.traced("render", "combined_pdf")
+def render_combined_pdf(sources, names):
+    """
+    Return one PDF of several PDF or Word documents (file paths or their bytes), in order, for download.
+
+    Word documents are rendered locally from their native text; PDFs are included as they are.
+    The result is cached under the documents' content hashes, so it is rendered once per combination.
+    """
+    contents = [read_document_source(source) for source in sources]
+    key = artifact_key("combined-pdf", contents)
+    combined = artifact_cache.get(key)
+    if combined is None:
+        from docx_document import docx_page_texts
+
+        combined = concatenate_pdfs([
+            render_text_pdf(docx_page_texts(content)) if is_docx(content, name) else content
+            for content, name in zip(contents, names)
+        ])
+        artifact_cache.put(key, combined)
+    return combined
+
+def build_analysis_docx(analysis_output):
+    """
+    Render the analysis text (Markdown) as a Word report; returns a BytesIO buffer, or None if there is no analysis.
+
+    The report is cached under the hash of the analysis text, so it is rendered once per analysis.
+    """
+    if analysis_output is None or analysis_output.strip() == "":
+        return None
+    from report_docx import RENDERER_VERSION, render_markdown_docx
+
+    with telemetry.span("report", "analysis_docx", characters=len(analysis_output)) as span:
+        key = artifact_key(f"analysis-docx-v{RENDERER_VERSION}", [analysis_output.encode("utf-8")])
+        report = artifact_cache.get(key)
+        if report is not None:
+            span.set(cache="hit")
+        else:
+            report = render_markdown_docx(analysis_output, title="Filed Application Analysis Results")
+            artifact_cache.put(key, report)
+        return BytesIO(report)
+
+def analysis_file_name(filed_application_name):
+    """Return the report file name for a filed application, e.g. "US_123.pdf_ANALYSIS.docx"."""
+    return f"{filed_application_name.replace(' ', '_')}_ANALYSIS.docx"
+
+class PipelineError(Exception):
+    """A step of the pipeline produced no result; the message says which one."""
+
+def describe_document_error(error):
+    """Return the message shown for a document that could not be read."""
+    if is_http_response_error(error):
+        return f"Failed to analyze the document: {error.message}"
+    return f"An unexpected error occurred: {error}"
+
+def _read_step_document(read, source, name, failure_message):
+    """Read a step's document with read(source, name); raises PipelineError if that fails or finds no text."""
+    try:
+        text = read(source, name)
+    except Exception as e:
+        if not is_http_response_error(e):
+            raise
+        raise PipelineError(describe_document_error(e)) from e
+    if not text:
+        raise PipelineError(failure_message)
+    return text
+
+def _report(progress, message, fraction=None):
+    if progress:
+        progress(message, fraction)
+
+@telemetry.traced("step")
+def office_action_step(office_action, concurrent=False, compare_sequential=False, progress=None, name=None):
+    """
+    Step 1: determine the persona and check the office action for conflicts.
+
+    The office action is a PDF or Word file path or the document's bytes; name is its file name,
+    which tells DOCX from PDF when only the bytes are given.
+
+    Returns the domain, expertise, style, conflict results and the seconds the analysis took.
+    With compare_sequential (concurrent mode only) the sequential conflict check also runs,
+    and "agreement" holds its per-field agreement with the concurrent result (None if it failed).
+    progress(message, fraction) is called as the step advances. Raises PipelineError on failure.
+    """
+    _report(progress, "Extracting text from the examiner document")
+    action_document_text = _read_step_document(
+        read_document_text, office_action, name, "Failed to extract text from the examiner document."
+    )
+
+    _report(progress, "Determining domain expertise and checking for conflicts", 0.3)
+    step_start = time.perf_counter()
+    domain, expertise, style, conflict_results = run_step1_analysis(action_document_text, concurrent)
+    seconds = time.perf_counter() - step_start
+    if not (domain and expertise and style):
+        raise PipelineError("Failed to determine domain expertise.")
+    if not conflict_results:
+        raise PipelineError("Failed to check for conflicts.")
+    results = dict(domain=domain, expertise=expertise, style=style, conflict_results=conflict_results,
+                   seconds=seconds, agreement=None)
+
+    # Quality check: the sequential path uses the detected persona for the extraction
+    if concurrent and compare_sequential:
+        _report(progress, "Running the sequential conflict check for comparison", 0.7)
+        sequential_results = check_for_conflicts(action_document_text, domain, expertise, style)
+        if sequential_results:
+            results["agreement"] = compare_conflict_results(sequential_results, conflict_results)
+            logger.info("Step 1 concurrent vs sequential agreement: %s", results['agreement'])
+    return results
+
+@telemetry.traced("step")
+def references_step(references, conflict_results, domain, expertise, style, reference_names=None,
+                    progress=None):
+    """
+    Step 2: extract the referenced documents (file paths or their bytes) and analyze the cited figures and text.
+
+    References that can't be extracted are skipped and listed in "failed_references" as
+    {"name", "error"} entries, named by reference_names (default: the paths). Raises
+    PipelineError if no reference could be extracted or the analysis fails.
+    """
+    reference_names = reference_names or [source_name(reference) for reference in references]
+    failed_references = []
+    completed = []
+
+    def on_complete(index, text, error):
+        completed.append(index)
+        if error is not None:
+            failed_references.append({"name": reference_names[index], "error": describe_document_error(error)})
+        _report(progress, f"Extracted {len(completed)} of {len(references)} document(s)",
+                0.5 * len(completed) / len(references))
+
+    _report(progress, f"Extracting text from {len(references)} document(s)", 0.0)
+    ref_texts = [text for text in read_pdf_texts(references, on_complete, reference_names) if text]
+    if not ref_texts:
+        raise PipelineError("Failed to extract text from the referenced documents.")
+
+    _report(progress, "Analyzing figures and cited text", 0.5)
+    figure_analysis = extract_figures_and_text(conflict_results, ref_texts, domain, expertise, style)
+    if not figure_analysis:
+        raise PipelineError("Failed to analyze figures and cited text.")
+    return {"figure_analysis": figure_analysis, "failed_references": failed_references}
+
+@telemetry.traced("step")
+def filed_application_step(filed_application, foundational_claim, figure_analysis, domain, expertise, style,
+                           progress=None, on_delta=None, name=None):
+    """
+    Step 3: extract the filed application's details and analyze it against the figure analysis.
+
+    The filed application is a PDF or Word file path or the document's bytes; name is its file
+    name, which tells DOCX from PDF when only the bytes are given. An unpublished application
+    can be given as a list of documents with a list of names (e.g. the Word specification and
+    the PDF drawings), whose texts are read natively and combined (see read_combined_document).
+
+    Returns the extracted details and the analysis text; on_delta receives the analysis as
+    it streams in. Raises PipelineError on failure.
+    """
+    _report(progress, "Extracting text from the filed application")
+    # Prompt from the parsed document, without running headers, footers and drawing sheets
+    read = read_combined_document if isinstance(filed_application, list) else read_document
+    filed_application_text = _read_step_document(
+        lambda source, name: read(source, name).prompt_text(), filed_application, name,
+        "Failed to extract text from the filed application document."
+    )
+
+    _report(progress, "Extracting details from the filed application", 0.3)
+    filed_app_details = extract_details_from_filed_application(
+        filed_application_text, foundational_claim, domain, expertise, style
+    )
+    if not filed_app_details:
+        raise PipelineError("Failed to analyze the filed application.")
+
+    _report(progress, "Analyzing the filed application", 0.6)
+    filed_application_analysis = analyze_filed_application(
+        json.dumps(filed_app_details, indent=2), foundational_claim, figure_analysis, domain, expertise, style,
+        on_delta=on_delta
+    )
+    if not filed_application_analysis:
+        raise PipelineError("Failed to analyze the filed application.")
+    return {"filed_application_details": filed_app_details, "filed_application_analysis": filed_application_analysis}
+
+@telemetry.traced("stage")
+def analyze_pending_claim_unit(unit_text, filed_application_analysis, foundational_claim, figure_analysis,
+                               domain, expertise, style, on_delta=None):
+    """
+    Modify the filed application analysis for one claim unit (an independent claim and its dependents) and analyze it.
+
+    Returns {"modified_details", "analysis"}; raises PipelineError on failure.
+    """
+    modified_details = extract_and_modify_filed_application(
+        filed_application_analysis, unit_text, domain, expertise, style
+    )
+    if not modified_details:
+        raise PipelineError("Failed to modify the filed application based on pending claims.")
+    analysis = analyze_modified_application(
+        unit_text, foundational_claim, figure_analysis, modified_details, domain, expertise, style,
+        on_delta=on_delta
+    )
+    if not analysis:
+        raise PipelineError("Failed to analyze the pending claims.")
+    return {"modified_details": modified_details, "analysis": analysis}
+
+def _section_text(analysis):
+    return analysis if isinstance(analysis, str) else json.dumps(analysis, indent=2)
+
+def _merge_modified_details(units):
+    """
+    Combine the modified details of the claim units into one {"modified_filed_application_details": [...]} result.
+
+    Each item is tagged with the independent claim of its unit; a document analyzed as a whole
+    (unit None) keeps its modified details as they are.
+    """
+    if [number for number, _ in units] == [None]:
+        return units[0][1]
+    details = []
+    for number, modified in units:
+        items = modified.get("modified_filed_application_details") if isinstance(modified, dict) else None
+        if isinstance(items, list):
+            details.extend(dict(item, claim=number) if isinstance(item, dict) else {"claim": number, "text": item}
+                           for item in items)
+        else:
+            details.append({"claim": number, "text": modified})
+    return {"modified_filed_application_details": details}
+
+@telemetry.traced("step")
+def pending_claims_step(pending_claims, filed_application_analysis, foundational_claim, figure_analysis,
+                        domain, expertise, style, progress=None, on_delta=None, name=None):
+    """
+    Step 4: update the filed application analysis for the pending claims and analyze them.
+
+    The pending claims are a PDF or Word file path or the document's bytes; name is its file
+    name, which tells DOCX from PDF when only the bytes are given.
+
+    The claims are grouped into units of an independent claim and its dependents. Each unit's
+    modified details and analysis are checkpointed by the unit's hash and the upstream results,
+    so only units with an added or changed claim go to the model and the others are reused.
+    The units' analyses are merged into one report with each heading of the report template
+    once, every unit's section under its claims. A document without numbered claims is one
+    unit and its analysis is the report. Canceled and withdrawn claims are skipped.
+
+    Returns the modified filed application details, the pending claims analysis and
+    "claim_changes": the claims added, changed, unchanged and removed since the last analysis
+    on the same upstream results, and which claims were reanalyzed or reused. on_delta
+    receives the analysis as it streams in. Raises PipelineError on failure.
+    """
+    _report(progress, "Extracting text from the pending claims document")
+    pending_claims_text = _read_step_document(
+        read_document_text, pending_claims, name, "Failed to extract text from the pending claims document."
+    )
+
+    upstream = {
+        "filed_application_analysis": filed_application_analysis, "foundational_claim": foundational_claim,
+        "figure_analysis": figure_analysis, "domain": domain, "expertise": expertise, "style": style,
+    }
+    claims = split_claims(pending_claims_text)
+    canceled = [number for number, text in claims if not is_pending(text)]
+    claim_texts = {number: text for number, text in claims if number not in canceled}
+    if claims and not claim_texts:
+        raise PipelineError("The pending claims document has no pending claims to analyze.")
+    hashes = {number: claim_hash(text) for number, text in claim_texts.items()}
+    if claims:
+        units = claim_units(list(claim_texts.items()))
+        unit_texts = {root: "\n".join(claim_texts[number] for number in members) for root, members in units.items()}
+        unit_hashes = {root: unit_hash([hashes[number] for number in members]) for root, members in units.items()}
+    else:
+        units = {None: [None]}
+        unit_texts = {None: pending_claims_text}
+        unit_hashes = {None: claim_hash(pending_claims_text)}
+
+    # Compare with the claim set analyzed last time on the same upstream results
+    claim_set_key = checkpoint_key("pending_claims_set", upstream)
+    claim_changes = diff_claims(checkpoint_store.get(claim_set_key) if claims else None, hashes)
+    claim_changes["canceled"] = canceled
+
+    section_keys = {root: checkpoint_key("pending_claim_section", {"claims": unit_hashes[root], **upstream})
+                    for root in units}
+    sections = {}
+    if not llm_cache_bypass.get():
+        for root, key in section_keys.items():
+            section = checkpoint_store.get(key)
+            if section is not None:
+                sections[root] = section
+    pending = [root for root in units if root not in sections]
+    claim_changes["reused"] = [number for root in units if root in sections for number in units[root]]
+    claim_changes["reanalyzed"] = [number for root in pending for number in units[root]]
+
+    # The report so far: reused sections in full, the others as far as they have streamed in
+    partial_texts = {root: _section_text(section["analysis"]) for root, section in sections.items()}
+    partial_lock = threading.Lock()
+
+    def report_text():
+        return merge_unit_reports(
+            [(unit_label(units[root]) if root is not None else "", partial_texts.get(root, "")) for root in units],
+            prompts.ANALYSIS_REPORT_HEADINGS,
+        )
+
+    def unit_on_delta(root):
+        if on_delta is None:
+            return None
+        def on_unit_delta(text):
+            with partial_lock:
+                partial_texts[root] = text
+                on_delta(report_text())
+        return on_unit_delta
+
+    if pending:
+        _report(progress, f"Analyzing {len(pending)} changed claim group(s), reusing {len(sections)}", 0.3)
+        if on_delta and sections:
+            on_delta(report_text())
+        with ThreadPoolExecutor(max_workers=max(1, claim_max_workers)) as executor:
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run, analyze_pending_claim_unit, unit_texts[root],
+                    filed_application_analysis, foundational_claim, figure_analysis, domain, expertise, style,
+                    unit_on_delta(root)
+                ): root
+                for root in pending
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                root = futures[future]
+                try:
+                    section = future.result()
+                except PipelineError as e:
+                    raise PipelineError(f"{e} ({unit_label(units[root])})" if root is not None else str(e)) from e
+                # Checkpoint each unit as it completes, so a failed run resumes from the finished units
+                checkpoint_store.put(section_keys[root], "pending_claim_section", section)
+                sections[root] = section
+                with partial_lock:
+                    partial_texts[root] = _section_text(section["analysis"])
+                _report(progress, f"Analyzed {done} of {len(pending)} changed claim group(s)",
+                        0.3 + 0.7 * done / len(pending))
+    else:
+        _report(progress, f"No changed claims; reusing the analysis of {len(sections)} claim group(s)", 0.9)
+
+    modified_filed_application_results = _merge_modified_details(
+        [(root, sections[root]["modified_details"]) for root in units]
+    )
+    pending_claims_analysis = report_text()
+    if on_delta:
+        on_delta(pending_claims_analysis)
+    if claims:
+        checkpoint_store.put(claim_set_key, "pending_claims_set", hashes)
+    return {
+        "modified_filed_application_results": modified_filed_application_results,
+        "pending_claims_analysis": pending_claims_analysis,
+        "claim_changes": claim_changes,
+    }
+
+# Parameters that don't change a step's result, so they are left out of its checkpoint key
+checkpoint_ignored_params = ("file_name", "part_names", "reference_names", "concurrent", "compare_sequential")
+
+def step_checkpoint_key(step, params):
+    """
+    Return the checkpoint key of a step for its parameters.
+
+    params hold the SHA-256 hashes of the step's documents under "documents" and the upstream
+    results the step builds on; checkpoint_ignored_params are left out.
+    """
+    return checkpoint_key(step, {name: value for name, value in params.items() if name not in checkpoint_ignored_params})
+
+def find_step_checkpoint(step, params):
+    """
+    Return the checkpointed result of a step for these parameters, or None.
+
+    Comparison runs of Step 1 always run, and so does everything while the LLM cache is
+    bypassed, since both ask for fresh model output.
+    """
+    if params.get("compare_sequential") or llm_cache_bypass.get():
+        return None
+    return checkpoint_store.get(step_checkpoint_key(step, params))
+
+def run_step_checkpointed(step, params, run):
+    """Return the step's checkpointed result for these parameters, or run() it and checkpoint the result."""
+    result = find_step_checkpoint(step, params)
+    if result is not None:
+        logger.info("Checkpoint hit for %s", step)
+        return result
+    result = run()
+    checkpoint_store.put(step_checkpoint_key(step, params), step, result)
+    return result
+
+def analyze_matter(office_action_path, reference_paths, filed_application_path, pending_claims_path=None,
+                   concurrent_step1=False):
+    """
+    Run Steps 1-4 for one matter, as the app does, and return the results of every step.
+
+    The returned dict holds the persona, conflict results, figure analysis, filed application
+    analysis, the pending claims analysis (if a pending claims document is given), the final
+    report text and the seconds spent on each step. Raises PipelineError if a step fails.
+    """
+    results = {"timings": {}, "failed_references": []}
+
+    # Step 1: office action
+    step_start = time.perf_counter()
+    office_action = read_document_source(office_action_path)
+    step1 = run_step_checkpointed(
+        "office_action", {"documents": [document_hash(office_action)]},
+        lambda: office_action_step(office_action, concurrent_step1, name=office_action_path)
+    )
+    domain, expertise, style = step1["domain"], step1["expertise"], step1["style"]
+    conflict_results = step1["conflict_results"]
+    foundational_claim = conflict_results.get("foundational_claim", "")
+    results.update(domain=domain, expertise=expertise, style=style, conflict_results=conflict_results)
+    results["timings"]["step1"] = time.perf_counter() - step_start
+
+    # Step 2: referenced documents
+    step_start = time.perf_counter()
+    references = [read_document_source(reference_path) for reference_path in reference_paths]
+    step2 = run_step_checkpointed(
+        "references",
+        {"documents": [document_hash(reference) for reference in references], "conflict_results": conflict_results,
+         "domain": domain, "expertise": expertise, "style": style},
+        lambda: references_step(references, conflict_results, domain, expertise, style, reference_names=reference_paths)
+    )
+    figure_analysis = step2["figure_analysis"]
+    results["failed_references"] = [failure["name"] for failure in step2["failed_references"]]
+    results["figure_analysis"] = figure_analysis
+    results["timings"]["step2"] = time.perf_counter() - step_start
+
+    # Step 3: application as filed
+    step_start = time.perf_counter()
+    filed_application = read_document_source(filed_application_path)
+    step3 = run_step_checkpointed(
+        "filed_application",
+        {"documents": [document_hash(filed_application)], "foundational_claim": foundational_claim,
+         "figure_analysis": figure_analysis, "domain": domain, "expertise": expertise, "style": style},
+        lambda: filed_application_step(
+            filed_application, foundational_claim, figure_analysis, domain, expertise, style,
+            name=filed_application_path
+        )
+    )
+    filed_application_analysis = step3["filed_application_analysis"]
+    results.update(step3)
+    results["timings"]["step3"] = time.perf_counter() - step_start
+
+    # Step 4: pending claims
+    report = filed_application_analysis
+    if pending_claims_path:
+        step_start = time.perf_counter()
+        pending_claims = read_document_source(pending_claims_path)
+        step4 = run_step_checkpointed(
+            "pending_claims",
+            {"documents": [document_hash(pending_claims)], "filed_application_analysis": filed_application_analysis,
+             "foundational_claim": foundational_claim, "figure_analysis": figure_analysis,
+             "domain": domain, "expertise": expertise, "style": style},
+            lambda: pending_claims_step(
+                pending_claims, filed_application_analysis, foundational_claim, figure_analysis,
+                domain, expertise, style, name=pending_claims_path
+            )
+        )
+        results.update(step4)
+        results["timings"]["step4"] = time.perf_counter() - step_start
+        report = step4["pending_claims_analysis"]
+
+    # The analysis is normally report text; keep a JSON reply readable in the report as well
+    results["report"] = report if isinstance(report, str) else json.dumps(report, indent=2)
+    return results
+
+# Background jobs for the app: each step runs as a job whose inputs are the step's uploaded documents.
+# Job parameters carry the documents' hashes, so each job resumes from its step's checkpoint if there is one
+job_db_path = os.getenv("JOB_DB_PATH", os.path.join(".jobs", "jobs.sqlite3"))
+job_max_workers = int(os.getenv("JOB_WORKERS", "4"))
+job_retention_hours = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+def office_action_job(job):
+    return run_step_checkpointed(job.kind, job.params, lambda: office_action_step(
+        job.input("office_action"), job.params["concurrent"], job.params["compare_sequential"],
+        progress=job.progress, name=job.params["file_name"]
+    ))
+
+def references_job(job):
+    reference_names = job.params["reference_names"]
+    return run_step_checkpointed(job.kind, job.params, lambda: references_step(
+        [job.input(f"reference_{index}") for index in range(len(reference_names))],
+        job.params["conflict_results"], job.params["domain"], job.params["expertise"], job.params["style"],
+        reference_names=reference_names, progress=job.progress
+    ))
+
+def filed_application_job(job):
+    # A combined application comes as its parts, named by "part_names"
+    part_names = job.params.get("part_names")
+    if part_names:
+        filed_application = [job.input(f"part_{index}") for index in range(len(part_names))]
+    else:
+        filed_application = job.input("filed_application")
+    return run_step_checkpointed(job.kind, job.params, lambda: filed_application_step(
+        filed_application, job.params["foundational_claim"], job.params["figure_analysis"],
+        job.params["domain"], job.params["expertise"], job.params["style"],
+        progress=job.progress, on_delta=job.stream, name=part_names or job.params["file_name"]
+    ))
+
+def pending_claims_job(job):
+    return run_step_checkpointed(job.kind, job.params, lambda: pending_claims_step(
+        job.input("pending_claims"), job.params["filed_application_analysis"],
+        job.params["foundational_claim"], job.params["figure_analysis"],
+        job.params["domain"], job.params["expertise"], job.params["style"],
+        progress=job.progress, on_delta=job.stream, name=job.params["file_name"]
+    ))
+
+def traced_job(handler):
+    """Run a job handler in a "job" telemetry span that records how long the job waited for a worker."""
+    def run(job):
+        with telemetry.span("job", job.kind, job_id=job.id) as span:
+            span.add(queue_seconds=job.queue_seconds)
+            return handler(job)
+    return run
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    Return the process-wide job queue with the step handlers registered.
+
+    Created on first use rather than at import, so importing the pipeline (e.g. from the batch
+    CLI) doesn't start workers or resume the app's interrupted jobs.
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            queue = JobQueue(
+                job_db_path, job_max_workers, job_retention_hours * 3600, expected_errors=(PipelineError,)
+            )
+            queue.register("office_action", traced_job(office_action_job))
+            queue.register("references", traced_job(references_job))
+            queue.register("filed_application", traced_job(filed_application_job))
+            queue.register("pending_claims", traced_job(pending_claims_job))
+            queue.start()
+            _job_queue = queue
+        return _job_queue
+
+def collect_service_metrics():
+    """Return the rate limiter, cache and job queue counters as metrics for the telemetry endpoint."""
+    limiters = rate_limiters.stats()
+    metrics = [
+        ("rate_limit_requests_total", "counter", "Requests sent through each rate limiter.",
+         [({"limiter": limiter["name"]}, limiter["requests"]) for limiter in limiters]),
+        ("rate_limit_wait_seconds_total", "counter", "Time requests waited for rate-limit capacity.",
+         [({"limiter": limiter["name"]}, limiter["total_wait"]) for limiter in limiters]),
+        ("rate_limit_retries_total", "counter", "Retried requests, per rate limiter.",
+         [({"limiter": limiter["name"]}, limiter["retries"]) for limiter in limiters]),
+        ("rate_limit_throttled_total", "counter", "Requests rejected with 429, per rate limiter.",
+         [({"limiter": limiter["name"]}, limiter["throttled"]) for limiter in limiters]),
+    ]
+    for cache_name, cache in (("ocr", ocr_cache), ("llm", llm_cache), ("checkpoint", checkpoint_store),
+                              ("artifact", artifact_cache)):
+        cache_stats = cache.stats()
+        metrics += [
+            (f"{cache_name}_cache_hits_total", "counter", f"Lookups served from the {cache_name} cache.", [({}, cache_stats["hits"])]),
+            (f"{cache_name}_cache_misses_total", "counter", f"Lookups not found in the {cache_name} cache.", [({}, cache_stats["misses"])]),
+            (f"{cache_name}_cache_disk_bytes", "gauge", f"Disk usage of the {cache_name} cache.", [({}, cache_stats["disk_bytes"])]),
+        ]
+    if _job_queue is not None:
+        metrics.append(("jobs", "gauge", "Background jobs per status.",
+                        [({"status": status}, count) for status, count in _job_queue.stats().items()]))
+    return metrics
+
+telemetry.register_collector(collect_service_metrics)
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+def get_metrics_server():
+    """
+    Return the process-wide metrics endpoint, starting it on METRICS_HOST:METRICS_PORT on the first call.
+
+    Started by the app and the batch CLI rather than at import, so importing the pipeline doesn't
+    bind the port. Returns None if metrics are disabled (port 0) or the port is taken.
+    """
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is None and metrics_port:
+            _metrics_server = start_metrics_server(telemetry, metrics_port, metrics_host)
+        return _metrics_server
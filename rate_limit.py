@@ -0,0 +1,217 @@
+"""Client-side rate limiting and retry with backoff for the Azure services.
+
+Each deployment gets a RateLimiter holding two token buckets, requests per
+minute and tokens per minute, shared by every session and worker thread in the
+process. Calls wait for capacity before they are sent, so bursts are spread out
+instead of being rejected with 429. Throttled or failed calls are retried with
+jittered exponential backoff, honoring the service's Retry-After header.
+"""
+import logging
+import random
+import threading
+import time
+
+import telemetry
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Child of the "pipeline" logger, so pipeline.configure_logging and LOG_LEVEL apply to it
+logger = logging.getLogger("pipeline.rate_limit")
+
+
+class TokenBucket:
+    """Capacity that refills continuously at rate_per_minute, up to one minute's worth.
+
+    Amounts larger than the capacity are allowed once the bucket is full and leave it in
+    debt, so one oversized request can't block forever but still pays for its size.
+    Not thread-safe on its own; RateLimiter guards it with its lock.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount can be taken (0 if it can be taken now)."""
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate_per_second)
+
+    def take(self, amount):
+        self.level -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one deployment, with queueing metrics.
+
+    A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, name, requests_per_minute=0, tokens_per_minute=0):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.requests = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+        self.throttled = 0
+
+    def acquire(self, tokens=0):
+        """Block until a request of about `tokens` tokens may be sent; return the seconds waited."""
+        started = time.monotonic()
+        queued = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_time(amount))
+                if wait <= 0:
+                    if self.request_bucket is not None:
+                        self.request_bucket.take(1)
+                    if self.token_bucket is not None:
+                        self.token_bucket.take(tokens)
+                    waited = now - started
+                    self.requests += 1
+                    if queued:
+                        self.queued += 1
+                        self.total_wait += waited
+                        self.max_wait = max(self.max_wait, waited)
+                    return waited
+            queued = True
+            time.sleep(wait)
+
+    def adjust(self, tokens):
+        """Charge (or refund, if negative) the difference between estimated and actual token usage."""
+        if self.token_bucket is None or not tokens:
+            return
+        with self._lock:
+            self.token_bucket.refill(time.monotonic())
+            self.token_bucket.take(tokens)
+            self.token_bucket.level = min(self.token_bucket.capacity, self.token_bucket.level)
+
+    def pause(self, seconds):
+        """Hold back every caller of this limiter for the given time, e.g. after a 429."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def record_retry(self, throttled):
+        with self._lock:
+            self.retries += 1
+            if throttled:
+                self.throttled += 1
+
+    def stats(self):
+        """Return request, queueing delay and retry counters."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests": self.requests,
+                "queued": self.queued,
+                "average_wait": self.total_wait / self.requests if self.requests else 0.0,
+                "max_wait": self.max_wait,
+                "total_wait": self.total_wait,
+                "retries": self.retries,
+                "throttled": self.throttled,
+            }
+
+
+class RateLimiterRegistry:
+    """Process-wide RateLimiter per deployment name."""
+
+    def __init__(self):
+        self.limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, requests_per_minute=0, tokens_per_minute=0):
+        """Return the limiter for name, creating it with the given limits on first use."""
+        with self._lock:
+            if name not in self.limiters:
+                self.limiters[name] = RateLimiter(name, requests_per_minute, tokens_per_minute)
+            return self.limiters[name]
+
+    def stats(self):
+        with self._lock:
+            limiters = list(self.limiters.values())
+        return [limiter.stats() for limiter in limiters]
+
+
+def status_code(error):
+    """Return the HTTP status of an OpenAI or Azure SDK error, or None."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_seconds(error):
+    """Return the delay requested by the service's Retry-After headers, or None."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue  # HTTP-date values are rare from Azure; fall back to backoff
+    return None
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """Exponential backoff with full jitter for the given 0-based retry attempt."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retry(call, limiter=None, tokens=0, max_retries=5, base_delay=1.0, max_delay=60.0,
+                    retry_exceptions=()):
+    """
+    Call `call()` once the limiter has capacity, retrying throttled and transient failures.
+
+    Errors with a retryable HTTP status, or of a type in retry_exceptions (e.g. connection
+    errors), are retried up to max_retries times. A 429 pauses the whole limiter for the
+    Retry-After time so other callers back off too; other failures only delay this caller.
+    The time spent waiting for the limiter and the retries are added to the current telemetry span.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            telemetry.add(queue_seconds=limiter.acquire(tokens))
+        try:
+            return call()
+        except Exception as error:
+            status = status_code(error)
+            retryable = status in RETRYABLE_STATUS_CODES or isinstance(error, retry_exceptions)
+            if attempt == max_retries or not retryable:
+                raise
+
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                # A little jitter so callers paused together don't all retry at the same instant
+                delay = min(max_delay, retry_after) + random.uniform(0, base_delay)
+            else:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning("Retrying %s in %.1fs after error %s (attempt %s of %s)", limiter.name if limiter else "call",
+                           delay, status or type(error).__name__, attempt + 1, max_retries)
+            telemetry.add(retries=1, throttled=int(status == 429))
+
+            if limiter is not None:
+                limiter.adjust(-tokens)  # A rejected request didn't use its tokens
+                limiter.record_retry(status == 429)
+                if status == 429:
+                    limiter.pause(delay)
+                    continue
+            time.sleep(delay)
@@ -0,0 +1,182 @@
+"""Paragraph-level retrieval over referenced documents.
+
+The Step 2 figure-analysis prompt only needs the paragraphs and figure
+descriptions the examiner cited, not the full OCR text of every reference.
+This module splits each reference into passages (numbered paragraphs such as
+"[0045]" and claims where present, line windows otherwise), ranks them with BM25
+against the conflict results, and returns compact per-reference excerpts.
+"""
+import math
+import re
+from collections import Counter
+
+from patent_document import PatentDocument
+
+# Paragraph citations in the examiner's text: "[0045]", "para. 45", "paragraphs [0045]-[0050]", "¶ 45"
+PARAGRAPH_CITATION = re.compile(
+    r"(?:\[|¶\s*|\bpara(?:graph)?s?\.?\s*\[?)(\d{1,5})\]?(?:\s*(?:-|–|to|through)\s*\[?(\d{1,5})\]?)?",
+    re.IGNORECASE,
+)
+FIGURE_REFERENCE = re.compile(r"\bFIG(?:URE)?S?\.?\s*(\d+[A-Z]?)\b", re.IGNORECASE)
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it", "its",
+    "of", "on", "or", "that", "the", "to", "which", "with", "wherein", "said", "may", "can", "such",
+}
+
+
+def tokenize(text):
+    """Lower-case word tokens without common stopwords."""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def figure_labels(text):
+    """Return the normalized figure labels mentioned in a text, e.g. {"3", "4A"}."""
+    return {label.upper() for label in FIGURE_REFERENCE.findall(text)}
+
+
+def cited_paragraph_numbers(text):
+    """Return the paragraph numbers cited in a text, expanding short ranges."""
+    numbers = set()
+    for match in PARAGRAPH_CITATION.finditer(text):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else start
+        if start <= end <= start + 50:
+            numbers.update(range(start, end + 1))
+        else:
+            numbers.add(start)
+    return numbers
+
+
+class Passage:
+    """A paragraph (or line window) of one referenced document."""
+
+    def __init__(self, document_index, position, paragraph_number, text):
+        self.document_index = document_index
+        self.position = position
+        self.paragraph_number = paragraph_number
+        self.text = text
+        self.figures = figure_labels(text)
+
+
+def split_passages(text, document_index, lines_per_passage=8):
+    """
+    Split a reference into passages: its numbered paragraphs and claims as parsed by
+    PatentDocument, and fixed line windows over everything else (front page, granted
+    patents without paragraph numbers, ...).
+    """
+    document = PatentDocument.from_text(text)
+    spans = [(start, end, number) for number, start, end in document.paragraphs]
+    spans += [(start, end, None) for _, start, end in document.claims]
+    covered = {i for start, end, _ in spans for i in range(start, end)}
+
+    # Line windows over the lines not covered by a paragraph or claim
+    window = []
+    for i, line in enumerate(document.lines + [None]):
+        if line is not None and i not in covered and line.strip():
+            window.append(i)
+        if window and (line is None or i in covered or len(window) == lines_per_passage):
+            spans.append((window[0], window[-1] + 1, None))
+            window = []
+
+    passages = []
+    for start, end, number in sorted(spans):
+        passage_text = "\n".join(line for line in document.lines[start:end] if line.strip())
+        passages.append(Passage(document_index, len(passages), number, passage_text))
+    return passages
+
+
+class Bm25Index:
+    """Okapi BM25 ranking over a list of passages."""
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(passage.text)) for passage in passages]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.document_frequency = Counter()
+        for counts in self.term_counts:
+            self.document_frequency.update(counts.keys())
+
+    def scores(self, query):
+        """Return the BM25 score of every passage for a query string."""
+        query_terms = set(tokenize(query))
+        passage_count = len(self.passages)
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                df = self.document_frequency[term]
+                idf = math.log(1 + (passage_count - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+                score += idf * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+
+def select_reference_passages(conflict_results, ref_documents_texts, max_chars=24000, top_k=6, neighbours=1):
+    """
+    Build compact excerpts of the referenced documents for the figure-analysis prompt.
+
+    Passages are taken in priority order until max_chars is reached: paragraphs cited in
+    the conflict results (with their neighbours) from every reference, then passages
+    describing the cited figures, then the best BM25 matches for the foundational claim
+    and cited text in each reference, highest score first across all references.
+    Returns one excerpt string per reference, with passages in document order.
+    """
+    figures = conflict_results.get("figures") or []
+    cited_text = "\n".join([
+        str(conflict_results.get("text") or ""),
+        "\n".join(str(figure) for figure in figures),
+    ])
+    query = "\n".join([str(conflict_results.get("foundational_claim") or ""), cited_text])
+    cited_paragraphs = cited_paragraph_numbers(cited_text)
+    cited_figures = figure_labels(cited_text)
+
+    # One pass per priority across all references, so a reference's low-priority
+    # passages never crowd out another reference's cited paragraphs
+    cited, figure_passages, best_matches = [], [], []
+    for document_index, text in enumerate(ref_documents_texts):
+        passages = split_passages(text or "", document_index)
+        if not passages:
+            continue
+        scores = Bm25Index(passages).scores(query)
+        by_score = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+
+        for i, passage in enumerate(passages):
+            if passage.paragraph_number in cited_paragraphs:
+                cited.extend(passages[max(0, i - neighbours):i + neighbours + 1])
+
+        # Figure descriptions: the best-scoring passages that mention each cited figure
+        for figure in sorted(cited_figures):
+            figure_passages.extend([passages[i] for i in by_score if figure in passages[i].figures][:2])
+
+        best_matches.extend((scores[i], passages[i]) for i in by_score[:top_k] if scores[i] > 0)
+
+    best_matches.sort(key=lambda match: match[0], reverse=True)
+    ranked = cited + figure_passages + [passage for _, passage in best_matches]  # Duplicates removed below
+
+    selected = {}
+    used_chars = 0
+    for passage in ranked:
+        key = (passage.document_index, passage.position)
+        if key in selected:
+            continue
+        if used_chars + len(passage.text) > max_chars:
+            continue
+        selected[key] = passage
+        used_chars += len(passage.text)
+
+    excerpts = []
+    for document_index in range(len(ref_documents_texts)):
+        document_passages = sorted(
+            (passage for passage in selected.values() if passage.document_index == document_index),
+            key=lambda passage: passage.position,
+        )
+        excerpts.append("\n...\n".join(passage.text for passage in document_passages))
+    return excerpts
@@ -0,0 +1,202 @@
+"""Single-pass rendering of the Markdown analysis reports as Word documents.
+
+The analyses are Markdown as the model writes it. Each line is classified once,
+with one regular expression, and added to the document as it is read:
+
+- "#" to "######" headings become Word headings;
+- "-", "*" and "+" bullets and "1." / "1)" numbered items become Word list
+  paragraphs, nested by indentation up to three levels; every numbered list
+  restarts at its first number instead of continuing the previous list;
+- consecutive "| a | b |" lines become a table, with the row above a
+  "|---|---|" separator as a bold header row;
+- **bold**, *italic*, ***bold italic*** (or with underscores) and `code` spans
+  become formatted runs, also inside list items, headings and table cells.
+
+Horizontal rules and blank lines are dropped; any other line is a paragraph.
+Styles are looked up once per document and set on the paragraphs by id:
+assigning a style through python-docx scans every style of the document for
+the default one, which took most of the time of rendering a long report.
+"""
+import re
+from io import BytesIO
+
+import docx
+
+# Bump when the output changes, so reports rendered by an older version aren't served from the cache
+RENDERER_VERSION = 1
+MAX_LIST_LEVELS = 3  # List Bullet, List Bullet 2 and List Bullet 3 in the default template
+
+LINE = re.compile(
+    r"(?P<indent>[ \t]*)(?:"
+    r"(?P<hashes>#{1,6})\s+(?P<heading>.*?)(?:\s+#+)?\s*"
+    r"|(?P<rule>(?:[-*_][ \t]*){3,})"
+    r"|(?P<bullet>[-*+])\s+(?P<bullet_text>.*)"
+    r"|(?P<number>\d{1,9})[.)]\s+(?P<number_text>.*)"
+    r"|(?P<row>\|.*)"
+    r")$"
+)
+TABLE_SEPARATOR = re.compile(r"\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*$")
+INLINE = re.compile(
+    r"(?P<strong_emphasis>\*\*\*(?=\S)(?P<strong_emphasis_text>.+?)(?<=\S)\*\*\*"
+    r"|(?<!\w)___(?=\S)(?P<strong_emphasis_underscore>.+?)(?<=\S)___(?!\w))"
+    r"|(?P<strong>\*\*(?=\S)(?P<strong_text>.+?)(?<=\S)\*\*"
+    r"|(?<!\w)__(?=\S)(?P<strong_underscore>.+?)(?<=\S)__(?!\w))"
+    r"|(?P<emphasis>\*(?=[^\s*])(?P<emphasis_text>.+?)(?<=[^\s*])\*"
+    r"|(?<!\w)_(?=[^\s_])(?P<emphasis_underscore>.+?)(?<=[^\s_])_(?!\w))"
+    r"|`(?P<code>[^`]+)`"
+)
+
+
+def add_inline(paragraph, text, bold=None, italic=None):
+    """Add text to a paragraph as runs, formatting its bold, italic and code spans."""
+    position = 0
+    for match in INLINE.finditer(text):
+        if match.start() > position:
+            _add_run(paragraph, text[position:match.start()], bold, italic)
+        if match.group("strong_emphasis"):
+            inner = match.group("strong_emphasis_text") or match.group("strong_emphasis_underscore")
+            add_inline(paragraph, inner, True, True)
+        elif match.group("strong"):
+            add_inline(paragraph, match.group("strong_text") or match.group("strong_underscore"), True, italic)
+        elif match.group("emphasis"):
+            add_inline(paragraph, match.group("emphasis_text") or match.group("emphasis_underscore"), bold, True)
+        else:
+            run = _add_run(paragraph, match.group("code"), bold, italic)
+            run.font.name = "Courier New"
+        position = match.end()
+    if position < len(text):
+        _add_run(paragraph, text[position:], bold, italic)
+
+
+def _add_run(paragraph, text, bold, italic):
+    run = paragraph.add_run(text)
+    if bold:
+        run.bold = True
+    if italic:
+        run.italic = True
+    return run
+
+
+def split_row(line):
+    """Return the cells of a Markdown table row, without the outer pipes; "\\|" is a literal pipe."""
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in re.split(r"(?<!\\)\|", line)]
+
+
+class _Renderer:
+    """Adds the lines of one report to a document, keeping the state of the open list and table."""
+
+    def __init__(self, document):
+        self.document = document
+        styles = document.styles
+        self.heading_styles = [styles[f"Heading {level}"] for level in range(1, 7)]
+        self.bullet_styles = [styles["List Bullet"]] + [styles[f"List Bullet {level}"] for level in range(2, MAX_LIST_LEVELS + 1)]
+        self.number_styles = [styles["List Number"]] + [styles[f"List Number {level}"] for level in range(2, MAX_LIST_LEVELS + 1)]
+        self.table_style = styles["Table Grid"]
+        self.numbering = document.part.numbering_part.element
+        self.abstract_numbers = {}
+        self.list_indents = []  # Indentation of the open list levels, outermost first
+        self.list_numbers = {}  # Level -> numbering instance of the numbered list open at that level
+        self.table_rows = []
+
+    def line(self, line):
+        match = LINE.match(line.expandtabs(4))
+        if match is None or not match.group("row"):
+            self.flush_table()
+        if match is None:
+            text = line.strip()
+            if not text:
+                return  # Blank lines separate blocks, and list items may be separated by them
+            self.close_lists(len(line) - len(line.lstrip()))
+            add_inline(self.paragraph(), text)
+        elif match.group("hashes"):
+            self.close_lists()
+            paragraph = self.paragraph(self.heading_styles[len(match.group("hashes")) - 1])
+            add_inline(paragraph, match.group("heading"))
+        elif match.group("rule"):
+            self.close_lists()
+        elif match.group("bullet"):
+            level = self.list_level(len(match.group("indent")))
+            self.list_numbers.pop(level, None)
+            add_inline(self.paragraph(self.bullet_styles[level]), match.group("bullet_text"))
+        elif match.group("number"):
+            level = self.list_level(len(match.group("indent")))
+            paragraph = self.paragraph(self.number_styles[level])
+            if level not in self.list_numbers:
+                self.list_numbers[level] = self.restarted_numbering(self.number_styles[level], int(match.group("number")))
+            if self.list_numbers[level] is not None:
+                num_pr = paragraph._p.get_or_add_pPr().get_or_add_numPr()
+                num_pr.get_or_add_ilvl().val = 0
+                num_pr.get_or_add_numId().val = self.list_numbers[level]
+            add_inline(paragraph, match.group("number_text"))
+        else:
+            self.close_lists()
+            self.table_rows.append(match.group("row"))
+
+    def paragraph(self, style=None):
+        """Add a paragraph in the given style (None for Normal)."""
+        paragraph = self.document.add_paragraph()
+        if style is not None:
+            paragraph._p.style = style.style_id
+        return paragraph
+
+    def list_level(self, indent):
+        """Return the level (0-based) of a list item with the given indentation, closing any deeper lists."""
+        while self.list_indents and indent < self.list_indents[-1]:
+            self.list_indents.pop()
+            self.list_numbers.pop(len(self.list_indents), None)
+        if not self.list_indents or indent > self.list_indents[-1]:
+            self.list_indents.append(indent)
+        return min(len(self.list_indents), MAX_LIST_LEVELS) - 1
+
+    def close_lists(self, indent=0):
+        """End the lists a paragraph with the given indentation doesn't belong to (all of them at 0)."""
+        while self.list_indents and (indent == 0 or indent < self.list_indents[-1]):
+            self.list_indents.pop()
+            self.list_numbers.pop(len(self.list_indents), None)
+
+    def restarted_numbering(self, style, start):
+        """Return the id of a new numbering instance of a list style that starts at start, or None if it has none."""
+        if style.style_id not in self.abstract_numbers:
+            num_pr = style.element.pPr.numPr if style.element.pPr is not None else None
+            num = self.numbering.num_having_numId(num_pr.numId.val) if num_pr is not None and num_pr.numId is not None else None
+            self.abstract_numbers[style.style_id] = num.abstractNumId.val if num is not None else None
+        abstract_number = self.abstract_numbers[style.style_id]
+        if abstract_number is None:
+            return None
+        num = self.numbering.add_num(abstract_number)
+        num.add_lvlOverride(ilvl=0).add_startOverride(start)
+        return num.numId
+
+    def flush_table(self):
+        """Add the table rows read so far as a table; a row followed by a separator row is the header."""
+        if not self.table_rows:
+            return
+        rows = [split_row(row) for row in self.table_rows]
+        header = len(rows) > 1 and TABLE_SEPARATOR.match(self.table_rows[1].strip()) is not None
+        if header:
+            del rows[1]
+        self.table_rows = []
+        table = self.document.add_table(rows=0, cols=max(len(row) for row in rows))
+        table._tbl.tblStyle_val = self.table_style.style_id
+        for row_index, row in enumerate(rows):
+            for cell, text in zip(table.add_row().cells, row):
+                add_inline(cell.paragraphs[0], text, bold=True if header and row_index == 0 else None)
+
+
+def render_markdown_docx(markdown, title=None):
+    """Render Markdown text as a Word document, under an optional level 1 title; returns the .docx bytes."""
+    document = docx.Document()
+    renderer = _Renderer(document)
+    if title:
+        renderer.paragraph(renderer.heading_styles[0]).add_run(title)
+    for line in markdown.split("\n"):
+        renderer.line(line.rstrip())
+    renderer.flush_table()
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
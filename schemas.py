@@ -0,0 +1,254 @@
+"""JSON schemas of the structured LLM stages, with local validation and repair.
+
+A stage's reply is parsed leniently: Markdown fences and text around the JSON
+are ignored, and near-valid JSON (trailing commas, raw control characters,
+output cut off mid-string) is repaired locally before anything is re-asked.
+The parsed value is then checked against the stage's schema, simple type
+mismatches are coerced (a single string where a list is expected, a number
+for a paragraph number, ...), and the remaining errors are reported per failing
+part, i.e. per list item or top-level field, so the caller can re-ask the model
+for only those parts instead of rerunning the stage.
+"""
+import copy
+import json
+import re
+
+DOMAIN_EXPERTISE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "domain_subject_matter": {"type": "string", "minLength": 1},
+        "experience_expertise_qualifications": {"type": "string", "minLength": 1},
+        "style_tone_voice": {"type": "string", "minLength": 1},
+    },
+    "required": ["domain_subject_matter", "experience_expertise_qualifications", "style_tone_voice"],
+}
+
+CONFLICT_RESULTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "foundational_claim": {"type": "string", "minLength": 1},
+        "documents_referenced": {"type": "array", "items": {"type": "string"}},
+        "figures": {"type": "array", "items": {"type": "string"}},
+        "text": {"type": "string"},
+    },
+    "required": ["foundational_claim", "documents_referenced", "figures", "text"],
+}
+
+FIGURE_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "figures_analysis": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "figure_number": {"type": "string", "minLength": 1},
+                    "title": {"type": "string"},
+                    "technical_details": {"type": "string", "minLength": 1},
+                    "importance": {"type": "string"},
+                },
+                "required": ["figure_number", "technical_details"],
+            },
+        },
+        "extracted_paragraphs": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["figures_analysis"],
+}
+
+
+def _paragraph_details_schema(field):
+    return {
+        "type": "object",
+        "properties": {
+            field: {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "paragraph_number": {"type": "string"},
+                        "text": {"type": "string", "minLength": 1},
+                    },
+                    "required": ["paragraph_number", "text"],
+                },
+            },
+        },
+        "required": [field],
+    }
+
+
+FILED_APPLICATION_DETAILS_SCHEMA = _paragraph_details_schema("foundational_claim_details")
+MODIFIED_DETAILS_SCHEMA = _paragraph_details_schema("modified_filed_application_details")
+
+# Keywords the model's schema-constrained (strict) response mode accepts
+RESPONSE_SCHEMA_KEYWORDS = ("type", "properties", "items", "required", "enum", "description")
+
+_validators = {}
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*(?:```|$)", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+def response_schema(schema):
+    """
+    Return the schema in the form the API's strict structured-output mode requires.
+
+    Every object lists all of its properties as required and allows no others, and
+    validation keywords the mode doesn't support (e.g. minLength) are left to the local check.
+    """
+    strict = {key: copy.deepcopy(value) for key, value in schema.items() if key in RESPONSE_SCHEMA_KEYWORDS}
+    if "properties" in strict:
+        strict["properties"] = {name: response_schema(value) for name, value in schema["properties"].items()}
+        strict["required"] = list(strict["properties"])
+        strict["additionalProperties"] = False
+    if "items" in strict:
+        strict["items"] = response_schema(schema["items"])
+    return strict
+
+
+def _close_truncated(text):
+    """Close the strings, arrays and objects left open by a reply that was cut off."""
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if escaped:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def parse_json(content):
+    """
+    Parse a stage's JSON reply, repairing near-valid JSON locally.
+
+    Accepts the JSON inside Markdown fences or surrounded by other text, raw control
+    characters in strings, trailing commas and replies cut off before the end.
+    Raises ValueError if no JSON value can be recovered.
+    """
+    text = content.strip()
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    decoder = json.JSONDecoder(strict=False)
+    try:
+        return decoder.decode(text)
+    except json.JSONDecodeError as e:
+        error = e
+
+    start = min((index for index in (text.find("{"), text.find("[")) if index >= 0), default=-1)
+    if start < 0:
+        raise ValueError(f"No JSON found in the reply: {error}")
+    text = text[start:]
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", text)):
+        try:
+            # raw_decode ignores any text after the JSON value
+            return decoder.raw_decode(candidate)[0]
+        except json.JSONDecodeError:
+            pass
+    try:
+        return decoder.raw_decode(_TRAILING_COMMA.sub(r"\1", _close_truncated(text)))[0]
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid JSON in the reply: {error}") from None
+
+
+def coerce(data, schema):
+    """Return data with simple type mismatches fixed: scalars wrapped in lists, lists joined into strings, numbers as strings."""
+    expected = schema.get("type")
+    if expected == "object" and isinstance(data, dict):
+        properties = schema.get("properties", {})
+        return {name: coerce(value, properties[name]) if name in properties else value for name, value in data.items()}
+    if expected == "array":
+        if data is None:
+            return data
+        if not isinstance(data, list):
+            data = [data]
+        return [coerce(item, schema.get("items", {})) for item in data]
+    if expected == "string":
+        if isinstance(data, (int, float)) and not isinstance(data, bool):
+            return str(data)
+        if isinstance(data, list) and all(isinstance(item, str) for item in data):
+            return "\n".join(data)
+    return data
+
+
+def validation_errors(data, schema):
+    """Return the schema violations of data, in document order."""
+    key = id(schema)
+    if key not in _validators:
+        from jsonschema import Draft7Validator  # Loaded with the first validation, not at import
+
+        _validators[key] = Draft7Validator(schema)
+    return sorted(_validators[key].iter_errors(data), key=lambda error: list(map(str, error.absolute_path)))
+
+
+def failing_parts(errors):
+    """
+    Return the parts of a reply that the errors fall in, as {path: [messages]}.
+
+    A part is a list item (e.g. ("figures_analysis", 2)) or a top-level field; an empty path
+    means the reply as a whole is wrong (e.g. not an object).
+    """
+    parts = {}
+    for error in errors:
+        path = list(error.absolute_path)
+        if not path and error.validator == "required" and isinstance(error.instance, dict):
+            missing = [name for name in error.validator_value if name not in error.instance]
+            for name in missing:
+                parts.setdefault((name,), []).append(error.message)
+            continue
+        part = tuple(path[:2]) if len(path) >= 2 and isinstance(path[1], int) else tuple(path[:1])
+        parts.setdefault(part, []).append(f"{'/'.join(map(str, path)) or 'reply'}: {error.message}")
+    return parts
+
+
+def part_name(path):
+    """Return a readable name for a part, e.g. "figures_analysis[2]"; the whole reply for an empty path."""
+    if not path:
+        return "the whole reply"
+    return "".join(f"[{step}]" if isinstance(step, int) else (f".{step}" if position else step)
+                   for position, step in enumerate(path))
+
+
+def part_schema(schema, path):
+    """Return the schema of the part of a value at path."""
+    for step in path:
+        schema = schema["items"] if isinstance(step, int) else schema["properties"][step]
+    return schema
+
+
+def set_part(data, path, value):
+    """Return data with the part at path replaced by value (the whole value for an empty path)."""
+    if not path:
+        return value
+    target = data
+    for step in path[:-1]:
+        target = target[step]
+    target[path[-1]] = value
+    return data
+
+
+def drop_invalid_items(data, schema):
+    """Return data without the list items that still fail validation, keeping every valid item."""
+    invalid = sorted(
+        {part for part in failing_parts(validation_errors(data, schema)) if len(part) == 2},
+        key=lambda part: part[1], reverse=True,
+    )
+    for field, index in invalid:
+        del data[field][index]
+    return data, len(invalid)
@@ -1,12 +0,0 @@
-#!/bin/bash  
-apt-get update && apt-get install -y \  
-    pandoc \  
-    texlive-latex-base \  
-    texlive-xetex \  
-    texlive-fonts-recommended \  
-    texlive-plain-generic \  
-    texlive-latex-extra \  
-    texlive-fonts-extra \  
-    texlive-science \  
-    texlive-pictures \  
-    texlive-pstricks  
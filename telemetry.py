@@ -0,0 +1,323 @@
+"""Per-stage spans, token usage and cost, exported as a trace file and Prometheus metrics.
+
+Every stage (OCR calls, LLM calls and the functions around them, document
+conversion, PDF merging, report generation, the analysis steps) runs inside a
+span that records its wall time and what it did: queue time spent waiting for
+rate-limit capacity or a job worker, prompt and completion tokens, pages
+processed and retries. Spans nest through a context variable, so a span opened
+in a worker thread that runs in a copy of the caller's context (map_chunks,
+the job queue) becomes a child of the caller's span, and counts recorded in a
+span also add up in its ancestors.
+
+Finished spans are appended as JSON lines to a local trace file, and their
+durations and counts are aggregated into metrics served in the Prometheus text
+format. The metrics count each amount once, under the span it was recorded in
+(tokens under the "llm" spans, pages under the "ocr" spans, ...), so they can
+be summed without counting a call again in every enclosing stage.
+
+Prompts and replies are only logged for a sample of calls, at debug level,
+instead of being printed for every call.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the span duration histogram buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Counts a span can record, exported as <METRIC_PREFIX>_<count>_total per span kind and name
+SPAN_COUNTS = ("queue_seconds", "retries", "throttled", "prompt_tokens", "cached_tokens", "completion_tokens",
+               "pages", "cost_usd")
+METRIC_PREFIX = "patent_analyzer"
+# Child of the "pipeline" logger, so pipeline.configure_logging and LOG_LEVEL apply to it
+logger = logging.getLogger("pipeline.telemetry")
+
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+_count_lock = threading.Lock()
+
+
+class Span:
+    """One timed operation: its kind (e.g. "llm") and name (e.g. the stage), attributes and counts."""
+
+    def __init__(self, telemetry, kind, name, parent, attributes):
+        self.telemetry = telemetry
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes)
+        self.counts = {}
+        self.status = "ok"
+        self.error = None
+        self.start_time = time.time()
+        self.duration = None
+        self._started = time.perf_counter()
+
+    def set(self, **attributes):
+        """Record attributes of the operation, e.g. whether it was served from a cache."""
+        self.attributes.update(attributes)
+
+    def add(self, **counts):
+        """Add to the span's counts (see SPAN_COUNTS); they add up in every enclosing span too."""
+        counts = {name: value for name, value in counts.items() if value}
+        if not counts:
+            return
+        with _count_lock:
+            span = self
+            while span is not None:
+                for name, value in counts.items():
+                    span.counts[name] = span.counts.get(name, 0) + value
+                span = span.parent
+        self.telemetry._count(self, counts)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "kind": self.kind,
+            "name": self.name,
+            "start": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "counts": self.counts,
+        }
+
+
+def current_span():
+    """Return the innermost open span of this context, or None."""
+    return _current_span.get()
+
+
+def add(**counts):
+    """Add to the counts of the innermost open span, if any (e.g. retries from the rate limiter)."""
+    span = _current_span.get()
+    if span is not None:
+        span.add(**counts)
+
+
+def sampled(rate):
+    """Return True for a random fraction rate (0-1) of calls."""
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def log_sampled(logger, rate, message, *args, max_chars=2000):
+    """
+    Log message % args at debug level for a sample of calls; string arguments are cut to max_chars.
+
+    Nothing is formatted unless the logger is enabled for debug and the call is sampled, so
+    unsampled calls cost next to nothing even with large prompts as arguments.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or not sampled(rate):
+        return
+    args = tuple(
+        arg[:max_chars] + f"... [{len(arg) - max_chars} more characters]" if isinstance(arg, str) and len(arg) > max_chars else arg
+        for arg in args
+    )
+    logger.debug(message, *args)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class Telemetry:
+    """
+    Process-wide span recorder with aggregated metrics.
+
+    Spans are written to trace_path as JSON lines (no file if it's empty); the file is
+    rotated to <trace_path>.1 once it grows past trace_max_bytes. prices maps a model to
+    its USD price per 1,000 prompt, cached prompt and completion tokens, used for the
+    cost of each LLM call.
+    """
+
+    def __init__(self, trace_path=None, trace_max_bytes=64 * 1024 * 1024, prices=None):
+        self.trace_path = trace_path
+        self.trace_max_bytes = trace_max_bytes
+        self.prices = prices or {}
+        self.collectors = []
+        self._durations = {}  # (kind, name) -> [bucket counts..., count, sum]
+        self._errors = {}
+        self._counts = {}  # (kind, name, count) -> total
+        self._lock = threading.Lock()
+        self._trace_lock = threading.Lock()
+        if trace_path:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+
+    @contextlib.contextmanager
+    def span(self, kind, name, **attributes):
+        """Run the with-block as a span of the given kind and name, a child of the current span."""
+        span = Span(self, kind, name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - span._started
+            self._finish(span)
+
+    def traced(self, kind, name=None):
+        """Decorator running each call of a function as a span (named after the function by default)."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(kind, name or function.__name__):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def usage_cost(self, model, prompt_tokens, completion_tokens, cached_tokens=0):
+        """Return the USD cost of a call's tokens at the model's prices (0 for a model without prices)."""
+        price = self.prices.get(model)
+        if not price:
+            return 0.0
+        uncached = max(0, prompt_tokens - cached_tokens)
+        return (uncached * price.get("prompt", 0)
+                + cached_tokens * price.get("cached_prompt", price.get("prompt", 0))
+                + completion_tokens * price.get("completion", 0)) / 1000
+
+    def register_collector(self, collector):
+        """
+        Export more metrics with each scrape: collector() returns (name, type, help, samples)
+        tuples, where samples is a list of (labels dict, value).
+        """
+        self.collectors.append(collector)
+
+    def _count(self, span, counts):
+        with self._lock:
+            for count, value in counts.items():
+                key = (span.kind, span.name, count)
+                self._counts[key] = self._counts.get(key, 0) + value
+
+    def _finish(self, span):
+        key = (span.kind, span.name)
+        with self._lock:
+            histogram = self._durations.setdefault(key, [0] * (len(DURATION_BUCKETS) + 2))
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration
+            if span.status == "error":
+                self._errors[key] = self._errors.get(key, 0) + 1
+        if self.trace_path:
+            self._write(span)
+
+    def _write(self, span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        try:
+            with self._trace_lock:
+                if os.path.exists(self.trace_path) and os.path.getsize(self.trace_path) > self.trace_max_bytes:
+                    os.replace(self.trace_path, self.trace_path + ".1")
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            # Losing a trace line must never fail the stage it describes
+            logger.warning("Failed to write span %s/%s to %s: %s", span.kind, span.name, self.trace_path, e)
+
+    def stats(self):
+        """
+        Return per kind and name: calls, errors, total and average seconds and the counts recorded
+        in spans of that kind and name, sorted by total time.
+        """
+        with self._lock:
+            rows = []
+            for (kind, name), histogram in self._durations.items():
+                calls, seconds = histogram[-2], histogram[-1]
+                row = {"kind": kind, "name": name, "calls": calls, "errors": self._errors.get((kind, name), 0),
+                       "seconds": seconds, "average_seconds": seconds / calls if calls else 0.0}
+                for count in SPAN_COUNTS:
+                    row[count] = self._counts.get((kind, name, count), 0)
+                rows.append(row)
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    def metrics_text(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            durations = {key: list(histogram) for key, histogram in self._durations.items()}
+            errors = dict(self._errors)
+            counts = dict(self._counts)
+
+        name = f"{METRIC_PREFIX}_span_duration_seconds"
+        lines = [f"# HELP {name} Wall time of each stage.", f"# TYPE {name} histogram"]
+        for (kind, span_name), histogram in sorted(durations.items()):
+            for bound, bucket in zip(DURATION_BUCKETS, histogram):
+                lines.append(f"{name}_bucket{_labels(kind=kind, name=span_name, le=bound)} {bucket}")
+            lines.append(f"{name}_bucket{_labels(kind=kind, name=span_name, le='+Inf')} {histogram[-2]}")
+            lines.append(f"{name}_count{_labels(kind=kind, name=span_name)} {histogram[-2]}")
+            lines.append(f"{name}_sum{_labels(kind=kind, name=span_name)} {histogram[-1]}")
+
+        name = f"{METRIC_PREFIX}_span_errors_total"
+        lines += [f"# HELP {name} Stages that raised an error.", f"# TYPE {name} counter"]
+        lines += [f"{name}{_labels(kind=kind, name=span_name)} {value}" for (kind, span_name), value in sorted(errors.items())]
+
+        for count in SPAN_COUNTS:
+            name = f"{METRIC_PREFIX}_{count}_total"
+            lines += [f"# HELP {name} {count.replace('_', ' ').capitalize()} recorded by each stage.", f"# TYPE {name} counter"]
+            lines += [
+                f"{name}{_labels(kind=kind, name=span_name)} {value}"
+                for (kind, span_name, span_count), value in sorted(counts.items()) if span_count == count
+            ]
+
+        for collector in self.collectors:
+            try:
+                metrics = collector()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", collector, e)
+                continue
+            for metric_name, metric_type, help_text, samples in metrics:
+                name = f"{METRIC_PREFIX}_{metric_name}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                lines += [f"{name}{_labels(**labels) if labels else ''} {value}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(telemetry, port, host="127.0.0.1"):
+    """
+    Serve telemetry.metrics_text() at http://host:port/metrics from a daemon thread.
+
+    Returns the server, or None if the port can't be bound (e.g. another process already
+    serves metrics there), since metrics must not keep the app from starting.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = telemetry.metrics_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the log
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving metrics at http://%s:%s/metrics", host, server.server_address[1])
+    return server
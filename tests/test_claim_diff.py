@@ -0,0 +1,85 @@
+from claim_diff import claim_hash, claim_units, diff_claims, is_pending, merge_unit_reports, split_claims, split_report
+
+
+def test_claim_hash_ignores_status_identifiers():
+    original = claim_hash("1. (Original) A widget comprising a lever.")
+    assert claim_hash("1. (Currently Amended) A widget comprising a lever.") == original
+    assert claim_hash("1. (Previously Presented)  A widget\ncomprising a lever.") == original
+    assert claim_hash("1. A widget comprising a lever.") == original
+    assert claim_hash("1. (Currently Amended) A widget comprising a handle.") != original
+
+
+CLAIMS_TEXT = """LISTING OF CLAIMS
+1. (Currently Amended) A widget comprising a lever.
+2. (Original) The widget of claim 1, wherein the lever is
+12. millimetres long.
+3. (Original) The widget of claim 2, further comprising a spring.
+4. (Original) A method of making a widget.
+5. (Canceled)
+6. (New) The method of claim 4 or the widget of claim 1, wherein the lever is steel."""
+
+
+def test_split_claims_keeps_numbered_lines_out_of_sequence_with_their_claim():
+    claims = split_claims(CLAIMS_TEXT)
+
+    assert [number for number, _ in claims] == [1, 2, 3, 4, 5, 6]
+    assert claims[1][1] == "2. (Original) The widget of claim 1, wherein the lever is\n12. millimetres long."
+    assert claims[4][1] == "5. (Canceled)"
+    assert not is_pending(claims[4][1])
+
+
+def test_claim_units_group_dependents_under_their_independent_claim():
+    claims = [(number, text) for number, text in split_claims(CLAIMS_TEXT) if is_pending(text)]
+
+    # Claim 6 depends on claims 4 and 1, and joins the unit of the lowest one
+    assert claim_units(claims) == {1: [1, 2, 3, 6], 4: [4]}
+
+
+def test_claim_units_start_a_unit_for_a_claim_whose_parent_is_not_pending():
+    claims = [(2, "2. The widget of claim 1, wherein the lever is steel."), (3, "3. The widget of claim 2.")]
+
+    assert claim_units(claims) == {2: [2, 3]}
+
+
+def test_diff_claims_matches_claims_by_number():
+    previous = {"1": "a", "2": "b", "3": "c"}  # As read back from a JSON checkpoint
+    current = {1: "a", 2: "x", 4: "d"}
+
+    assert diff_claims(previous, current) == {"added": [4], "changed": [2], "unchanged": [1], "removed": [3]}
+    assert diff_claims(None, current) == {"added": [1, 2, 4], "changed": [], "unchanged": [], "removed": []}
+
+
+HEADINGS = ("Examiner’s Analysis", "Novelty Analysis", "Conclusion")
+
+
+def test_split_report_finds_headings_as_the_model_writes_them():
+    report = "\n".join([
+        "Overview of the rejection.",
+        "**Examiner's Analysis:** The examiner relies on Smith.",
+        "**Novelty Analysis (U.S.C 102 - Lack of Novelty):**",
+        "• Smith lacks the spring.",
+        "Conclusion of the comparison: Smith lacks the spring.",  # A sentence, not a heading
+    ])
+
+    preamble, sections = split_report(report, HEADINGS)
+
+    assert preamble == "Overview of the rejection."
+    assert sections["Examiner’s Analysis"] == ("**Examiner's Analysis:**", "The examiner relies on Smith.")
+    assert sections["Novelty Analysis"] == (
+        "**Novelty Analysis (U.S.C 102 - Lack of Novelty):**",
+        "• Smith lacks the spring.\nConclusion of the comparison: Smith lacks the spring.",
+    )
+    assert "Conclusion" not in sections
+
+
+def test_merge_unit_reports_keeps_each_heading_once_in_template_order():
+    first = "**Conclusion:**\nRejection overcome.\n**Examiner’s Analysis:**\nSmith."
+    second = "**Examiner’s Analysis:**\nJones.\n**Conclusion:**\nRejection stands."
+
+    merged = merge_unit_reports([("Claims 1 and 2", first), ("Claim 4", second)], HEADINGS)
+
+    assert merged == "\n\n".join([
+        "**Examiner’s Analysis:**", "**Claims 1 and 2:**\nSmith.", "**Claim 4:**\nJones.",
+        "**Conclusion:**", "**Claims 1 and 2:**\nRejection overcome.", "**Claim 4:**\nRejection stands.",
+    ])
+    assert merge_unit_reports([("Claim 1", first)], HEADINGS) == first
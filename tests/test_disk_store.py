@@ -0,0 +1,41 @@
+import os
+import time
+
+from artifact_cache import ArtifactCache
+from checkpoints import CheckpointStore
+from llm_cache import LlmCache
+
+
+def test_least_recently_used_entries_are_evicted_over_budget(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    old = time.time() - 60
+    os.utime(tmp_path / "b.bin", (old, old))  # a was used more recently than b
+    cache.put("c", b"c" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a" * 100
+    assert cache.stats()["entries"] == 2
+
+
+def test_corrupt_entries_are_dropped_as_misses(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.put("key", "step1", {"answer": 42})
+    assert store.get("key") == {"answer": 42}
+
+    (tmp_path / "key.json.z").write_bytes(b"not zlib")
+
+    assert store.get("key") is None
+    assert not (tmp_path / "key.json.z").exists()
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+def test_expired_completions_are_misses(tmp_path):
+    cache = LlmCache(str(tmp_path), ttl_seconds=0)
+    messages = [{"role": "user", "content": "Hello"}]
+    cache.put("model", messages, 0.2, "Hi")
+    time.sleep(0.01)
+
+    assert cache.get("model", messages, 0.2) is None
+    assert cache.stats()["expired"] == 1
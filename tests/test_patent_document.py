@@ -0,0 +1,27 @@
+from patent_document import PatentDocument
+
+DESCRIPTION_PAGE = [
+    "[0010] The valve assembly includes a housing, a poppet biased by a spring toward a seat, and a",
+    "pressure sensor that reports the pressure in the chamber to a controller, which opens the valve when",
+    "the pressure exceeds a threshold set by the operator through the interface described below in detail.",
+]
+
+
+def test_short_continuation_page_is_kept_as_text():
+    continuation_page = [
+        "threshold is reached, the controller closes the valve again and the cycle repeats.",
+        "Other embodiments are within the scope of the following claims.",
+    ]
+    document = PatentDocument([DESCRIPTION_PAGE, continuation_page])
+
+    assert document.drawing_pages == []
+    assert "the cycle repeats" in document.prompt_text()
+
+
+def test_drawing_sheets_are_left_out_of_the_prompt_text():
+    labeled_sheet = ["FIG. 1", "100", "102", "Pressure sensor", "104", "Controller"]
+    unlabeled_sheet = ["200", "202", "Valve seat", "204", "Sheet 2 of 2"]
+    document = PatentDocument([DESCRIPTION_PAGE, labeled_sheet, unlabeled_sheet])
+
+    assert document.drawing_pages == [2, 3]
+    assert "Controller" not in document.prompt_text()
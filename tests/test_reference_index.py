@@ -0,0 +1,37 @@
+from reference_index import select_reference_passages
+
+
+def numbered_paragraphs(start, texts):
+    return "\n".join(f"[{number:04d}] {text}" for number, text in enumerate(texts, start=start))
+
+
+def test_cited_paragraphs_of_every_reference_come_before_best_matches():
+    claim = "A valve assembly comprising a spring biased poppet and a pressure sensor controlling the valve."
+    # Reference A matches the claim everywhere but none of its paragraphs are cited
+    reference_a = numbered_paragraphs(10, [
+        f"The valve assembly {i} has a spring biased poppet and a pressure sensor controlling the valve." for i in range(20)
+    ])
+    # Reference B's cited paragraph shares no terms with the claim
+    reference_b = numbered_paragraphs(28, [
+        "Unrelated introductory remarks about packaging.",
+        "More remarks about the shipping carton.",
+        "The latch engages the detent when the lid is closed.",
+        "Closing remarks about the carton.",
+    ])
+    conflict_results = {"foundational_claim": claim, "text": "Reference B discloses the latch at [0030].", "figures": []}
+
+    excerpts = select_reference_passages(conflict_results, [reference_a, reference_b], max_chars=600)
+
+    assert "[0030] The latch engages the detent" in excerpts[1]
+    assert sum(len(excerpt) for excerpt in excerpts) <= 600 + 20  # Plus the "..." separators
+    assert excerpts[0]  # The remaining budget still goes to the best matches of reference A
+
+
+def test_best_matches_fill_the_budget_in_score_order_across_references():
+    conflict_results = {"foundational_claim": "pressure sensor valve", "text": "", "figures": []}
+    weak = numbered_paragraphs(1, ["A lid with a hinge and a valve."])
+    strong = numbered_paragraphs(1, ["The pressure sensor controls the valve via the pressure sensor signal."])
+
+    excerpts = select_reference_passages(conflict_results, [weak, strong], max_chars=80)
+
+    assert excerpts == ["", strong]